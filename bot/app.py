@@ -1,86 +1,128 @@
 """FastAPI entrypoint for the WhatsApp lesson bot."""
 from __future__ import annotations
 
-import json
-import logging
-from datetime import datetime, timezone
-from typing import Any, Dict, List
+import asyncio
+import hmac
+import tempfile
+from typing import Any, Dict, List, Optional
 
-from fastapi import Body, FastAPI, HTTPException, Query, Request, status
-from fastapi.concurrency import run_in_threadpool
+from fastapi import Body, FastAPI, Header, HTTPException, Query, Request, status
 from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel, Field, validator
 
-from bot.core.ratelimit import RateLimiter
+from bot.core.aio import call_io, cancel_task, close_quietly, start_periodic
+from bot.core.dedup import build_dedup_store
+from bot.core.importer import detect_format, import_lesson
+from bot.core.ingest import IngestQueue
+from bot.core.logs import JsonFormatter, parse_sampling, setup_logging
+from bot.core.metrics import REGISTRY
+from bot.core.outbound import OutboundSender
+from bot.core.outbox import RevalidationOutbox
+from bot.core.ratelimit import SQLiteRateLimiter, build_rate_limiter
 from bot.core.router import MessageRouter
-from bot.integrations.revalidate import NextRevalidator
-from bot.integrations.supabase_client import SupabaseService
-from bot.integrations.whatsapp import WhatsAppAPI
+from bot.core.state import ChatStateCache
+from bot.core.tracing import Tracer
+from bot.core.warmup import Warmup
+from bot.integrations.revalidate import AsyncNextRevalidator, NextRevalidator
+from bot.integrations.supabase_client import AsyncSupabaseService, SupabaseService
+from bot.integrations.whatsapp import AsyncWhatsAppAPI, WhatsAppAPI
 from bot.settings import Settings, get_settings
 
-
-class JsonFormatter(logging.Formatter):
-    """Emit structured logs as JSON lines."""
-
-    DEFAULT_FIELDS = {
-        "name",
-        "msg",
-        "args",
-        "levelname",
-        "levelno",
-        "pathname",
-        "filename",
-        "module",
-        "exc_info",
-        "exc_text",
-        "stack_info",
-        "lineno",
-        "funcName",
-        "created",
-        "msecs",
-        "relativeCreated",
-        "thread",
-        "threadName",
-        "processName",
-        "process",
-    }
-
-    def format(self, record: logging.LogRecord) -> str:
-        base: Dict[str, Any] = {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "level": record.levelname,
-            "logger": record.name,
-            "message": record.getMessage(),
-        }
-        extras = {
-            key: value
-            for key, value in record.__dict__.items()
-            if key not in self.DEFAULT_FIELDS
-        }
-        if extras:
-            base.update(extras)
-        if record.exc_info:
-            base["exc_info"] = self.formatException(record.exc_info)
-        return json.dumps(base)
-
-
-def setup_logging() -> None:
-    handler = logging.StreamHandler()
-    handler.setFormatter(JsonFormatter())
-    root = logging.getLogger()
-    root.handlers.clear()
-    root.addHandler(handler)
-    root.setLevel(logging.INFO)
-
-
-setup_logging()
 settings: Settings = get_settings()
+setup_logging(
+    use_queue=settings.bot_log_queue,
+    sampling=parse_sampling(settings.bot_log_sampling),
+    max_field_chars=settings.bot_log_max_field_chars,
+    fast_json=settings.bot_log_fast_json,
+)
 
-supabase_service = SupabaseService(settings)
-whatsapp_api = WhatsAppAPI(settings)
-revalidator = NextRevalidator(settings)
-rate_limiter = RateLimiter(settings.bot_rate_limit_max, settings.bot_rate_limit_window_sec)
-message_router = MessageRouter(settings, supabase_service, whatsapp_api, revalidator, rate_limiter)
+if settings.bot_async_io:
+    supabase_service = AsyncSupabaseService(settings)
+    whatsapp_api = AsyncWhatsAppAPI(settings)
+    revalidator = AsyncNextRevalidator(settings)
+else:
+    supabase_service = SupabaseService(settings)
+    whatsapp_api = WhatsAppAPI(settings)
+    revalidator = NextRevalidator(settings)
+rate_limiter = build_rate_limiter(
+    settings.bot_rate_limit_algorithm,
+    settings.bot_rate_limit_max,
+    settings.bot_rate_limit_window_sec,
+    backend=settings.bot_rate_limit_backend,
+    path=settings.bot_rate_limit_sqlite_path,
+    lease=settings.bot_rate_limit_lease,
+)
+dedup_store = build_dedup_store(
+    settings.bot_dedup_backend,
+    ttl_seconds=settings.bot_dedup_ttl_sec,
+    max_entries=settings.bot_dedup_max_entries,
+    path=settings.bot_dedup_sqlite_path,
+)
+revalidation_outbox = (
+    RevalidationOutbox(
+        settings.bot_revalidate_outbox_path,
+        debounce_seconds=settings.bot_revalidate_debounce_sec,
+        max_attempts=settings.bot_revalidate_max_attempts,
+    )
+    if settings.bot_revalidate_outbox
+    else None
+)
+outbound_pacer = (
+    SQLiteRateLimiter(
+        settings.bot_outbound_sqlite_path,
+        settings.bot_outbound_burst,
+        settings.bot_outbound_burst / settings.bot_outbound_rate_per_sec,
+    )
+    if settings.bot_outbound_queue_size > 0 and settings.bot_outbound_sqlite_path
+    else None
+)
+outbound_sender = (
+    OutboundSender(
+        whatsapp_api,
+        rate_per_sec=settings.bot_outbound_rate_per_sec,
+        burst=settings.bot_outbound_burst,
+        max_depth=settings.bot_outbound_queue_size,
+        workers=settings.bot_outbound_workers,
+        max_attempts=settings.bot_outbound_max_attempts,
+        drain_timeout=settings.bot_ingest_drain_timeout_sec,
+        pacer=outbound_pacer,
+    )
+    if settings.bot_outbound_queue_size > 0
+    else None
+)
+state_cache = (
+    ChatStateCache(settings.bot_state_cache_size, settings.bot_state_cache_ttl_sec)
+    if settings.bot_state_cache_size > 0
+    else None
+)
+message_router = MessageRouter(
+    settings,
+    supabase_service,
+    whatsapp_api,
+    revalidator,
+    rate_limiter,
+    dedup=dedup_store,
+    state_cache=state_cache,
+    write_behind=settings.bot_state_write_behind_sec > 0,
+    outbox=revalidation_outbox,
+    outbound=outbound_sender,
+    payload_concurrency=settings.bot_payload_concurrency,
+    tracer=Tracer(slow_ms=settings.bot_slow_message_ms, export_path=settings.bot_trace_export_path),
+)
+ingest_queue = (
+    IngestQueue(
+        message_router.handle_message,
+        workers=settings.bot_ingest_workers,
+        max_depth=settings.bot_ingest_queue_size,
+        drain_timeout=settings.bot_ingest_drain_timeout_sec,
+    )
+    if settings.bot_ingest_workers > 0
+    else None
+)
+warmup = Warmup(
+    {"supabase": supabase_service, "whatsapp": whatsapp_api, "revalidate": revalidator},
+    enabled=settings.bot_warmup,
+)
 
 api = FastAPI(title="Lesson WhatsApp Bot", version="1.0.0")
 
@@ -95,10 +137,44 @@ class RevalidateRequest(BaseModel):
         return value
 
 
+_background_tasks: List[Any] = []
+
+
+@api.on_event("startup")
+async def startup_event() -> None:
+    if warmup.enabled:
+        _background_tasks.append(asyncio.create_task(warmup.run(), name="warmup"))
+    if outbound_sender is not None:
+        await outbound_sender.start()
+    if ingest_queue is not None:
+        await ingest_queue.start()
+    if message_router.write_behind:
+        _background_tasks.append(
+            start_periodic(settings.bot_state_write_behind_sec, message_router.flush_chat_states, "chat-state-flush")
+        )
+    if revalidation_outbox is not None:
+        _background_tasks.append(
+            start_periodic(1.0, lambda: revalidation_outbox.dispatch_due(revalidator), "revalidation-outbox")
+        )
+
+
 @api.on_event("shutdown")
-def shutdown_event() -> None:
-    whatsapp_api.close()
-    revalidator.close()
+async def shutdown_event() -> None:
+    if ingest_queue is not None:
+        await ingest_queue.stop(drain=settings.bot_ingest_drain_on_shutdown)
+    if outbound_sender is not None:
+        await outbound_sender.stop(drain=settings.bot_ingest_drain_on_shutdown)
+    for task in _background_tasks:
+        await cancel_task(task)
+    _background_tasks.clear()
+    await message_router.flush_chat_states()
+    await close_quietly(whatsapp_api)
+    await close_quietly(revalidator)
+    await close_quietly(supabase_service)
+    await close_quietly(dedup_store)
+    await close_quietly(revalidation_outbox)
+    await close_quietly(rate_limiter)
+    await close_quietly(outbound_pacer)
 
 
 @api.get("/healthz", response_model=Dict[str, str])
@@ -106,6 +182,18 @@ def healthz() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+@api.get("/readyz")
+def readyz() -> JSONResponse:
+    report = warmup.report()
+    status_code = status.HTTP_200_OK if report["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(report, status_code=status_code)
+
+
+@api.get("/metrics")
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type=REGISTRY.CONTENT_TYPE)
+
+
 @api.get("/webhook/whatsapp")
 def whatsapp_verify(
     hub_mode: str = Query("", alias="hub.mode"),
@@ -123,18 +211,71 @@ async def whatsapp_webhook(request: Request) -> JSONResponse:
     signature = request.headers.get("x-hub-signature-256")
     if not whatsapp_api.verify_signature(signature, raw_body):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid signature")
+    if not whatsapp_api.has_messages(raw_body):
+        # Delivery/read statuses: nothing to route, so skip parsing entirely.
+        return JSONResponse({"status": "accepted"})
     try:
-        payload = json.loads(raw_body.decode("utf-8"))
-    except json.JSONDecodeError as exc:  # pragma: no cover - defensive
+        messages = whatsapp_api.decode_messages(raw_body)
+    except ValueError as exc:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON") from exc
-    await run_in_threadpool(message_router.handle_payload, payload)
+    if ingest_queue is None:
+        await message_router.handle_messages(messages)
+        return JSONResponse({"status": "accepted"})
+    rejected = [
+        message for message in await message_router.accept_messages(messages) if not ingest_queue.submit(message)
+    ]
+    for message in rejected:
+        await message_router.release(message)
+    if rejected:
+        # Ask Meta to redeliver rather than silently dropping teacher messages.
+        return JSONResponse({"status": "busy"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
     return JSONResponse({"status": "accepted"})
 
 
 @api.post("/publish/revalidate")
 async def publish_revalidate(body: RevalidateRequest = Body(...)) -> JSONResponse:
-    results = await run_in_threadpool(revalidator.trigger, body.paths)
+    results = await call_io(revalidator.trigger, body.paths)
     return JSONResponse({"results": results})
 
 
-__all__ = ["api"]
+@api.post("/lessons/import")
+async def lessons_import(
+    request: Request,
+    author: str = Query(..., min_length=1),
+    filename: Optional[str] = Query(None),
+    x_import_token: Optional[str] = Header(None),
+) -> JSONResponse:
+    if not settings.bot_import_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Lesson import is disabled")
+    if not hmac.compare_digest(x_import_token or "", settings.bot_import_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid import token")
+    # Spool the upload instead of buffering it; large bodies go to disk.
+    with tempfile.SpooledTemporaryFile(max_size=settings.bot_media_spool_bytes) as spool:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > settings.bot_media_max_bytes:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Import file too large")
+            spool.write(chunk)
+        spool.seek(0)
+        fmt = detect_format(filename, request.headers.get("content-type"))
+        report = await import_lesson(supabase_service, spool, author, fmt)
+    status_code = status.HTTP_201_CREATED if report.lesson_id else status.HTTP_422_UNPROCESSABLE_ENTITY
+    return JSONResponse(report.as_dict(), status_code=status_code)
+
+
+@api.get("/outbound/stats")
+def outbound_stats() -> JSONResponse:
+    if outbound_sender is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Outbound queue is disabled")
+    return JSONResponse(outbound_sender.stats())
+
+
+@api.get("/publish/outbox")
+def publish_outbox() -> JSONResponse:
+    if revalidation_outbox is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Revalidation outbox is disabled")
+    return JSONResponse(revalidation_outbox.report())
+
+
+__all__ = ["JsonFormatter", "api", "setup_logging"]
@@ -0,0 +1,73 @@
+"""Compare the keyword-dispatch CommandParser with the legacy regex cascade.
+
+Run with ``python -m bot.benchmarks.bench_commands``.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable, Dict, List
+
+from bot.benchmarks.legacy_commands import LegacyCommandParser
+from bot.core.commands import CommandParser
+
+_MARKDOWN_PARAGRAPH = "## Water cycle\nEvaporation, condensation and *precipitation* move water around.\n\n"
+
+
+def build_corpus(pathological_size: int) -> Dict[str, List[str]]:
+    """Return named groups of inputs covering everyday and worst-case shapes."""
+
+    return {
+        "everyday": [
+            "HELP",
+            "NEW LESSON: Solar System | Level: Grade 6 | Topic: Science",
+            "ADD BODY: # Planets\nEight planets orbit the sun.",
+            'ADD QUIZ: "What is 2+2?" | A) 4 | B) 5 | C) 6 | ANS: A',
+            "ADD MEDIA: image",
+            "PUBLISH",
+            "CANCEL",
+            "what do I do now?",
+        ],
+        "body_4kb": ["ADD BODY: " + _MARKDOWN_PARAGRAPH * 50],
+        "body_64kb": ["ADD BODY: " + _MARKDOWN_PARAGRAPH * 800],
+        "quiz_quoted_prompt": ['ADD QUIZ: "' + 'a" | A) 1 | B) 2 | C) 3 | ANS: A x' * 100],
+        "quiz_whitespace_option": ['ADD QUIZ: "q" | A) ' + " " * pathological_size + "x"],
+        "media_whitespace": ["ADD MEDIA" + " " * pathological_size + ":" + " " * pathological_size + "x"],
+    }
+
+
+def _time(parse: Callable[[str], object], inputs: List[str], min_seconds: float) -> float:
+    iterations = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds or iterations == 0:
+        for text in inputs:
+            parse(text)
+        iterations += 1
+        elapsed = time.perf_counter() - started
+    return elapsed / (iterations * len(inputs))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--pathological-size",
+        type=int,
+        default=600,
+        help="Whitespace run length in the worst-case inputs (the legacy parser is cubic in it).",
+    )
+    parser.add_argument("--min-seconds", type=float, default=0.2)
+    args = parser.parse_args()
+
+    current, legacy = CommandParser(), LegacyCommandParser()
+    print(f"{'case':<24}{'legacy us':>12}{'dispatch us':>14}{'speed-up':>10}")
+    for name, inputs in build_corpus(args.pathological_size).items():
+        for text in inputs:
+            assert current.parse(text) == legacy.parse(text), name
+        before = _time(legacy.parse, inputs, args.min_seconds) * 1e6
+        after = _time(current.parse, inputs, args.min_seconds) * 1e6
+        print(f"{name:<24}{before:>12.1f}{after:>14.1f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
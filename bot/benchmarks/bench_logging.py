@@ -0,0 +1,103 @@
+"""Compare the original synchronous ``JsonFormatter`` handler with the queued pipeline.
+
+Reports the time each ``logger.info`` call costs the request thread, and the
+end-to-end throughput until every record is written. Run with
+``python -m bot.benchmarks.bench_logging``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import queue
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueListener
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from bot.core import logs
+from bot.core.logs import BackgroundQueueHandler, JsonFormatter
+
+
+class LegacyJsonFormatter(logging.Formatter):
+    """The formatter as it was before the logging pipeline moved to ``bot.core.logs``."""
+
+    DEFAULT_FIELDS = set(JsonFormatter.DEFAULT_FIELDS) - {"message", "taskName"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        base: Dict[str, Any] = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        extras = {key: value for key, value in record.__dict__.items() if key not in self.DEFAULT_FIELDS}
+        if extras:
+            base.update(extras)
+        if record.exc_info:
+            base["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(base, default=str)
+
+
+def _legacy(stream: Any) -> Tuple[logging.Handler, Optional[QueueListener]]:
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(LegacyJsonFormatter())
+    return handler, None
+
+
+def _queued(fast_json: bool) -> Callable[[Any], Tuple[logging.Handler, Optional[QueueListener]]]:
+    def build(stream: Any) -> Tuple[logging.Handler, Optional[QueueListener]]:
+        output = logging.StreamHandler(stream)
+        output.setFormatter(JsonFormatter(fast_json=fast_json))
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        listener = QueueListener(records, output)
+        listener.start()
+        return BackgroundQueueHandler(records), listener
+
+    return build
+
+
+def run(build: Callable[[Any], Tuple[logging.Handler, Optional[QueueListener]]], count: int) -> Tuple[float, float]:
+    """Return (caller microseconds per record, records per second end to end)."""
+
+    logger = logging.getLogger("bench.logging")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    with open(os.devnull, "w", encoding="utf-8") as sink:
+        handler, listener = build(sink)
+        logger.handlers[:] = [handler]
+        body = "Rain falls when water vapour condenses. " * 200
+        started = time.perf_counter()
+        for index in range(count):
+            if index % 50 == 0:
+                logger.error("Failed to create lesson", extra={"payload": {"title": "Rain", "body_md": body}, "error": "boom"})
+            else:
+                logger.info(
+                    "Skipping redelivered message",
+                    extra={"sender": "+15551234567", "message_id": f"wamid.{index}", "attempt": index % 3},
+                )
+        enqueued = time.perf_counter()
+        if listener is not None:
+            listener.stop()
+        finished = time.perf_counter()
+        logger.handlers.clear()
+    return (enqueued - started) / count * 1e6, count / (finished - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=50_000)
+    args = parser.parse_args()
+
+    modes = [("legacy sync", _legacy), ("queued stdlib json", _queued(False))]
+    if logs.orjson is not None:
+        modes.append(("queued orjson", _queued(True)))
+    print(f"{'mode':<22}{'caller us/rec':>15}{'records/s':>12}")
+    for name, build in modes:
+        caller_us, throughput = run(build, args.count)
+        print(f"{name:<22}{caller_us:>15.2f}{throughput:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
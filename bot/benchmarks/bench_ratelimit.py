@@ -0,0 +1,122 @@
+"""Compare the sliding-window, GCRA and shared SQLite rate limiters at high sender cardinality.
+
+Run with ``python -m bot.benchmarks.bench_ratelimit [--senders N]``. The
+SQLite backend is also measured with ``--processes`` workers hammering one
+file, once writing it for every message (lease 1) and once with leases.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from bot.core.ratelimit import GCRARateLimiter, RateLimiter, SQLiteRateLimiter
+
+
+def _measure(factory: Callable[[], object], senders: List[str], rounds: int) -> Dict[str, float]:
+    # Timing and memory are measured in separate runs: tracemalloc slows every allocation.
+    gc.collect()
+    limiter = factory()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for sender in senders:
+            limiter.allow(sender)
+    elapsed = time.perf_counter() - started
+    del limiter
+
+    gc.collect()
+    tracemalloc.start()
+    limiter = factory()
+    for _ in range(rounds):
+        for sender in senders:
+            limiter.allow(sender)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    calls = rounds * len(senders)
+    return {
+        "calls_per_sec": calls / elapsed,
+        "ns_per_call": elapsed / calls * 1e9,
+        "retained_mb": current / 1e6,
+        "peak_mb": peak / 1e6,
+    }
+
+
+def _hammer(path: str, lease: int, senders: List[str], calls: int, max_events: int, window: int, results) -> None:
+    limiter = SQLiteRateLimiter(path, max_events, window, lease=lease)
+    started = time.perf_counter()
+    allowed = sum(limiter.allow(senders[index % len(senders)]) for index in range(calls))
+    results.put((time.perf_counter() - started, allowed))
+    limiter.close()
+
+
+def _contended(path: str, lease: int, processes: int, senders: List[str], calls: int, max_events: int, window: int) -> Dict[str, float]:
+    """Run ``processes`` workers against one file; return total calls/s and the share allowed."""
+
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=_hammer, args=(path, lease, senders, calls, max_events, window, results))
+        for _ in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    slowest = max(elapsed for elapsed, _ in outcomes)
+    return {
+        "calls_per_sec": processes * calls / slowest,
+        "allowed": sum(allowed for _, allowed in outcomes) / (processes * calls),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--senders", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--max-events", type=int, default=20)
+    parser.add_argument("--window", type=int, default=60)
+    parser.add_argument("--skip-sqlite", action="store_true", help="Skip the shared SQLite backend.")
+    parser.add_argument("--processes", type=int, default=8, help="Workers sharing one SQLite file (0 skips).")
+    parser.add_argument("--contended-calls", type=int, default=20_000, help="allow() calls per worker.")
+    parser.add_argument("--lease", type=int, default=4)
+    args = parser.parse_args()
+    scratch = tempfile.mkdtemp(prefix="bench-ratelimit-")
+    sqlite_runs = iter(range(1_000_000))
+
+    senders = [f"+234{index:09d}" for index in range(args.senders)]
+    limiters: Dict[str, Callable[[], object]] = {
+        "sliding": lambda: RateLimiter(args.max_events, args.window),
+        "gcra": lambda: GCRARateLimiter(args.max_events, args.window),
+    }
+    if not args.skip_sqlite:
+        limiters["sqlite"] = lambda: SQLiteRateLimiter(
+            os.path.join(scratch, f"limits-{next(sqlite_runs)}.sqlite3"), args.max_events, args.window
+        )
+    print(f"{args.senders} senders x {args.rounds} rounds")
+    print(f"{'limiter':<10}{'calls/s':>14}{'ns/call':>10}{'retained MB':>14}{'peak MB':>10}")
+    for name, factory in limiters.items():
+        result = _measure(factory, senders, args.rounds)
+        print(
+            f"{name:<10}{result['calls_per_sec']:>14,.0f}{result['ns_per_call']:>10.0f}"
+            f"{result['retained_mb']:>14.1f}{result['peak_mb']:>10.1f}"
+        )
+    if args.skip_sqlite or args.processes <= 0:
+        return
+    # A small pool of busy senders under a limit they do not reach, so every call is an allowed one.
+    hot = senders[:64]
+    busy_max = args.processes * args.contended_calls * args.window
+    print(f"\n{args.processes} processes x {args.contended_calls} calls on one SQLite file, {len(hot)} senders")
+    print(f"{'lease':<10}{'calls/s':>14}{'allowed':>10}")
+    for lease in dict.fromkeys((1, args.lease)):
+        path = os.path.join(scratch, f"contended-{lease}.sqlite3")
+        result = _contended(path, lease, args.processes, hot, args.contended_calls, busy_max, args.window)
+        print(f"{lease:<10}{result['calls_per_sec']:>14,.0f}{result['allowed']:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
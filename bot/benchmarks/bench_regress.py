@@ -0,0 +1,286 @@
+"""Micro-benchmark regression check for the bot's hot paths against stored baselines.
+
+Each case is timed as the best of several rounds and divided by a fixed
+pure-Python calibration loop, so a baseline recorded on one machine stays
+meaningful on another. A case fails when its ratio grows more than the
+threshold past the baseline.
+
+- ``python -m bot.benchmarks.bench_regress`` checks against the baselines and
+  exits with status 1 on any regression.
+- ``python -m bot.benchmarks.bench_regress --update`` re-records
+  ``baselines.json`` after an intended change.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from bot.benchmarks.bench_commands import build_corpus
+from bot.benchmarks.bench_webhook import message_payload
+from bot.core.commands import CommandParser
+from bot.core.logs import JsonFormatter
+from bot.core.ratelimit import GCRARateLimiter, RateLimiter
+from bot.integrations.supabase_client import _sanitize_markdown, _slugify
+from bot.integrations.whatsapp import WhatsAppAPI
+
+BASELINE_PATH = Path(__file__).with_name("baselines.json")
+DEFAULT_THRESHOLD = 0.25
+
+
+@dataclass
+class Case:
+    """A benchmark: ``run()`` performs ``ops`` operations of the measured function."""
+
+    name: str
+    run: Callable[[], None]
+    ops: int
+    # Thread-contended and C-bound cases (hashing) track the pure-Python
+    # calibration loop less closely, so they may tolerate more drift.
+    threshold: Optional[float] = None
+
+
+@dataclass
+class _Settings:
+    whatsapp_token: str = "token"
+    whatsapp_app_secret: str = "secret"
+
+
+def _calibration() -> None:
+    table: Dict[int, int] = {}
+    for index in range(20_000):
+        table[index % 97] = table.get(index % 97, 0) + index
+
+
+def _parse_case(name: str, inputs: List[str]) -> Case:
+    parser = CommandParser()
+
+    def run() -> None:
+        for text in inputs:
+            parser.parse(text)
+
+    return Case(f"parse.{name}", run, len(inputs))
+
+
+def _contended_case(name: str, factory: Callable[[], object], threads: int = 4, calls: int = 2_000) -> Case:
+    senders = [f"+234{index:09d}" for index in range(256)]
+
+    def run() -> None:
+        limiter = factory()
+
+        def hammer(offset: int) -> None:
+            for index in range(calls):
+                limiter.allow(senders[(index + offset) % len(senders)])
+
+        workers = [threading.Thread(target=hammer, args=(offset * 7,)) for offset in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    return Case(f"ratelimit.{name}", run, threads * calls, threshold=0.5)
+
+
+def _large_webhook() -> Dict:
+    payloads = [json.loads(message_payload(index)) for index in range(60)]
+    value = payloads[0]["entry"][0]["changes"][0]["value"]
+    for payload in payloads[1:]:
+        value["messages"].extend(payload["entry"][0]["changes"][0]["value"]["messages"])
+    return payloads[0]
+
+
+def build_cases() -> List[Case]:
+    corpus = build_corpus(pathological_size=600)
+    api = WhatsAppAPI(_Settings())
+    webhook = _large_webhook()
+    raw = json.dumps(webhook).encode() * 16
+    signature = "sha256=" + hmac.new(b"secret", raw, hashlib.sha256).hexdigest()
+    formatter = JsonFormatter(fast_json=False)
+    record = logging.LogRecord("bot.core.router", logging.INFO, __file__, 1, "Skipping redelivered message", None, None)
+    record.__dict__.update(sender="+15551234567", message_id="wamid.HBgLMTU1NTEyMzQ1NjcVAgASGBQzQTdGRjA", attempt=2)
+    body = "## Water cycle\n<script>alert(1)</script>Rain *falls*.\n\n" * 1200
+    titles = ["Water Cycle", "Photosynthesis & Respiration: Part 2!", "  Ọjọ́ Àìkú  ", "x" * 200]
+
+    def repeat(func: Callable[[], object], count: int) -> Callable[[], None]:
+        def run() -> None:
+            for _ in range(count):
+                func()
+
+        return run
+
+    def slugify_all() -> None:
+        for title in titles:
+            _slugify(title)
+
+    return [
+        _parse_case("everyday", corpus["everyday"]),
+        _parse_case("body_64kb", corpus["body_64kb"]),
+        _parse_case("pathological", corpus["quiz_quoted_prompt"] + corpus["quiz_whitespace_option"] + corpus["media_whitespace"]),
+        _contended_case("sliding", lambda: RateLimiter(20, 60)),
+        _contended_case("gcra", lambda: GCRARateLimiter(20, 60)),
+        Case("whatsapp.extract_messages_60", repeat(lambda: api.extract_messages(webhook), 10), 10),
+        Case("whatsapp.verify_signature_1mb", repeat(lambda: api.verify_signature(signature, raw), 5), 5, threshold=0.5),
+        Case("logs.json_format", repeat(lambda: formatter.format(record), 200), 200),
+        Case("supabase.sanitize_markdown_64kb", repeat(lambda: _sanitize_markdown(body), 5), 5),
+        Case("supabase.slugify", repeat(slugify_all, 100), 100 * len(titles)),
+    ]
+
+
+def select(only: Optional[List[str]] = None) -> List[Case]:
+    """All cases, or those whose name starts with one of the ``only`` prefixes."""
+
+    return [case for case in build_cases() if not only or any(case.name.startswith(prefix) for prefix in only)]
+
+
+def _round(run: Callable[[], None], min_seconds: float) -> float:
+    iterations = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds or iterations == 0:
+        run()
+        iterations += 1
+        elapsed = time.perf_counter() - started
+    return elapsed / iterations
+
+
+def measure_case(case: Case, rounds: int, min_seconds: float) -> Dict[str, float]:
+    """Time ``case`` and the calibration loop in alternating rounds; keep the best of each.
+
+    Alternating the two keeps CPU frequency changes and noisy neighbours from
+    skewing the ratio towards either side.
+    """
+
+    best_case = best_calibration = float("inf")
+    for _ in range(rounds):
+        best_calibration = min(best_calibration, _round(_calibration, min_seconds))
+        best_case = min(best_case, _round(case.run, min_seconds))
+    return {"ns_per_op": best_case / case.ops * 1e9, "relative": best_case / best_calibration}
+
+
+def measure(cases: List[Case], rounds: int, min_seconds: float) -> Dict[str, Dict[str, float]]:
+    return {case.name: measure_case(case, rounds, min_seconds) for case in cases}
+
+
+def confirm(
+    cases: List[Case],
+    results: Dict[str, Dict[str, float]],
+    baselines: Dict[str, Dict[str, float]],
+    default_threshold: float,
+    rounds: int,
+    min_seconds: float,
+    retries: int = 2,
+) -> List[str]:
+    """Compare, re-measuring apparent regressions up to ``retries`` times.
+
+    A case only fails when every attempt is past its threshold, which filters
+    out one-off scheduler noise without hiding a real slow-down.
+    """
+
+    by_name = {case.name: case for case in cases}
+    thresholds = {case.name: case.threshold for case in cases if case.threshold is not None}
+    failures = compare(results, baselines, thresholds, default_threshold)
+    for _ in range(retries):
+        if not failures:
+            break
+        for name in [failure.split(":", 1)[0] for failure in failures]:
+            again = measure_case(by_name[name], rounds, min_seconds)
+            if again["relative"] < results[name]["relative"]:
+                results[name] = again
+        failures = compare(results, baselines, thresholds, default_threshold)
+    return failures
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baselines: Dict[str, Dict[str, float]],
+    thresholds: Dict[str, float],
+    default_threshold: float = DEFAULT_THRESHOLD,
+) -> List[str]:
+    """Return a message per case whose calibrated time grew past its threshold."""
+
+    failures = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        limit = thresholds.get(name, default_threshold)
+        change = result["relative"] / baseline["relative"] - 1
+        if change > limit:
+            failures.append(f"{name}: {change:+.0%} vs baseline (limit +{limit:.0%})")
+    return failures
+
+
+def load_baselines(path: Path = BASELINE_PATH) -> Dict[str, Dict[str, float]]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())["cases"]
+
+
+def save_baselines(results: Dict[str, Dict[str, float]], path: Path = BASELINE_PATH) -> None:
+    document = {
+        "python": sys.version.split()[0],
+        "cases": {
+            name: {"ns_per_op": round(result["ns_per_op"], 1), "relative": float(f"{result['relative']:.4g}")}
+            for name, result in sorted(results.items())
+        },
+    }
+    path.write_text(json.dumps(document, indent=2) + "\n")
+
+
+def run_check(
+    only: Optional[List[str]] = None,
+    rounds: int = 5,
+    min_seconds: float = 0.05,
+    threshold: float = DEFAULT_THRESHOLD,
+    path: Path = BASELINE_PATH,
+) -> List[str]:
+    """Measure the selected cases and return the regressions against ``path``."""
+
+    cases = select(only)
+    results = measure(cases, rounds, min_seconds)
+    return confirm(cases, results, load_baselines(path), threshold, rounds, min_seconds)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--update", action="store_true", help="Record new baselines instead of checking.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slow-down (0.25 = 25%%).")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="Minimum duration of each round.")
+    parser.add_argument("--only", action="append", help="Run only cases starting with this prefix, e.g. parse.")
+    parser.add_argument("--baselines", type=Path, default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    cases = select(args.only)
+    results = measure(cases, args.rounds, args.min_seconds)
+    if args.update:
+        merged = {**load_baselines(args.baselines), **results}
+        save_baselines(merged, args.baselines)
+        print(f"Recorded {len(results)} baselines in {args.baselines}")
+        return
+
+    baselines = load_baselines(args.baselines)
+    failures = confirm(cases, results, baselines, args.threshold, args.rounds, args.min_seconds)
+    print(f"{'case':<34}{'ns/op':>12}{'baseline':>12}{'change':>9}")
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            print(f"{name:<34}{result['ns_per_op']:>12.0f}{'-':>12}{'new':>9}")
+            continue
+        change = result["relative"] / baseline["relative"] - 1
+        print(f"{name:<34}{result['ns_per_op']:>12.0f}{baseline['ns_per_op']:>12.0f}{change:>+9.0%}")
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Compare webhook ingress: ``json.loads`` + ``extract_messages`` vs the pre-filter and typed decoder.
+
+Run with ``python -m bot.benchmarks.bench_webhook``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List
+
+from bot.integrations.whatsapp import InboundMessage, WhatsAppAPI
+
+
+@dataclass
+class _Settings:
+    whatsapp_token: str = "token"
+
+
+def _envelope(value: Dict[str, Any]) -> bytes:
+    value = {
+        "messaging_product": "whatsapp",
+        "metadata": {"display_phone_number": "15550001111", "phone_number_id": "1234"},
+        **value,
+    }
+    payload = {"object": "whatsapp_business_account", "entry": [{"id": "987", "changes": [{"field": "messages", "value": value}]}]}
+    return json.dumps(payload).encode()
+
+
+def status_payload(index: int) -> bytes:
+    state = ("sent", "delivered", "read")[index % 3]
+    return _envelope(
+        {
+            "statuses": [
+                {
+                    "id": f"wamid.out-{index}",
+                    "status": state,
+                    "timestamp": "1700000000",
+                    "recipient_id": "15551234567",
+                    "conversation": {"id": "c1", "origin": {"type": "service"}},
+                    "pricing": {"billable": True, "pricing_model": "CBP", "category": "service"},
+                }
+            ]
+        }
+    )
+
+
+def message_payload(index: int) -> bytes:
+    contacts = [{"profile": {"name": "Teacher"}, "wa_id": "15551234567"}]
+    if index % 4 == 0:
+        message = {"type": "image", "image": {"id": f"media-{index}", "mime_type": "image/jpeg", "caption": "Diagram"}}
+    else:
+        body = 'ADD QUIZ: "What is 2+2?" | A) 4 | B) 5 | C) 6 | ANS: A' if index % 2 else "ADD BODY: " + "Rain falls. " * 40
+        message = {"type": "text", "text": {"body": body}}
+    message.update({"from": "15551234567", "id": f"wamid.in-{index}", "timestamp": "1700000000"})
+    return _envelope({"contacts": contacts, "messages": [message]})
+
+
+def build_mix(count: int, status_share: float, seed: int = 7) -> List[bytes]:
+    """Return ``count`` webhook bodies, ``status_share`` of them status-only."""
+
+    rng = random.Random(seed)
+    return [status_payload(index) if rng.random() < status_share else message_payload(index) for index in range(count)]
+
+
+def legacy_ingress(api: WhatsAppAPI, raw_body: bytes) -> List[InboundMessage]:
+    return api.extract_messages(json.loads(raw_body.decode("utf-8")))
+
+
+def fast_ingress(api: WhatsAppAPI, raw_body: bytes) -> List[InboundMessage]:
+    if not api.has_messages(raw_body):
+        return []
+    return api.decode_messages(raw_body)
+
+
+def _time(ingress: Callable[[WhatsAppAPI, bytes], object], api: WhatsAppAPI, bodies: List[bytes], min_seconds: float) -> float:
+    iterations = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds or iterations == 0:
+        for body in bodies:
+            ingress(api, body)
+        iterations += 1
+        elapsed = time.perf_counter() - started
+    return elapsed / (iterations * len(bodies))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=1000, help="Webhook bodies per mix.")
+    parser.add_argument("--min-seconds", type=float, default=0.5)
+    args = parser.parse_args()
+
+    api = WhatsAppAPI(_Settings())
+    print(f"{'status share':<14}{'legacy us':>12}{'fast us':>10}{'speed-up':>10}")
+    for share in (0.0, 0.5, 0.8, 0.95):
+        bodies = build_mix(args.count, share)
+        for body in bodies:
+            assert fast_ingress(api, body) == legacy_ingress(api, body)
+        before = _time(legacy_ingress, api, bodies, args.min_seconds) * 1e6
+        after = _time(fast_ingress, api, bodies, args.min_seconds) * 1e6
+        print(f"{share:<14.0%}{before:>12.1f}{after:>10.1f}{before / after:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
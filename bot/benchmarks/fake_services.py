@@ -0,0 +1,330 @@
+"""Local HTTP stand-ins for the Graph API, PostgREST/Storage and the Next.js revalidate route.
+
+One threaded server answers all three under different path prefixes:
+
+- ``/graph/v20.0/...``: message sends, media metadata and media downloads.
+- ``/rest/v1/...`` and ``/storage/v1/...``: an in-memory PostgREST with the
+  ``apply_message_writes``, ``append_lesson_body`` and ``publish_lesson_atomic``
+  functions, plus object uploads.
+- ``/api/revalidate``: the Next.js revalidation endpoint.
+
+Each service can be given an injected latency and error rate. ``GET /_stats``
+reports request counts and the time of every WhatsApp reply. The load test
+starts it with ``python -m bot.benchmarks.fake_services``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+GRAPH_PREFIX = "/graph/v20.0"
+SERVICES = ("graph", "supabase", "revalidate")
+MEDIA_BYTES = b"\xff\xd8\xff" + b"\x00" * (48 * 1024)
+
+_KEYS = {"chat_state": "sender_phone", "lessons": "id"}
+
+
+def parse_service_values(spec: str) -> Dict[str, float]:
+    """Parse ``"graph=80,supabase=15"`` into a value per service."""
+
+    values: Dict[str, float] = {}
+    for item in (spec or "").split(","):
+        name, sep, value = item.partition("=")
+        if not sep:
+            continue
+        if name.strip() not in SERVICES:
+            raise ValueError(f"Unknown service {name.strip()!r}; expected one of {', '.join(SERVICES)}")
+        values[name.strip()] = float(value)
+    return values
+
+
+class FakeBackend:
+    """In-memory state shared by every request handler thread."""
+
+    def __init__(self, latency_ms: Dict[str, float], error_rate: Dict[str, float], seed: int = 7) -> None:
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.rng = random.Random(seed)
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.requests = {service: 0 for service in SERVICES}
+        self.errors = {service: 0 for service in SERVICES}
+        self.replies: List[Tuple[str, float]] = []
+        self.revalidated: List[str] = []
+
+    # ------------------------------------------------------------------
+    def delay_and_fail(self, service: str) -> bool:
+        """Sleep for the service's latency; return True if this call should fail."""
+
+        with self.lock:
+            self.requests[service] += 1
+            jitter = self.rng.uniform(0.5, 1.5)
+            fail = self.rng.random() < self.error_rate.get(service, 0.0)
+            if fail:
+                self.errors[service] += 1
+        latency = self.latency_ms.get(service, 0.0)
+        if latency > 0:
+            time.sleep(latency * jitter / 1000)
+        return fail
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": dict(self.requests),
+                "errors": dict(self.errors),
+                "replies": list(self.replies),
+                "revalidated": len(self.revalidated),
+                "rows": {table: len(rows) for table, rows in self.tables.items()},
+            }
+
+    # ------------------------------------------------------------------
+    # PostgREST
+    # ------------------------------------------------------------------
+    def select(self, table: str, filters: Dict[str, str]) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [dict(row) for row in self.tables.get(table, []) if _matches(row, filters)]
+
+    def insert(self, table: str, rows: List[Dict[str, Any]], upsert: bool) -> List[Dict[str, Any]]:
+        key = _KEYS.get(table, "id")
+        stored: List[Dict[str, Any]] = []
+        with self.lock:
+            existing = self.tables.setdefault(table, [])
+            for row in rows:
+                row = dict(row)
+                row.setdefault("id", str(uuid.uuid4()))
+                if table == "lessons":
+                    row.setdefault("body_version", 0)
+                    row.setdefault("slug", None)
+                match = next((item for item in existing if upsert and item.get(key) == row.get(key)), None)
+                if match is not None:
+                    match.update(row)
+                    stored.append(dict(match))
+                else:
+                    existing.append(row)
+                    stored.append(dict(row))
+        return stored
+
+    def update(self, table: str, filters: Dict[str, str], values: Dict[str, Any]) -> List[Dict[str, Any]]:
+        with self.lock:
+            rows = [row for row in self.tables.get(table, []) if _matches(row, filters)]
+            for row in rows:
+                row.update(values)
+            return [dict(row) for row in rows]
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        if name == "append_lesson_body":
+            version = self._append(params["p_lesson_id"], params["p_chunk"])
+            return [] if version is None else [{"new_version": version}]
+        if name == "apply_message_writes":
+            return self._apply_writes(params)
+        if name == "publish_lesson_atomic":
+            return self._publish(params)
+        return None
+
+    def _lesson(self, lesson_id: str) -> Optional[Dict[str, Any]]:
+        return next((row for row in self.tables.get("lessons", []) if row.get("id") == lesson_id), None)
+
+    def _append(self, lesson_id: str, chunk: str) -> Optional[int]:
+        with self.lock:
+            lesson = self._lesson(lesson_id)
+            if lesson is None:
+                return None
+            body = lesson.get("body_md") or ""
+            lesson["body_md"] = f"{body}\n\n{chunk}" if body else chunk
+            lesson["body_version"] = lesson.get("body_version", 0) + 1
+            return lesson["body_version"]
+
+    def _apply_writes(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        applied = 0
+        for append in params.get("p_body_appends") or []:
+            if self._append(append["lesson_id"], append["chunk"]) is not None:
+                applied += 1
+        for table, key in (("quizzes", "p_quizzes"), ("lesson_media", "p_media")):
+            rows = params.get(key) or []
+            applied += len(self.insert(table, rows, upsert=False))
+        if params.get("p_chat_state"):
+            applied += len(self.insert("chat_state", [params["p_chat_state"]], upsert=True))
+        return [{"applied": applied}]
+
+    def _publish(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        with self.lock:
+            lesson = self._lesson(params["p_lesson_id"])
+            if lesson is None:
+                return []
+            if not lesson.get("slug"):
+                base = "".join(ch if ch.isalnum() else "-" for ch in (lesson.get("title") or "lesson").lower()).strip("-")
+                taken = {row.get("slug") for row in self.tables["lessons"]}
+                slug, suffix = base or "lesson", 2
+                while slug in taken:
+                    slug, suffix = f"{base}-{suffix}", suffix + 1
+                lesson["slug"] = slug
+            lesson["status"] = "published"
+            publish_id = str(uuid.uuid4())
+            self.tables.setdefault("publishes", []).append(
+                {"id": publish_id, "lesson_id": lesson["id"], "channel": params["p_channel"], "result": params["p_result"]}
+            )
+            for state in self.tables.get("chat_state", []):
+                if state.get("sender_phone") == params["p_sender"]:
+                    state.update(active_lesson=None, last_cmd="publish")
+            return [{"slug": lesson["slug"], "title": lesson.get("title"), "publish_id": publish_id}]
+
+
+def _matches(row: Dict[str, Any], filters: Dict[str, str]) -> bool:
+    for column, condition in filters.items():
+        operator, _, value = condition.partition(".")
+        if operator == "eq" and str(row.get(column)) != value:
+            return False
+    return True
+
+
+class FakeServicesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeServicesServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    # ------------------------------------------------------------------
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b"".join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: Any = None, content_type: str = "application/json") -> None:
+        data = body if isinstance(body, bytes) else json.dumps(body if body is not None else {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def _service(self, path: str) -> Optional[str]:
+        if path.startswith(GRAPH_PREFIX) or path.startswith("/media/"):
+            return "graph"
+        if path.startswith("/rest/v1") or path.startswith("/storage/v1"):
+            return "supabase"
+        if path.startswith("/api/revalidate"):
+            return "revalidate"
+        return None
+
+    def _dispatch(self) -> None:
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        body = self._read_body()
+        if path == "/_stats":
+            self._send(200, self.server.backend.stats())
+            return
+        service = self._service(path)
+        if service is None:
+            self._send(404, {"message": "not found"})
+            return
+        if self.server.backend.delay_and_fail(service):
+            self._send(503, {"message": "injected failure", "code": "503"})
+            return
+        getattr(self, f"_{service}")(path, dict(parse_qsl(url.query)), body)
+
+    do_GET = do_POST = do_PATCH = do_PUT = do_HEAD = _dispatch
+
+    # ------------------------------------------------------------------
+    def _graph(self, path: str, query: Dict[str, str], body: bytes) -> None:
+        backend = self.server.backend
+        if path.startswith("/media/"):
+            self._send(200, MEDIA_BYTES, content_type="image/jpeg")
+            return
+        if path.endswith("/messages") and self.command == "POST":
+            recipient = json.loads(body or b"{}").get("to", "")
+            with backend.lock:
+                backend.replies.append((recipient, time.time()))
+            self._send(200, {"messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]})
+            return
+        media_id = path.rsplit("/", 1)[-1]
+        if self.command == "GET" and media_id:
+            host = self.headers.get("Host")
+            self._send(
+                200,
+                {"id": media_id, "url": f"http://{host}/media/{media_id}", "mime_type": "image/jpeg", "file_size": len(MEDIA_BYTES)},
+            )
+            return
+        self._send(200, {})
+
+    def _supabase(self, path: str, query: Dict[str, str], body: bytes) -> None:
+        backend = self.server.backend
+        if path.startswith("/storage/v1/object/"):
+            self._send(200, {"Key": path[len("/storage/v1/object/"):]})
+            return
+        parts = path[len("/rest/v1/"):].split("/")
+        if parts[0] == "rpc":
+            rows = backend.rpc(parts[1], json.loads(body or b"{}"))
+            if rows is None:
+                self._send(404, {"code": "PGRST202", "message": f"Could not find the function {parts[1]}"})
+            else:
+                self._send(200, rows)
+            return
+        table = parts[0]
+        filters = {key: value for key, value in query.items() if key not in ("select", "on_conflict", "columns")}
+        if self.command in ("GET", "HEAD"):
+            self._send(200, backend.select(table, filters))
+        elif self.command == "POST":
+            payload = json.loads(body or b"[]")
+            rows = payload if isinstance(payload, list) else [payload]
+            upsert = "merge-duplicates" in (self.headers.get("Prefer") or "")
+            self._send(201, backend.insert(table, rows, upsert))
+        elif self.command == "PATCH":
+            self._send(200, backend.update(table, filters, json.loads(body or b"{}")))
+        else:
+            self._send(405, {"message": "method not allowed"})
+
+    def _revalidate(self, path: str, query: Dict[str, str], body: bytes) -> None:
+        backend = self.server.backend
+        if self.command == "POST":
+            with backend.lock:
+                backend.revalidated.append(body.decode("utf-8", "replace"))
+        self._send(200, {"revalidated": True, "now": int(time.time() * 1000)})
+
+
+class FakeServicesServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address: Tuple[str, int], backend: FakeBackend) -> None:
+        super().__init__(address, FakeServicesHandler)
+        self.backend = backend
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free port; the chosen one is printed.")
+    parser.add_argument("--latency-ms", default="", help="Per-service latency, e.g. graph=80,supabase=15,revalidate=40.")
+    parser.add_argument("--error-rate", default="", help="Per-service share of 503 responses, e.g. graph=0.01.")
+    args = parser.parse_args()
+
+    backend = FakeBackend(parse_service_values(args.latency_ms), parse_service_values(args.error_rate))
+    server = FakeServicesServer((args.host, args.port), backend)
+    print(json.dumps({"port": server.server_address[1]}), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:  # pragma: no cover - interactive use
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
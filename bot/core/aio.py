@@ -0,0 +1,97 @@
+"""Helpers for driving sync or async integrations from the event loop."""
+from __future__ import annotations
+
+import asyncio
+import inspect
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from bot.core.metrics import DEPENDENCY_SECONDS
+from bot.core.tracing import KIND_CLIENT, span
+
+logger = logging.getLogger(__name__)
+
+
+async def call_io(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Call an integration method without blocking the event loop.
+
+    Coroutine functions (``AsyncSupabaseService`` and friends) are awaited
+    directly. Plain callables, such as the blocking ``httpx.Client`` based
+    integrations, are executed on the default thread pool instead.
+
+    Methods of objects with a ``metrics_name`` attribute are timed into
+    ``bot_dependency_seconds``, labelled by that name, the method name and
+    whether the call raised, and recorded as a ``<name>.<method>`` span of
+    the current message trace.
+    """
+
+    dependency = getattr(getattr(func, "__self__", None), "metrics_name", None)
+    if dependency is None:
+        return await _call(func, *args, **kwargs)
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with span(f"{dependency}.{func.__name__}", KIND_CLIENT):
+            result = await _call(func, *args, **kwargs)
+        outcome = "ok"
+        return result
+    finally:
+        DEPENDENCY_SECONDS.observe(time.perf_counter() - started, dependency, func.__name__, outcome)
+
+
+async def _call(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    if inspect.iscoroutinefunction(func):
+        return await func(*args, **kwargs)
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+async def call_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Call a local store method, off the loop when its owner sets ``blocking = True``.
+
+    File-backed stores (the SQLite dedup, rate-limit and outbox tables) wait
+    on disk and on other processes' write locks, so they run on the default
+    thread pool. In-memory stores answer in microseconds and are called
+    inline, where a thread hop would cost more than the call itself.
+    """
+
+    if getattr(getattr(func, "__self__", None), "blocking", False):
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return func(*args, **kwargs)
+
+
+async def close_quietly(resource: Any) -> None:
+    """Close a sync or async client, awaiting the result when needed."""
+
+    close = getattr(resource, "close", None)
+    if close is None:
+        return
+    result = close()
+    if inspect.isawaitable(result):
+        await result
+
+
+def start_periodic(interval: float, func: Callable[[], Awaitable[Any]], name: str) -> asyncio.Task:
+    """Run ``func`` every ``interval`` seconds on the current loop until cancelled."""
+
+    async def _loop() -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await func()
+            except Exception as exc:
+                logger.exception("Periodic task failed", extra={"task": name, "error": str(exc)})
+
+    return asyncio.create_task(_loop(), name=name)
+
+
+async def cancel_task(task: Any) -> None:
+    """Cancel ``task`` (if any) and wait for it to finish."""
+
+    if task is None:
+        return
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+__all__ = ["call_blocking", "call_io", "cancel_task", "close_quietly", "start_periodic"]
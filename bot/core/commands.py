@@ -4,7 +4,7 @@ from __future__ import annotations
 import enum
 import re
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional, Sequence
 
 
 class CommandType(str, enum.Enum):
@@ -46,118 +46,265 @@ CHEAT_SHEET = (
 )
 
 
-_HELP_PATTERN = re.compile(r"^\s*help\s*$", re.IGNORECASE)
-_NEW_LESSON_PATTERN = re.compile(
-    r"^\s*new\s*lesson\s*:?\s*(?P<title>[^|]+?)\s*\|\s*level\s*:?\s*(?P<level>[^|]+?)\s*\|\s*topic\s*:?\s*(?P<topic>.+)$",
+# Leading keyword of every command family. Families never share a prefix, so
+# the first keyword decides which sub-parser runs and no other family is tried.
+_KEYWORD_PATTERN = re.compile(
+    r"(?P<help>help)"
+    r"|(?P<new_lesson>new\s*lesson)"
+    r"|add\s*(?:(?P<add_body>body)|(?P<add_quiz>quiz)|(?P<add_media>media))"
+    r"|(?P<publish>publish)"
+    r"|(?P<cancel>cancel)",
     re.IGNORECASE,
 )
-_ADD_BODY_PATTERN = re.compile(r"^\s*add\s*body\s*:?(?P<body>.+)$", re.IGNORECASE | re.DOTALL)
-_ADD_MEDIA_PATTERN = re.compile(
-    r"^\s*add\s*media\s*:?\s*(?P<kind>image|audio|video)\s*$",
-    re.IGNORECASE,
-)
-_ADD_QUIZ_PATTERN = re.compile(
-    r"""
-        ^\s*add\s*quiz\s*:?[\s\u00A0]*
-        \"(?P<prompt>.+?)\"\s*
-        \|\s*A\)\s*(?P<option_a>[^|]+?)\s*
-        \|\s*B\)\s*(?P<option_b>[^|]+?)\s*
-        \|\s*C\)\s*(?P<option_c>[^|]+?)\s*
-        \|\s*ANS\s*:?[\s\u00A0]*(?P<answer>[ABCabc])\s*$
-    """,
-    re.IGNORECASE | re.VERBOSE | re.DOTALL,
+# Lines that open a new command when several are pasted into one message:
+# the cheat-sheet form ``<KEYWORD>:``, or a bare HELP/PUBLISH/CANCEL outside
+# an ADD BODY block (where it is just a line of the lesson).
+_COMMAND_LINE = re.compile(
+    r"^[ \t]*(?P<bare>help|publish|cancel)[ \t]*$"
+    r"|^[ \t]*(?:new[ \t]*lesson|add[ \t]*(?:body|quiz|media))[ \t]*:",
+    re.IGNORECASE | re.MULTILINE,
 )
-_PUBLISH_PATTERN = re.compile(r"^\s*publish\s*$", re.IGNORECASE)
-_CANCEL_PATTERN = re.compile(r"^\s*cancel\s*$", re.IGNORECASE)
+_FIELD_PREFIX = re.compile(r"\s*(?::(?=.))?\s*", re.DOTALL)
+# ``<word> [:] <value>`` with a non-empty remainder; see ``_field_value``.
+_LEVEL_PREFIX = re.compile(r"\s*level(?=.)\s*(?::(?=.))?\s*", re.IGNORECASE | re.DOTALL)
+_TOPIC_PREFIX = re.compile(r"\s*topic(?=.)\s*(?::(?=.))?\s*", re.IGNORECASE | re.DOTALL)
+_ANS_WORD = re.compile(r"ans", re.IGNORECASE)
+_MEDIA_KIND = re.compile(r"(?P<kind>image|audio|video)", re.IGNORECASE)
+_QUIZ_OPTION_LABELS = ("A)", "B)", "C)")
+_QUIZ_ANSWERS = "ABCabc"
+
+_UNKNOWN_ERROR = "Unknown command. Send HELP for a cheat-sheet."
+
+
+def _field_value(text: str, start: int, stop: int) -> Optional[str]:
+    """Return the stripped value of ``[:] <value>`` in ``text[start:stop]``.
+
+    ``None`` means nothing follows. A lone colon is kept as the value, matching
+    the original ``:?\\s*(.+?)`` regexes that fell back to capturing it.
+    """
+
+    if start >= stop:
+        return None
+    prefix = _FIELD_PREFIX.match(text, start, stop)
+    return text[prefix.end() : stop].rstrip()
+
+
+def _option_value(segment: str, label: str) -> Optional[str]:
+    """Parse one ``<label> option`` quiz segment."""
+
+    value = segment.lstrip()
+    if value[:2].upper() != label:
+        return None
+    value = value[2:]
+    return value.strip() if value else None
+
+
+def _answer_letter(segment: str) -> Optional[str]:
+    """Parse the ``ANS: <A|B|C>`` quiz segment without backtracking."""
+
+    value = segment.strip()
+    if not value or value[-1] not in _QUIZ_ANSWERS:
+        return None
+    head = value[:-1].rstrip()
+    if head.endswith(":"):
+        head = head[:-1].rstrip()
+    return value[-1] if _ANS_WORD.fullmatch(head) else None
+
+
+def quiz_command(prompt: str, options: Sequence[str], answer: str, raw_text: str = "") -> Command:
+    """Validate quiz fields the way ``ADD QUIZ`` does and build its command.
+
+    Shared with bulk imports so a quiz is accepted or rejected identically
+    whichever way it arrives.
+    """
+
+    if len(options) != len(_QUIZ_OPTION_LABELS) or any(not option for option in options):
+        return Command(
+            CommandType.UNKNOWN,
+            {},
+            raw_text,
+            error="ADD QUIZ requires three answer options.",
+        )
+    if len(answer) != 1 or answer not in _QUIZ_ANSWERS:
+        return Command(
+            CommandType.UNKNOWN,
+            {},
+            raw_text,
+            error="ADD QUIZ answer must be A, B or C.",
+        )
+    return Command(
+        CommandType.ADD_QUIZ,
+        {"prompt": prompt, "options": list(options), "answer_idx": ord(answer.upper()) - ord("A")},
+        raw_text,
+    )
 
 
 class CommandParser:
-    """Robust parser that tolerates teacher-friendly formatting."""
+    """Robust parser that tolerates teacher-friendly formatting.
+
+    The leading keyword is read once and the text goes straight to the
+    matching sub-parser. Sub-parsers are single-pass: the quiz parser only
+    scans backwards from the end for its four option separators, so long or
+    malformed payloads cannot trigger regex backtracking.
+    """
+
+    def __init__(self) -> None:
+        self._handlers: Dict[str, Callable[[str, str, int], Command]] = {
+            "help": self._parse_help,
+            "new_lesson": self._parse_new_lesson,
+            "add_body": self._parse_add_body,
+            "add_quiz": self._parse_add_quiz,
+            "add_media": self._parse_add_media,
+            "publish": self._parse_publish,
+            "cancel": self._parse_cancel,
+        }
 
     def parse(self, text: str) -> Command:
         clean_text = (text or "").strip()
         if not clean_text:
             return Command(CommandType.UNKNOWN, {}, text, error="Empty message.")
 
-        if _HELP_PATTERN.match(clean_text):
-            return Command(CommandType.HELP, {}, text)
-
-        new_lesson_match = _NEW_LESSON_PATTERN.match(clean_text)
-        if new_lesson_match:
-            title = new_lesson_match.group("title").strip()
-            level = new_lesson_match.group("level").strip()
-            topic = new_lesson_match.group("topic").strip()
-            if not title or not level or not topic:
-                return Command(
-                    CommandType.UNKNOWN,
-                    {},
-                    text,
-                    error="NEW LESSON requires title, level, and topic.",
-                )
+        keyword = _KEYWORD_PATTERN.match(clean_text)
+        if keyword is None:
+            return self._unknown(text)
+        return self._handlers[keyword.lastgroup](text, clean_text, keyword.end())
+
+    def parse_many(self, text: str) -> List[Command]:
+        """Parse a message that may hold several commands, one per block.
+
+        A block starts at a line opening with ``NEW LESSON:``, ``ADD BODY:``,
+        ``ADD QUIZ:`` or ``ADD MEDIA:``, or at a bare ``HELP``, ``PUBLISH``
+        or ``CANCEL`` line unless the current block is an ADD BODY. Any other
+        line continues the block above it, so multi-line bodies stay whole,
+        even ones with a line reading "Help" or "Publish". A single block
+        parses exactly as :meth:`parse` would.
+        """
+
+        text = text or ""
+        starts: List[int] = []
+        for match in _COMMAND_LINE.finditer(text):
+            if not starts and text[: match.start()].strip():
+                starts.append(0)
+            if match.group("bare") and starts and self._is_body(text[starts[-1] : match.start()]):
+                continue
+            starts.append(match.start())
+        if not starts:
+            starts.append(0)
+        if len(starts) < 2:
+            return [self.parse(text)]
+        ends = starts[1:] + [len(text)]
+        return [self.parse(text[start:end]) for start, end in zip(starts, ends)]
+
+    @staticmethod
+    def _is_body(block: str) -> bool:
+        keyword = _KEYWORD_PATTERN.match(block.strip())
+        return keyword is not None and keyword.lastgroup == "add_body"
+
+    # ------------------------------------------------------------------
+    def _parse_help(self, text: str, clean_text: str, end: int) -> Command:
+        if end != len(clean_text):
+            return self._unknown(text)
+        return Command(CommandType.HELP, {}, text)
+
+    def _parse_publish(self, text: str, clean_text: str, end: int) -> Command:
+        if end != len(clean_text):
+            return self._unknown(text)
+        return Command(CommandType.PUBLISH, {}, text)
+
+    def _parse_cancel(self, text: str, clean_text: str, end: int) -> Command:
+        if end != len(clean_text):
+            return self._unknown(text)
+        return Command(CommandType.CANCEL, {}, text)
+
+    def _parse_new_lesson(self, text: str, clean_text: str, end: int) -> Command:
+        segments = clean_text.split("|", 2)
+        if len(segments) < 3:
+            return self._unknown(text)
+        title_segment, level_segment, topic_segment = segments
+        title = _field_value(title_segment, end, len(title_segment))
+        level_prefix = _LEVEL_PREFIX.match(level_segment)
+        topic_prefix = _TOPIC_PREFIX.match(topic_segment)
+        if title is None or level_prefix is None or topic_prefix is None:
+            return self._unknown(text)
+        level = level_segment[level_prefix.end() :].rstrip()
+        topic = topic_segment[topic_prefix.end() :]
+        if "\n" in topic:
+            return self._unknown(text)
+
+        if not title or not level or not topic:
             return Command(
-                CommandType.NEW_LESSON,
-                {"title": title, "level": level, "topic": topic},
+                CommandType.UNKNOWN,
+                {},
                 text,
+                error="NEW LESSON requires title, level, and topic.",
             )
+        return Command(
+            CommandType.NEW_LESSON,
+            {"title": title, "level": level, "topic": topic},
+            text,
+        )
 
-        add_body_match = _ADD_BODY_PATTERN.match(clean_text)
-        if add_body_match:
-            body = add_body_match.group("body").strip()
-            if not body:
-                return Command(
-                    CommandType.UNKNOWN,
-                    {},
-                    text,
-                    error="ADD BODY requires markdown content.",
-                )
-            return Command(CommandType.ADD_BODY, {"body": body}, text)
-
-        add_quiz_match = _ADD_QUIZ_PATTERN.match(clean_text)
-        if add_quiz_match:
-            prompt = add_quiz_match.group("prompt").strip()
-            options = [
-                add_quiz_match.group("option_a").strip(),
-                add_quiz_match.group("option_b").strip(),
-                add_quiz_match.group("option_c").strip(),
-            ]
-            answer_letter = add_quiz_match.group("answer").strip().upper()
-            answer_idx = ord(answer_letter) - ord("A")
-            if any(not option for option in options):
-                return Command(
-                    CommandType.UNKNOWN,
-                    {},
-                    text,
-                    error="ADD QUIZ requires three answer options.",
-                )
+    def _parse_add_body(self, text: str, clean_text: str, end: int) -> Command:
+        body = _field_value(clean_text, end, len(clean_text))
+        if body is None:
+            return self._unknown(text)
+        if not body:
             return Command(
-                CommandType.ADD_QUIZ,
-                {"prompt": prompt, "options": options, "answer_idx": answer_idx},
+                CommandType.UNKNOWN,
+                {},
                 text,
+                error="ADD BODY requires markdown content.",
             )
+        return Command(CommandType.ADD_BODY, {"body": body}, text)
 
-        add_media_match = _ADD_MEDIA_PATTERN.match(clean_text)
-        if add_media_match:
-            kind = add_media_match.group("kind").lower()
-            return Command(CommandType.ADD_MEDIA, {"kind": kind}, text)
+    def _parse_add_quiz(self, text: str, clean_text: str, end: int) -> Command:
+        # The prompt may contain quotes and pipes, the options may not, so the
+        # last four pipes always delimit the options and the answer.
+        segments = clean_text.rsplit("|", 4)
+        if len(segments) < 5:
+            return self._unknown(text)
 
-        if _PUBLISH_PATTERN.match(clean_text):
-            return Command(CommandType.PUBLISH, {}, text)
+        head = segments[0][end:].lstrip()
+        if head.startswith(":"):
+            head = head[1:].lstrip()
+        head = head.rstrip()
+        if len(head) < 3 or head[0] != '"' or head[-1] != '"':
+            return self._unknown(text)
+        prompt = head[1:-1].strip()
 
-        if _CANCEL_PATTERN.match(clean_text):
-            return Command(CommandType.CANCEL, {}, text)
+        options = []
+        for label, segment in zip(_QUIZ_OPTION_LABELS, segments[1:4]):
+            option = _option_value(segment, label)
+            if option is None:
+                return self._unknown(text)
+            options.append(option)
+        answer_letter = _answer_letter(segments[4])
+        if answer_letter is None:
+            return self._unknown(text)
 
-        return Command(
-            CommandType.UNKNOWN,
-            {},
-            text,
-            error="Unknown command. Send HELP for a cheat-sheet.",
-        )
+        return quiz_command(prompt, options, answer_letter, text)
+
+    def _parse_add_media(self, text: str, clean_text: str, end: int) -> Command:
+        value = clean_text[end:].lstrip()
+        if value.startswith(":"):
+            value = value[1:].lstrip()
+        kind = _MEDIA_KIND.fullmatch(value)
+        if kind is None:
+            return self._unknown(text)
+        return Command(CommandType.ADD_MEDIA, {"kind": kind.group("kind").lower()}, text)
+
+    @staticmethod
+    def _unknown(text: str) -> Command:
+        return Command(CommandType.UNKNOWN, {}, text, error=_UNKNOWN_ERROR)
+
+
+_DEFAULT_PARSER = CommandParser()
 
 
 def parse_command(text: str) -> Command:
     """Convenience wrapper to parse a command string."""
 
-    return CommandParser().parse(text)
+    return _DEFAULT_PARSER.parse(text)
 
 
-__all__ = ["Command", "CommandParser", "CommandType", "CHEAT_SHEET", "parse_command"]
+__all__ = ["Command", "CommandParser", "CommandType", "CHEAT_SHEET", "parse_command", "quiz_command"]
@@ -0,0 +1,171 @@
+"""Idempotency guards keyed on WhatsApp message ids."""
+from __future__ import annotations
+
+import abc
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from bot.core.metrics import DEDUP_CHECKS
+
+
+class DedupStore(abc.ABC):
+    """Bounded, TTL-evicting record of message ids that were already accepted.
+
+    Every check is also counted in ``bot_dedup_checks_total`` by result.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = max(1.0, float(ttl_seconds))
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def check_and_mark(self, message_id: str) -> bool:
+        """Return ``True`` if ``message_id`` is new and remember it, ``False`` for duplicates."""
+
+        fresh = self._check_and_mark(message_id, time.time())
+        if fresh:
+            self.misses += 1
+        else:
+            self.hits += 1
+        DEDUP_CHECKS.inc("miss" if fresh else "hit")
+        return fresh
+
+    def check_and_mark_many(self, message_ids: List[str]) -> List[bool]:
+        """:meth:`check_and_mark` each id in order; one call per webhook payload."""
+
+        return [self.check_and_mark(message_id) for message_id in message_ids]
+
+    @abc.abstractmethod
+    def discard(self, message_id: str) -> None:
+        """Forget ``message_id`` so a redelivery is processed again."""
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
+
+    def close(self) -> None:
+        return None
+
+    # ------------------------------------------------------------------
+    @abc.abstractmethod
+    def _check_and_mark(self, message_id: str, now: float) -> bool:
+        """Insert ``message_id`` unless it is already present and unexpired."""
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Number of ids currently remembered."""
+
+
+class InMemoryDedupStore(DedupStore):
+    """Per-process store; ids expire in insertion order because the TTL is fixed."""
+
+    def __init__(self, ttl_seconds: float = 86400, max_entries: int = 100_000) -> None:
+        super().__init__(ttl_seconds, max_entries)
+        self._expiry: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def discard(self, message_id: str) -> None:
+        with self._lock:
+            self._expiry.pop(message_id, None)
+
+    def _check_and_mark(self, message_id: str, now: float) -> bool:
+        with self._lock:
+            self._evict(now)
+            if message_id in self._expiry:
+                return False
+            self._expiry[message_id] = now + self.ttl_seconds
+            if len(self._expiry) > self.max_entries:
+                self._expiry.popitem(last=False)
+            return True
+
+    def _evict(self, now: float) -> None:
+        while self._expiry:
+            oldest, expires_at = next(iter(self._expiry.items()))
+            if expires_at > now:
+                break
+            del self._expiry[oldest]
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+
+class SQLiteDedupStore(DedupStore):
+    """Durable store shared by every worker process on the host.
+
+    The check-and-mark is a single ``INSERT ... ON CONFLICT`` statement, so two
+    workers racing on the same redelivery cannot both win. ``blocking`` makes
+    the router call it off the event loop.
+    """
+
+    blocking = True
+    _PURGE_EVERY = 1000
+
+    def __init__(self, path: str, ttl_seconds: float = 86400, max_entries: int = 100_000) -> None:
+        super().__init__(ttl_seconds, max_entries)
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_messages ("
+            " message_id TEXT PRIMARY KEY,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS seen_messages_expiry ON seen_messages (expires_at)")
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def discard(self, message_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM seen_messages WHERE message_id = ?", (message_id,))
+
+    def _check_and_mark(self, message_id: str, now: float) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO seen_messages (message_id, expires_at) VALUES (?, ?) "
+                "ON CONFLICT(message_id) DO UPDATE SET expires_at = excluded.expires_at "
+                "WHERE seen_messages.expires_at <= ?",
+                (message_id, now + self.ttl_seconds, now),
+            )
+            fresh = cursor.rowcount == 1
+            if fresh:
+                self._writes += 1
+                if self._writes % self._PURGE_EVERY == 0:
+                    self._purge(now)
+            return fresh
+
+    def _purge(self, now: float) -> None:
+        self._conn.execute("DELETE FROM seen_messages WHERE expires_at <= ?", (now,))
+        self._conn.execute(
+            "DELETE FROM seen_messages WHERE message_id IN ("
+            " SELECT message_id FROM seen_messages ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM seen_messages").fetchone()
+        return int(count)
+
+
+def build_dedup_store(backend: str, ttl_seconds: float, max_entries: int, path: str) -> Optional[DedupStore]:
+    """Create the store selected by ``BOT_DEDUP_BACKEND`` (``memory``, ``sqlite`` or ``none``)."""
+
+    backend = backend.lower()
+    if backend == "none":
+        return None
+    if backend == "sqlite":
+        return SQLiteDedupStore(path, ttl_seconds, max_entries)
+    if backend == "memory":
+        return InMemoryDedupStore(ttl_seconds, max_entries)
+    raise ValueError(f"Unknown dedup backend: {backend}")
+
+
+__all__ = ["DedupStore", "InMemoryDedupStore", "SQLiteDedupStore", "build_dedup_store"]
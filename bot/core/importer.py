@@ -0,0 +1,435 @@
+"""Bulk lesson import from a markdown document or a JSON Lines bundle."""
+from __future__ import annotations
+
+import asyncio
+import io
+import itertools
+import json
+import re
+from dataclasses import dataclass, field
+from typing import IO, Any, AsyncIterator, Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+
+from bot.core.aio import call_io
+from bot.core.commands import CommandParser, CommandType, quiz_command
+from bot.core.uow import UnitOfWork
+
+ImportFormat = Literal["markdown", "json", "jsonl"]
+
+_JSONL_SUFFIXES = (".jsonl", ".ndjson")
+_JSONL_MIME_TYPES = ("application/x-ndjson", "application/jsonl")
+_READ_BATCH = 256
+_JSON_READ_CHARS = 64 * 1024
+_LESSON_FIELDS = ("title", "level", "topic")
+_MEDIA_KINDS = ("image", "audio", "video")
+_QUIZ_LINE = re.compile(r"\s*add\s*quiz\b", re.IGNORECASE)
+_MEDIA_LINE = re.compile(r"\s*media\s*:\s*(?P<kind>\S+)\s+(?P<url>\S+)(?:\s+(?P<caption>.+?))?\s*$", re.IGNORECASE)
+_FRONT_MATTER_FIELD = re.compile(r"\s*(?P<key>[A-Za-z_]+)\s*:\s*(?P<value>.*?)\s*$")
+
+
+def detect_format(filename: Optional[str], mime_type: Optional[str]) -> ImportFormat:
+    """Pick the parser from the file name, falling back to the MIME type."""
+
+    name = (filename or "").lower()
+    if name.endswith(_JSONL_SUFFIXES):
+        return "jsonl"
+    if name.endswith(".json"):
+        return "json"
+    mime = (mime_type or "").split(";", 1)[0].strip().lower()
+    if mime in _JSONL_MIME_TYPES:
+        return "jsonl"
+    if mime == "application/json":
+        return "json"
+    return "markdown"
+
+
+@dataclass
+class ImportIssue:
+    """A line of the import that was skipped, and why."""
+
+    line: int
+    message: str
+
+
+@dataclass
+class _Record:
+    line: int
+    kind: str
+    data: Dict[str, Any]
+
+
+@dataclass
+class ImportReport:
+    """Outcome of one import: what was written and what was skipped."""
+
+    lesson_id: Optional[str] = None
+    title: Optional[str] = None
+    body_chunks: int = 0
+    quizzes: int = 0
+    media: int = 0
+    errors: List[ImportIssue] = field(default_factory=list)
+
+    def add_error(self, line: int, message: str) -> None:
+        self.errors.append(ImportIssue(line, message))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "lesson_id": self.lesson_id,
+            "title": self.title,
+            "body_chunks": self.body_chunks,
+            "quizzes": self.quizzes,
+            "media": self.media,
+            "errors": [{"line": issue.line, "message": issue.message} for issue in self.errors],
+        }
+
+    def summary(self, max_errors: int = 5) -> str:
+        if self.lesson_id is None:
+            lines = ["Import failed."]
+        else:
+            lines = [
+                f"Imported draft lesson: {self.title}\nLesson ID: {self.lesson_id}",
+                f"Body sections: {self.body_chunks}, quizzes: {self.quizzes}, media: {self.media}.",
+            ]
+        for issue in self.errors[:max_errors]:
+            lines.append(f"Line {issue.line}: {issue.message}")
+        if len(self.errors) > max_errors:
+            lines.append(f"…and {len(self.errors) - max_errors} more problems.")
+        return "\n".join(lines)
+
+
+class LessonImporter:
+    """Stream an import file into Supabase with bulk writes.
+
+    The file is read line by line. Body paragraphs, quizzes and media rows
+    are staged in a :class:`UnitOfWork` and flushed through
+    ``apply_message_writes`` every ``flush_rows`` rows or ``flush_chars``
+    characters of body. Memory use therefore stays bounded however large the
+    upload is. Quizzes go through :func:`bot.core.commands.quiz_command`.
+    Markdown bodies are sanitised by the service exactly as ``ADD BODY`` is.
+
+    Markdown documents start with a ``---`` front-matter block giving
+    ``title``, ``level`` and ``topic``. After it, ``ADD QUIZ: ...`` lines
+    become quizzes, ``MEDIA: <kind> <url> [caption]`` lines become media
+    references, and everything else is the body. JSON Lines bundles hold one
+    object per line, each with a ``type`` of ``lesson``, ``body``, ``quiz``
+    (``prompt``, ``options``, ``answer``) or ``media`` (``kind``, ``url``,
+    ``caption``), and the ``lesson`` line comes first. A ``json`` document
+    is an array of the same objects, decoded one item at a time; issues
+    then carry the item's position instead of a line number.
+
+    The file is read on the thread pool, a batch of records at a time, so a
+    spooled upload on disk never blocks the event loop.
+    """
+
+    BODY_CHUNK_CHARS = 16 * 1024
+
+    def __init__(self, supabase: Any, flush_rows: int = 500, flush_chars: int = 1024 * 1024) -> None:
+        self.supabase = supabase
+        self.flush_rows = max(1, flush_rows)
+        self.flush_chars = max(1, flush_chars)
+        self.parser = CommandParser()
+
+    async def run(self, file: IO[bytes], author_phone: str, fmt: ImportFormat = "markdown") -> ImportReport:
+        """Import ``file``; per-line problems are collected in the report rather than raised."""
+
+        report = ImportReport()
+        text = io.TextIOWrapper(file, encoding="utf-8", errors="replace", newline="")
+        try:
+            if fmt == "jsonl":
+                records = self._jsonl_records(text)
+            elif fmt == "json":
+                records = self._json_document_records(text)
+            else:
+                records = self._markdown_records(text)
+            await self._apply(_read_in_thread(records), author_phone, report)
+        finally:
+            text.detach()
+        return report
+
+    # ------------------------------------------------------------------
+    async def _apply(self, records: AsyncIterator[_Record], author_phone: str, report: ImportReport) -> None:
+        uow = UnitOfWork(self.supabase)
+        staged: List[_Record] = []
+        staged_chars = 0
+        async for record in records:
+            if record.kind == "error":
+                report.add_error(record.line, record.data["message"])
+                continue
+            if record.kind == "lesson":
+                if report.lesson_id is not None:
+                    report.add_error(record.line, "The lesson details were given twice.")
+                    continue
+                lesson = await call_io(self.supabase.create_lesson, author_phone=author_phone, **record.data)
+                if not lesson:
+                    report.add_error(record.line, "Could not create the lesson.")
+                    return
+                report.lesson_id, report.title = lesson["id"], lesson["title"]
+                continue
+            if report.lesson_id is None:
+                report.add_error(record.line, "The lesson title, level and topic must come first.")
+                continue
+
+            if record.kind == "body":
+                uow.append_body(report.lesson_id, record.data["markdown"])
+                staged_chars += len(record.data["markdown"])
+            elif record.kind == "quiz":
+                uow.add_quiz(lesson_id=report.lesson_id, **record.data)
+            else:
+                uow.add_media_entry(lesson_id=report.lesson_id, **record.data)
+            staged.append(record)
+            if len(staged) >= self.flush_rows or staged_chars >= self.flush_chars:
+                await self._flush(uow, staged, report)
+                staged, staged_chars = [], 0
+        if report.lesson_id is None and not report.errors:
+            report.add_error(0, "The file is empty.")
+        if staged:
+            await self._flush(uow, staged, report)
+
+    @staticmethod
+    async def _flush(uow: UnitOfWork, staged: List[_Record], report: ImportReport) -> None:
+        if not await uow.commit():
+            report.add_error(
+                staged[0].line,
+                f"Could not save lines {staged[0].line}-{staged[-1].line}. Please retry them.",
+            )
+            return
+        for record in staged:
+            if record.kind == "body":
+                report.body_chunks += 1
+            elif record.kind == "quiz":
+                report.quizzes += 1
+            else:
+                report.media += 1
+
+    # ------------------------------------------------------------------
+    def _markdown_records(self, lines: Iterable[str]) -> Iterator[_Record]:
+        numbered = enumerate(lines, start=1)
+        first = next(numbered, None)
+        if first is None:
+            return
+        if first[1].strip() != "---":
+            yield _Record(first[0], "error", {"message": "Start the file with a --- front-matter block."})
+            return
+        fields: Dict[str, str] = {}
+        closed = False
+        for number, line in numbered:
+            if line.strip() == "---":
+                closed = True
+                break
+            match = _FRONT_MATTER_FIELD.match(line)
+            if match and match.group("key").lower() in _LESSON_FIELDS:
+                fields[match.group("key").lower()] = match.group("value")
+        missing = [name for name in _LESSON_FIELDS if not fields.get(name)]
+        if not closed or missing:
+            message = "Close the front-matter with ---." if not closed else f"Front-matter needs {', '.join(missing)}."
+            yield _Record(first[0], "error", {"message": message})
+            return
+        yield _Record(first[0], "lesson", fields)
+
+        body: List[str] = []
+        body_line = 0
+        body_chars = 0
+        for number, line in numbered:
+            if _QUIZ_LINE.match(line):
+                command = self.parser.parse(line)
+                if command.type is CommandType.ADD_QUIZ:
+                    yield _Record(number, "quiz", command.payload)
+                else:
+                    yield _Record(number, "error", {"message": command.error or "Invalid quiz."})
+                continue
+            media = _MEDIA_LINE.match(line)
+            if media:
+                yield self._media_record(number, media.group("kind"), media.group("url"), media.group("caption"))
+                continue
+            if not line.strip() and body_chars >= self.BODY_CHUNK_CHARS:
+                # Cut at a paragraph break; appends are rejoined with a blank line.
+                yield _Record(body_line, "body", {"markdown": "".join(body)})
+                body, body_chars = [], 0
+                continue
+            if not body:
+                if not line.strip():
+                    continue
+                body_line = number
+            body.append(line)
+            body_chars += len(line)
+        if body:
+            yield _Record(body_line, "body", {"markdown": "".join(body)})
+
+    def _jsonl_records(self, lines: Iterable[str]) -> Iterator[_Record]:
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                yield _Record(number, "error", {"message": "Not valid JSON."})
+                continue
+            if not isinstance(item, dict):
+                yield _Record(number, "error", {"message": "Each line must be a JSON object."})
+                continue
+            yield self._json_record(number, item)
+
+    def _json_document_records(self, text: IO[str]) -> Iterator[_Record]:
+        not_array = "A .json import must be an array of objects; use .jsonl for one object per line."
+        start = _read_past_whitespace(text)
+        if start == "{":
+            # Usually JSON Lines saved as .json or sent as application/json.
+            first = start + text.readline()
+            peeked: List[str] = []
+            for line in text:
+                peeked.append(line)
+                if line.strip():
+                    break
+            try:
+                json.loads(first)
+            except ValueError:
+                peeked = []
+            if not any(line.strip() for line in peeked):
+                yield _Record(1, "error", {"message": not_array})
+                return
+            yield from self._jsonl_records(itertools.chain([first], peeked, text))
+            return
+        if start != "[":
+            yield _Record(1, "error", {"message": not_array})
+            return
+        for number, item in _json_array_items(text):
+            if isinstance(item, _ArrayError):
+                yield _Record(number, "error", {"message": item.message})
+                return
+            if not isinstance(item, dict):
+                yield _Record(number, "error", {"message": "Each item must be a JSON object."})
+                continue
+            yield self._json_record(number, item)
+
+    def _json_record(self, number: int, item: Dict[str, Any]) -> _Record:
+        kind = item.get("type")
+        if kind == "lesson":
+            fields = {name: str(item.get(name) or "").strip() for name in _LESSON_FIELDS}
+            missing = [name for name, value in fields.items() if not value]
+            if missing:
+                return _Record(number, "error", {"message": f"Lesson needs {', '.join(missing)}."})
+            return _Record(number, "lesson", fields)
+        if kind == "body":
+            markdown = item.get("markdown")
+            if not isinstance(markdown, str) or not markdown.strip():
+                return _Record(number, "error", {"message": "ADD BODY requires markdown content."})
+            return _Record(number, "body", {"markdown": markdown})
+        if kind == "quiz":
+            prompt = str(item.get("prompt") or "").strip()
+            options = item.get("options")
+            if not prompt:
+                return _Record(number, "error", {"message": "Quiz needs a prompt."})
+            if not isinstance(options, list):
+                options = []
+            command = quiz_command(
+                prompt, [str(option).strip() for option in options], str(item.get("answer") or "").strip()
+            )
+            if not command.is_valid:
+                return _Record(number, "error", {"message": command.error})
+            return _Record(number, "quiz", command.payload)
+        if kind == "media":
+            return self._media_record(number, str(item.get("kind") or ""), str(item.get("url") or ""), item.get("caption"))
+        return _Record(number, "error", {"message": f"Unknown item type {kind!r}."})
+
+    @staticmethod
+    def _media_record(number: int, kind: str, url: str, caption: Optional[str]) -> _Record:
+        kind = kind.lower()
+        if kind not in _MEDIA_KINDS:
+            return _Record(number, "error", {"message": "Media kind must be image, audio or video."})
+        if not url.startswith(("https://", "http://")):
+            return _Record(number, "error", {"message": "Media needs an http(s) URL."})
+        return _Record(number, "media", {"kind": kind, "url": url, "caption": caption or None})
+
+
+@dataclass
+class _ArrayError:
+    message: str
+
+
+def _read_past_whitespace(text: IO[str]) -> str:
+    """Return the first non-whitespace character of ``text`` ("" at the end)."""
+
+    while True:
+        char = text.read(1)
+        if not char or not char.isspace():
+            return char
+
+
+def _json_array_items(text: IO[str]) -> Iterator[Tuple[int, Any]]:
+    """Yield ``(position, value)`` for each item of a JSON array whose ``[`` was already read.
+
+    Items are decoded one at a time with :meth:`json.JSONDecoder.raw_decode`
+    from a buffer refilled :data:`_JSON_READ_CHARS` at a time, so only the
+    current item is held in memory. A syntax error ends the array with an
+    :class:`_ArrayError`.
+    """
+
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        chunk = text.read(_JSON_READ_CHARS)
+        buffer, pos = buffer[pos:] + chunk, 0
+        eof = not chunk
+        return bool(chunk)
+
+    def next_char() -> str:
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or not fill():
+                return buffer[pos] if pos < len(buffer) else ""
+
+    number = 0
+    if next_char() == "]":
+        return
+    while True:
+        number += 1
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                item, end = None, -1
+            # A value that ends with the buffer may continue past it (e.g. a number).
+            if (end != -1 and end < len(buffer)) or eof:
+                break
+            fill()
+        if end == -1:
+            yield number, _ArrayError("Not valid JSON.")
+            return
+        pos = end
+        yield number, item
+        separator = next_char()
+        if separator == "]":
+            return
+        if separator != ",":
+            yield number + 1, _ArrayError("Expected , or ] between items.")
+            return
+        pos += 1
+        next_char()
+
+
+async def _read_in_thread(records: Iterator[_Record]) -> AsyncIterator[_Record]:
+    """Advance ``records`` on the thread pool, :data:`_READ_BATCH` records per hop."""
+
+    while True:
+        batch = await asyncio.to_thread(list, itertools.islice(records, _READ_BATCH))
+        if not batch:
+            return
+        for record in batch:
+            yield record
+
+
+async def import_lesson(
+    supabase: Any,
+    file: IO[bytes],
+    author_phone: str,
+    fmt: ImportFormat = "markdown",
+) -> ImportReport:
+    """Convenience wrapper around :class:`LessonImporter`."""
+
+    return await LessonImporter(supabase).run(file, author_phone, fmt)
+
+
+__all__ = ["ImportIssue", "ImportReport", "LessonImporter", "detect_format", "import_lesson"]
@@ -0,0 +1,114 @@
+"""In-process ingestion queue that decouples webhook acks from message handling."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import zlib
+from typing import Awaitable, Callable, List, Optional
+
+from bot.integrations.whatsapp import InboundMessage
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[InboundMessage], Awaitable[None]]
+
+
+class IngestQueue:
+    """Shard inbound messages by sender across a fixed pool of asyncio workers.
+
+    Each worker owns one bounded queue, and a sender always hashes to the same
+    worker, so one teacher's commands run in arrival order while different
+    teachers are processed in parallel.
+    """
+
+    def __init__(
+        self,
+        handler: MessageHandler,
+        workers: int,
+        max_depth: int,
+        drain_timeout: float = 10.0,
+    ) -> None:
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_depth = max(self.workers, max_depth)
+        self.drain_timeout = drain_timeout
+        self._shard_depth = -(-self.max_depth // self.workers)
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+
+    # ------------------------------------------------------------------
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    def shard_for(self, sender: str) -> int:
+        return zlib.crc32(sender.encode("utf-8")) % self.workers
+
+    # ------------------------------------------------------------------
+    async def start(self) -> None:
+        """Create the worker tasks on the running event loop."""
+
+        if self.running:
+            return
+        self._queues = [asyncio.Queue(maxsize=self._shard_depth) for _ in range(self.workers)]
+        self._tasks = [
+            asyncio.create_task(self._worker(queue), name=f"ingest-worker-{index}")
+            for index, queue in enumerate(self._queues)
+        ]
+
+    def submit(self, message: InboundMessage) -> bool:
+        """Enqueue ``message`` without waiting; return ``False`` when its shard is full."""
+
+        if not self.running:
+            raise RuntimeError("IngestQueue.start() must be awaited before submitting messages")
+        queue = self._queues[self.shard_for(message.sender)]
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning(
+                "Ingest queue full; rejecting message",
+                extra={"sender": message.sender, "message_id": message.message_id},
+            )
+            return False
+        return True
+
+    async def stop(self, drain: bool = True, timeout: Optional[float] = None) -> None:
+        """Stop the workers, optionally waiting for queued messages to finish first."""
+
+        if not self.running:
+            return
+        if drain:
+            wait = self.drain_timeout if timeout is None else timeout
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(queue.join() for queue in self._queues)),
+                    timeout=wait,
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Ingest queue drain timed out", extra={"pending": self.depth})
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = []
+
+    # ------------------------------------------------------------------
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            message = await queue.get()
+            try:
+                await self.handler(message)
+            except Exception as exc:
+                logger.exception(
+                    "Failed to process inbound message",
+                    extra={"sender": message.sender, "message_id": message.message_id, "error": str(exc)},
+                )
+            finally:
+                queue.task_done()
+
+
+__all__ = ["IngestQueue"]
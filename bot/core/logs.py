@@ -0,0 +1,235 @@
+"""Structured JSON logging, serialised and written off the request path."""
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Dict, Optional
+
+try:  # optional fast encoder; the stdlib encoder is used when it is missing
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+DEFAULT_MAX_FIELD_CHARS = 2000
+
+
+def _stdlib_dumps(value: Dict[str, Any]) -> str:
+    return json.dumps(value, default=str)
+
+
+def _orjson_dumps(value: Dict[str, Any]) -> str:
+    return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def json_encoder(fast: bool = True) -> Callable[[Dict[str, Any]], str]:
+    """Return orjson when ``fast`` and installed, else the stdlib encoder."""
+
+    return _orjson_dumps if fast and orjson is not None else _stdlib_dumps
+
+
+def truncate(value: Any, limit: int) -> Any:
+    """Shorten strings longer than ``limit``, including inside dicts and lists."""
+
+    if isinstance(value, str):
+        if len(value) <= limit:
+            return value
+        return f"{value[:limit]}...[truncated {len(value) - limit} chars]"
+    if isinstance(value, dict):
+        return {key: truncate(item, limit) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [truncate(item, limit) for item in value]
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """Emit structured logs as JSON lines.
+
+    The timestamp is the record's creation time, so it stays accurate when a
+    background thread formats the record later. Extra fields longer than
+    ``max_field_chars`` are truncated (``0`` keeps them whole) so a failed
+    write cannot dump a whole lesson body into the log.
+    """
+
+    DEFAULT_FIELDS = {
+        "name",
+        "msg",
+        "args",
+        "levelname",
+        "levelno",
+        "pathname",
+        "filename",
+        "module",
+        "exc_info",
+        "exc_text",
+        "stack_info",
+        "lineno",
+        "funcName",
+        "created",
+        "msecs",
+        "relativeCreated",
+        "thread",
+        "threadName",
+        "processName",
+        "process",
+        "message",
+        "taskName",
+    }
+
+    def __init__(self, max_field_chars: int = DEFAULT_MAX_FIELD_CHARS, fast_json: bool = True) -> None:
+        super().__init__()
+        self.max_field_chars = max_field_chars
+        self._dumps = json_encoder(fast_json)
+
+    def format(self, record: logging.LogRecord) -> str:
+        base: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in self.DEFAULT_FIELDS:
+                base[key] = truncate(value, self.max_field_chars) if self.max_field_chars else value
+        if record.exc_info:
+            base["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            base["exc_info"] = record.exc_text
+        return self._dumps(base)
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """Parse ``"httpx=0.1,bot.core.router=0.5"`` into logger name -> keep rate."""
+
+    rates: Dict[str, float] = {}
+    for item in (spec or "").split(","):
+        name, sep, rate = item.partition("=")
+        if not sep or not name.strip():
+            continue
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError as exc:
+            raise ValueError(f"Invalid log sampling rate for {name.strip()!r}: {rate!r}") from exc
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of INFO and DEBUG records from noisy loggers.
+
+    ``rates`` maps a logger name to the share of its records to keep; the
+    rate also applies to its child loggers. Warnings and errors are always
+    kept. Kept sampled records carry a ``sample_rate`` field so counts can be
+    scaled back up.
+    """
+
+    def __init__(self, rates: Dict[str, float]) -> None:
+        super().__init__()
+        self.rates = dict(rates)
+        self._resolved: Dict[str, Optional[float]] = {}
+
+    def _rate(self, name: str) -> Optional[float]:
+        try:
+            return self._resolved[name]
+        except KeyError:
+            pass
+        rate = None
+        candidate = name
+        while candidate:
+            if candidate in self.rates:
+                rate = self.rates[candidate]
+                break
+            candidate = candidate.rpartition(".")[0]
+        self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        if rate is None or rate >= 1.0:
+            return True
+        if random.random() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """Enqueue records for a :class:`QueueListener` without formatting them.
+
+    The stdlib ``QueueHandler.prepare`` formats every record on the calling
+    thread. Here only the message arguments are merged (they may be mutable),
+    leaving JSON encoding, truncation, traceback rendering and I/O to the
+    listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+_listener: Optional[QueueListener] = None
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the background listener, if running."""
+
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(
+    use_queue: bool = True,
+    sampling: Optional[Dict[str, float]] = None,
+    max_field_chars: int = DEFAULT_MAX_FIELD_CHARS,
+    fast_json: bool = True,
+    stream: Any = None,
+) -> logging.Handler:
+    """Route the root logger to JSON lines on ``stream`` (stderr by default).
+
+    With ``use_queue`` the request thread only enqueues records; a
+    :class:`QueueListener` thread formats and writes them. Returns the
+    handler attached to the root logger.
+    """
+
+    global _listener
+    stop_logging()
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter(max_field_chars=max_field_chars, fast_json=fast_json))
+    if use_queue:
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        handler: logging.Handler = BackgroundQueueHandler(records)
+        _listener = QueueListener(records, output)
+        _listener.start()
+    else:
+        handler = output
+    if sampling:
+        handler.addFilter(SamplingFilter(sampling))
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    return handler
+
+
+atexit.register(stop_logging)
+
+
+__all__ = [
+    "BackgroundQueueHandler",
+    "JsonFormatter",
+    "SamplingFilter",
+    "json_encoder",
+    "parse_sampling",
+    "setup_logging",
+    "stop_logging",
+    "truncate",
+]
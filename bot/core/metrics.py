@@ -0,0 +1,233 @@
+"""In-process metrics rendered in the Prometheus text format."""
+from __future__ import annotations
+
+import abc
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    """Base for metrics whose samples are sharded per thread.
+
+    Each thread writes only to its own shard, so recording a sample takes no
+    lock. The registration lock is only taken the first time a thread
+    records, and when :meth:`collect` snapshots the shards.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._local = threading.local()
+        self._shards: List[Dict[Labels, List[float]]] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> Dict[Labels, List[float]]:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    @abc.abstractmethod
+    def _new_cell(self) -> List[float]:
+        """Zeroed storage for one label set."""
+
+    def _cell(self, labels: Labels) -> List[float]:
+        shard = self._shard()
+        cell = shard.get(labels)
+        if cell is None:
+            if len(labels) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {labels}")
+            cell = shard[labels] = self._new_cell()
+        return cell
+
+    def collect(self) -> Dict[Labels, List[float]]:
+        """Sum every thread's shard into one cell per label set."""
+
+        with self._shards_lock:
+            shards = list(self._shards)
+        totals: Dict[Labels, List[float]] = {}
+        for shard in shards:
+            for labels, cell in list(shard.items()):
+                total = totals.get(labels)
+                if total is None:
+                    totals[labels] = list(cell)
+                else:
+                    for index, value in enumerate(cell):
+                        total[index] += value
+        return totals
+
+    @abc.abstractmethod
+    def render(self) -> List[str]:
+        """Prometheus sample lines, without the HELP and TYPE header."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_cell(self) -> List[float]:
+        return [0.0]
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._cell(labels)[0] += amount
+
+    def value(self, *labels: str) -> float:
+        return self.collect().get(labels, [0.0])[0]
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.label_names, labels)} {_format_number(cell[0])}"
+            for labels, cell in sorted(self.collect().items())
+        ]
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; a cell holds per-bucket counts, then sum and count."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_cell(self) -> List[float]:
+        return [0.0] * (len(self.buckets) + 3)
+
+    def observe(self, value: float, *labels: str) -> None:
+        cell = self._cell(labels)
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels: str) -> int:
+        return int(self.collect().get(labels, [0.0])[-1])
+
+    def render(self) -> List[str]:
+        lines: List[str] = []
+        names = self.label_names + ("le",)
+        for labels, cell in sorted(self.collect().items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), cell[:-2]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, labels + (_format_number(bound),))} {_format_number(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {_format_number(cell[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {_format_number(cell[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together by ``/metrics``."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+COMMAND_SECONDS = REGISTRY.histogram("bot_command_seconds", "Time to run one teacher command, by command type.", ("command",))
+PARSE_SECONDS = REGISTRY.histogram("bot_parse_seconds", "Time to parse one inbound text message into commands.")
+DEPENDENCY_SECONDS = REGISTRY.histogram(
+    "bot_dependency_seconds",
+    "Latency of Supabase, WhatsApp and Next.js calls, by operation and outcome.",
+    ("dependency", "operation", "outcome"),
+)
+MESSAGES = REGISTRY.counter("bot_messages_total", "Inbound messages from allowed senders, by message type.", ("type",))
+RATE_LIMITED = REGISTRY.counter("bot_rate_limited_total", "Messages rejected by the per-sender rate limiter.")
+UNAUTHORISED = REGISTRY.counter("bot_unauthorised_senders_total", "Messages ignored because the sender is not allowed.")
+DEDUP_CHECKS = REGISTRY.counter(
+    "bot_dedup_checks_total", "WhatsApp message ids checked for redelivery; hit means already seen.", ("result",)
+)
+OUTBOUND_REPLIES = REGISTRY.counter(
+    "bot_outbound_replies_total", "Replies handled by the outbound queue, by outcome.", ("outcome",)
+)
+OUTBOUND_QUEUE_SECONDS = REGISTRY.histogram(
+    "bot_outbound_queue_seconds", "Time from queueing a reply to the Graph API accepting it."
+)
+
+
+__all__ = [
+    "COMMAND_SECONDS",
+    "Counter",
+    "DEDUP_CHECKS",
+    "DEPENDENCY_SECONDS",
+    "Histogram",
+    "MESSAGES",
+    "MetricsRegistry",
+    "OUTBOUND_QUEUE_SECONDS",
+    "OUTBOUND_REPLIES",
+    "PARSE_SECONDS",
+    "RATE_LIMITED",
+    "REGISTRY",
+    "UNAUTHORISED",
+]
@@ -0,0 +1,288 @@
+"""Paced, retrying queue for outbound WhatsApp replies."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Dict, List, Optional
+
+import httpx
+
+from bot.core.aio import call_blocking, call_io
+from bot.core.metrics import OUTBOUND_QUEUE_SECONDS, OUTBOUND_REPLIES
+from bot.core.ratelimit import SQLiteRateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Async token bucket; ``acquire`` waits until a token is available.
+
+    All callers share one event loop, so no lock is needed between the
+    refill and the take.
+    """
+
+    def __init__(self, rate_per_sec: float, burst: int) -> None:
+        self.rate = max(0.001, float(rate_per_sec))
+        self.capacity = float(max(1, burst))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill(now)
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return
+            await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every sender on this bucket back, e.g. after a 429 from the Graph API."""
+
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+
+@dataclass
+class OutboundMessage:
+    recipient: str
+    text: str
+    phone_number_id: str
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """Parse ``Retry-After`` given either as delta-seconds or as an HTTP date."""
+
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class OutboundSender:
+    """Deliver replies through ``whatsapp.post_text_message`` off the request path.
+
+    Replies are sharded by recipient across ``workers`` tasks, so each teacher
+    receives messages in order. Every send first takes a token from the bucket
+    for its ``phone_number_id``. 429 and 5xx responses, and transport errors,
+    are retried with full-jitter exponential backoff. A ``Retry-After`` header
+    raises that delay and pauses the whole bucket.
+
+    The buckets belong to one process. With ``pacer`` set, every send also
+    takes a slot from that shared SQLite GCRA limiter, keyed by
+    ``phone_number_id``, so all workers on the host stay under one rate;
+    a 429 pause still only holds this process back.
+    """
+
+    BACKOFF_BASE_SECONDS = 0.5
+    BACKOFF_MAX_SECONDS = 30.0
+    LATENCY_WINDOW = 1024
+
+    def __init__(
+        self,
+        whatsapp: Any,
+        rate_per_sec: float = 20.0,
+        burst: int = 20,
+        max_depth: int = 1000,
+        workers: int = 4,
+        max_attempts: int = 5,
+        drain_timeout: float = 10.0,
+        pacer: Optional[SQLiteRateLimiter] = None,
+    ) -> None:
+        self.whatsapp = whatsapp
+        self.pacer = pacer
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self.workers = max(1, workers)
+        self.max_depth = max(self.workers, max_depth)
+        self.max_attempts = max(1, max_attempts)
+        self.drain_timeout = drain_timeout
+        self._shard_depth = -(-self.max_depth // self.workers)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._latencies: Deque[float] = deque(maxlen=self.LATENCY_WINDOW)
+        self.enqueued = 0
+        self.sent = 0
+        self.retried = 0
+        self.dropped = 0
+        self.failed = 0
+
+    # ------------------------------------------------------------------
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def depth(self) -> int:
+        return sum(queue.qsize() for queue in self._queues)
+
+    def bucket_for(self, phone_number_id: str) -> TokenBucket:
+        bucket = self._buckets.get(phone_number_id)
+        if bucket is None:
+            bucket = self._buckets[phone_number_id] = TokenBucket(self.rate_per_sec, self.burst)
+        return bucket
+
+    # ------------------------------------------------------------------
+    async def start(self) -> None:
+        if self.running:
+            return
+        self._queues = [asyncio.Queue(maxsize=self._shard_depth) for _ in range(self.workers)]
+        self._tasks = [
+            asyncio.create_task(self._worker(queue), name=f"outbound-worker-{index}")
+            for index, queue in enumerate(self._queues)
+        ]
+
+    def enqueue(self, recipient: str, text: str) -> bool:
+        """Queue a reply without waiting; return ``False`` (and count a drop) when full.
+
+        A dropped reply is not sent; the caller should deliver it another way.
+        """
+
+        if not self.running:
+            raise RuntimeError("OutboundSender.start() must be awaited before enqueueing replies")
+        message = OutboundMessage(recipient, text, self.whatsapp.settings.whatsapp_phone_number_id)
+        queue = self._queues[zlib.crc32(recipient.encode("utf-8")) % self.workers]
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            OUTBOUND_REPLIES.inc("dropped")
+            logger.warning("Outbound queue full; reply not queued", extra={"recipient": recipient})
+            return False
+        self.enqueued += 1
+        return True
+
+    async def stop(self, drain: bool = True, timeout: Optional[float] = None) -> None:
+        if not self.running:
+            return
+        if drain:
+            wait = self.drain_timeout if timeout is None else timeout
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(queue.join() for queue in self._queues)),
+                    timeout=wait,
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Outbound queue drain timed out", extra={"pending": self.depth})
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queues = []
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+
+        def _quantile(q: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 4)
+
+        return {
+            "depth": self.depth,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "latency_p50_sec": _quantile(0.50),
+            "latency_p95_sec": _quantile(0.95),
+            "latency_max_sec": round(latencies[-1], 4) if latencies else None,
+        }
+
+    # ------------------------------------------------------------------
+    def backoff(self, attempts: int) -> float:
+        ceiling = min(self.BACKOFF_MAX_SECONDS, self.BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1))
+        return random.uniform(0, ceiling)
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            message = await queue.get()
+            try:
+                await self._deliver(message)
+            except Exception as exc:
+                self.failed += 1
+                OUTBOUND_REPLIES.inc("failed")
+                logger.exception(
+                    "Failed to deliver reply",
+                    extra={"recipient": message.recipient, "error": str(exc)},
+                )
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, message: OutboundMessage) -> None:
+        bucket = self.bucket_for(message.phone_number_id)
+        while True:
+            await bucket.acquire()
+            if self.pacer is not None:
+                await self._shared_slot(message.phone_number_id)
+            message.attempts += 1
+            retry_after: Optional[float] = None
+            try:
+                response = await call_io(self.whatsapp.post_text_message, message.recipient, message.text)
+            except httpx.TransportError as exc:
+                error = str(exc) or type(exc).__name__
+            else:
+                if response.is_success:
+                    latency = time.monotonic() - message.enqueued_at
+                    self.sent += 1
+                    self._latencies.append(latency)
+                    OUTBOUND_REPLIES.inc("sent")
+                    OUTBOUND_QUEUE_SECONDS.observe(latency)
+                    return
+                error = f"HTTP {response.status_code}"
+                if response.status_code != 429 and response.status_code < 500:
+                    self.failed += 1
+                    OUTBOUND_REPLIES.inc("failed")
+                    logger.warning(
+                        "WhatsApp rejected reply",
+                        extra={"recipient": message.recipient, "status": response.status_code},
+                    )
+                    return
+                retry_after = retry_after_seconds(response)
+                if response.status_code == 429:
+                    bucket.pause(retry_after or self.backoff(message.attempts))
+            if message.attempts >= self.max_attempts:
+                self.failed += 1
+                OUTBOUND_REPLIES.inc("failed")
+                logger.warning(
+                    "Giving up on reply",
+                    extra={"recipient": message.recipient, "attempts": message.attempts, "error": error},
+                )
+                return
+            self.retried += 1
+            OUTBOUND_REPLIES.inc("retried")
+            await asyncio.sleep(max(retry_after or 0.0, self.backoff(message.attempts)))
+
+    async def _shared_slot(self, phone_number_id: str) -> None:
+        """Wait for a slot in the rate every worker on the host shares for this number."""
+
+        while not await call_blocking(self.pacer.allow, phone_number_id):
+            await asyncio.sleep(1.0 / self.rate_per_sec)
+
+
+__all__ = ["OutboundSender", "TokenBucket", "retry_after_seconds"]
@@ -0,0 +1,204 @@
+"""Durable outbox for Next.js revalidation requests."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from bot.core.aio import call_io
+
+logger = logging.getLogger(__name__)
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class RevalidationOutbox:
+    """SQLite-backed queue of paths waiting to be revalidated.
+
+    There is one row per path, so a path requested again while it is still
+    pending is coalesced into the existing row. A fresh row waits
+    ``debounce_seconds`` before its first attempt. Failed attempts back off
+    exponentially. After ``max_attempts`` failures the row is parked as
+    ``failed`` until the path is enqueued again.
+
+    Every enqueue bumps ``version``. A delivery only deletes the row when the
+    version it claimed is still current, so a request that arrives
+    mid-flight is sent again rather than lost.
+
+    The SQLite calls block, so ``blocking`` makes the router enqueue off the
+    event loop and :meth:`dispatch_due` runs its reads and writes on the
+    thread pool.
+    """
+
+    blocking = True
+    BACKOFF_BASE_SECONDS = 2.0
+    BACKOFF_MAX_SECONDS = 300.0
+    LEASE_SECONDS = 60.0
+
+    def __init__(self, path: str, debounce_seconds: float = 5.0, max_attempts: int = 8) -> None:
+        self.path = path
+        self.debounce_seconds = max(0.0, float(debounce_seconds))
+        self.max_attempts = max(1, max_attempts)
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS revalidation_outbox ("
+            " path TEXT PRIMARY KEY,"
+            " lesson_id TEXT,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " version INTEGER NOT NULL DEFAULT 1,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " last_error TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS revalidation_outbox_due ON revalidation_outbox (status, next_attempt_at)"
+        )
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    def enqueue(self, path: str, lesson_id: Optional[str] = None) -> None:
+        """Schedule ``path`` for revalidation, coalescing with any pending request."""
+
+        now = time.time()
+        due = now + self.debounce_seconds
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO revalidation_outbox (path, lesson_id, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET"
+                " lesson_id = COALESCE(excluded.lesson_id, revalidation_outbox.lesson_id),"
+                " version = revalidation_outbox.version + 1,"
+                " attempts = CASE WHEN revalidation_outbox.status = 'failed' THEN 0"
+                " ELSE revalidation_outbox.attempts END,"
+                " next_attempt_at = CASE WHEN revalidation_outbox.status = 'failed' THEN excluded.next_attempt_at"
+                " ELSE MIN(revalidation_outbox.next_attempt_at, excluded.next_attempt_at) END,"
+                " status = 'pending',"
+                " updated_at = excluded.updated_at",
+                (path, lesson_id, due, now, now),
+            )
+
+    def claim_due(self, limit: int = 50, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Lease up to ``limit`` due rows so concurrent dispatchers do not send them twice."""
+
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "UPDATE revalidation_outbox SET next_attempt_at = ? "
+                "WHERE path IN ("
+                " SELECT path FROM revalidation_outbox"
+                " WHERE status = 'pending' AND next_attempt_at <= ?"
+                " ORDER BY next_attempt_at LIMIT ?) "
+                "RETURNING path, lesson_id, version, attempts",
+                (now + self.LEASE_SECONDS, now, limit),
+            ).fetchall()
+        return [
+            {"path": path, "lesson_id": lesson_id, "version": version, "attempts": attempts}
+            for path, lesson_id, version, attempts in rows
+        ]
+
+    def mark_delivered(self, path: str, version: int) -> None:
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM revalidation_outbox WHERE path = ? AND version = ?",
+                (path, version),
+            )
+            if cursor.rowcount == 0:
+                # Re-requested while in flight: send the newer request once its debounce expires.
+                self._conn.execute(
+                    "UPDATE revalidation_outbox SET next_attempt_at = MIN(next_attempt_at, ?) WHERE path = ?",
+                    (time.time() + self.debounce_seconds, path),
+                )
+
+    def mark_failed(self, path: str, error: str, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM revalidation_outbox WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                return
+            attempts = row[0] + 1
+            status = "failed" if attempts >= self.max_attempts else "pending"
+            self._conn.execute(
+                "UPDATE revalidation_outbox SET attempts = ?, status = ?, next_attempt_at = ?,"
+                " last_error = ?, updated_at = ? WHERE path = ?",
+                (attempts, status, now + self.backoff(attempts), error[:500], now, path),
+            )
+
+    def backoff(self, attempts: int) -> float:
+        return min(self.BACKOFF_MAX_SECONDS, self.BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1))
+
+    # ------------------------------------------------------------------
+    async def dispatch_due(self, revalidator: Any, limit: int = 50) -> int:
+        """Send every due path through ``revalidator``; return how many were delivered."""
+
+        claimed = await asyncio.to_thread(self.claim_due, limit)
+        if not claimed:
+            return 0
+        versions = {row["path"]: row["version"] for row in claimed}
+        try:
+            results = await call_io(revalidator.trigger, list(versions))
+        except Exception as exc:
+            logger.exception("Revalidation dispatch failed", extra={"paths": list(versions), "error": str(exc)})
+            results = [{"path": path, "status": 500, "body": {"error": str(exc)}} for path in versions]
+        return await asyncio.to_thread(self._record_results, results, versions)
+
+    def _record_results(self, results: List[Dict[str, Any]], versions: Dict[str, int]) -> int:
+        delivered = 0
+        for result in results:
+            path = result["path"]
+            if 200 <= result["status"] < 300:
+                self.mark_delivered(path, versions[path])
+                delivered += 1
+            else:
+                logger.warning(
+                    "Revalidation attempt failed",
+                    extra={"path": path, "status": result["status"], "body": result.get("body")},
+                )
+                self.mark_failed(path, f"{result['status']}: {result.get('body')}")
+        return delivered
+
+    def report(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Return pending and failed entries for the outbox endpoint."""
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, lesson_id, status, attempts, next_attempt_at, last_error, created_at, updated_at "
+                "FROM revalidation_outbox ORDER BY next_attempt_at"
+            ).fetchall()
+        report: Dict[str, List[Dict[str, Any]]] = {"pending": [], "failed": []}
+        for path, lesson_id, status, attempts, next_attempt_at, last_error, created_at, updated_at in rows:
+            report[status].append(
+                {
+                    "path": path,
+                    "lesson_id": lesson_id,
+                    "attempts": attempts,
+                    "next_attempt_at": _isoformat(next_attempt_at) if status == "pending" else None,
+                    "last_error": last_error,
+                    "created_at": _isoformat(created_at),
+                    "updated_at": _isoformat(updated_at),
+                }
+            )
+        return report
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM revalidation_outbox").fetchone()
+        return int(count)
+
+
+__all__ = ["RevalidationOutbox"]
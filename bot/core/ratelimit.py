@@ -1,10 +1,12 @@
-"""In-memory rate limiting utilities."""
+"""Rate limiting utilities."""
 from __future__ import annotations
 
+import sqlite3
 import threading
 import time
 from collections import defaultdict, deque
-from typing import Deque, DefaultDict
+from dataclasses import dataclass
+from typing import Deque, DefaultDict, Dict, List, Tuple, Union
 
 
 class RateLimiter:
@@ -37,4 +39,228 @@ class RateLimiter:
             self.window_seconds = max(1, window_seconds)
 
 
-__all__ = ["RateLimiter"]
+class GCRARateLimiter:
+    """Generic cell rate algorithm limiter with constant state per sender.
+
+    Each sender costs one float (its theoretical arrival time) instead of a
+    deque of timestamps. Senders are spread over ``stripes`` independently
+    locked shards, and a shard drops idle senders (whose arrival time is in
+    the past, i.e. who have a full allowance again) at most once per
+    ``sweep_interval`` seconds.
+
+    The allowance matches :class:`RateLimiter` for bursts (``max_events`` at
+    once) but refills smoothly at ``max_events / window_seconds`` per second
+    rather than all at once when the window slides past.
+    """
+
+    def __init__(
+        self,
+        max_events: int,
+        window_seconds: int,
+        stripes: int = 64,
+        sweep_interval: float = 60.0,
+    ) -> None:
+        self.max_events = max(1, max_events)
+        self.window_seconds = max(1, window_seconds)
+        self.sweep_interval = sweep_interval
+        self._stripe_count = max(1, stripes)
+        self._locks: List[threading.Lock] = [threading.Lock() for _ in range(self._stripe_count)]
+        self._tats: List[Dict[str, float]] = [{} for _ in range(self._stripe_count)]
+        self._next_sweep: List[float] = [time.monotonic() + sweep_interval] * self._stripe_count
+        self._emission_interval = self.window_seconds / self.max_events
+
+    def allow(self, sender: str) -> bool:
+        """Return ``True`` if the sender is within the configured limits."""
+
+        now = time.monotonic()
+        index = hash(sender) % self._stripe_count
+        with self._locks[index]:
+            tats = self._tats[index]
+            if now >= self._next_sweep[index]:
+                self._sweep_stripe(tats, now)
+                self._next_sweep[index] = now + self.sweep_interval
+            tat = tats.get(sender, now)
+            if tat < now:
+                tat = now
+            new_tat = tat + self._emission_interval
+            if new_tat - now > self.window_seconds:
+                return False
+            tats[sender] = new_tat
+            return True
+
+    def update_limits(self, max_events: int, window_seconds: int) -> None:
+        """Update rate limiting thresholds at runtime."""
+
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            self.max_events = max(1, max_events)
+            self.window_seconds = max(1, window_seconds)
+            self._emission_interval = self.window_seconds / self.max_events
+        finally:
+            for lock in self._locks:
+                lock.release()
+
+    def sweep(self) -> int:
+        """Drop every idle sender now; return how many were evicted."""
+
+        evicted = 0
+        now = time.monotonic()
+        for index, lock in enumerate(self._locks):
+            with lock:
+                evicted += self._sweep_stripe(self._tats[index], now)
+                self._next_sweep[index] = now + self.sweep_interval
+        return evicted
+
+    def __len__(self) -> int:
+        return sum(len(tats) for tats in self._tats)
+
+    @staticmethod
+    def _sweep_stripe(tats: Dict[str, float], now: float) -> int:
+        idle = [sender for sender, tat in tats.items() if tat <= now]
+        for sender in idle:
+            del tats[sender]
+        return len(idle)
+
+
+@dataclass
+class _Lease:
+    left: int
+    expires_at: float
+    size: int
+
+
+class SQLiteRateLimiter:
+    """GCRA limiter whose state lives in a WAL-mode SQLite file shared by every worker.
+
+    A worker does not write the file for every message. It leases a slice of
+    the sender's allowance (advancing the shared arrival time by that many
+    slots in one ``BEGIN IMMEDIATE`` transaction) and spends it from memory
+    until it runs out. A lease starts at one slot and doubles, up to
+    ``lease``, each time the worker uses one up within the window, so a
+    sender spread thinly over many workers keeps one-slot leases. A lease
+    expires after one window: a worker can therefore admit at most
+    ``lease - 1`` slots it leased earlier on top of the shared limit, and
+    expired slots are not returned. A rejected sender is remembered locally
+    until its next slot opens. ``blocking`` tells the
+    router to call :meth:`allow` off the event loop so lock waits never stall
+    other coroutines.
+    """
+
+    blocking = True
+    _PURGE_EVERY = 1000
+
+    def __init__(self, path: str, max_events: int, window_seconds: float, lease: int = 4) -> None:
+        self.path = path
+        self.max_events = max(1, max_events)
+        self.window_seconds = max(0.001, window_seconds)
+        self.lease = max(1, lease)
+        self._emission_interval = self.window_seconds / self.max_events
+        self._blocked_until: Dict[str, float] = {}
+        self._leases: Dict[str, _Lease] = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS rate_limits (sender TEXT PRIMARY KEY, tat REAL NOT NULL)")
+
+    def allow(self, sender: str) -> bool:
+        """Return ``True`` if the sender is within the configured limits."""
+
+        now = time.time()
+        with self._lock:
+            blocked_until = self._blocked_until.get(sender)
+            if blocked_until is not None:
+                if now < blocked_until:
+                    return False
+                del self._blocked_until[sender]
+            lease = self._leases.get(sender)
+            if lease is not None and now < lease.expires_at:
+                if lease.left:
+                    lease.left -= 1
+                    return True
+                size = min(self.lease, lease.size * 2)
+            else:
+                size = 1
+            granted, tat = self._take(sender, now, size)
+            self._calls += 1
+            if self._calls % self._PURGE_EVERY == 0:
+                self._purge(now)
+            if not granted:
+                self._leases.pop(sender, None)
+                self._blocked_until[sender] = tat + self._emission_interval - self.window_seconds
+                return False
+            self._leases[sender] = _Lease(granted - 1, now + self.window_seconds, granted)
+            return True
+
+    def update_limits(self, max_events: int, window_seconds: float) -> None:
+        """Update rate limiting thresholds at runtime."""
+
+        with self._lock:
+            self.max_events = max(1, max_events)
+            self.window_seconds = max(0.001, window_seconds)
+            self._emission_interval = self.window_seconds / self.max_events
+            self._blocked_until.clear()
+            self._leases.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _take(self, sender: str, now: float, size: int) -> Tuple[int, float]:
+        """Claim up to ``size`` slots; return how many were granted and the sender's arrival time."""
+
+        interval = self._emission_interval
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._conn.execute("SELECT tat FROM rate_limits WHERE sender = ?", (sender,)).fetchone()
+            tat = max(row[0], now) if row is not None else now
+            granted = max(0, min(size, int((self.window_seconds - (tat - now)) / interval + 1e-9)))
+            if granted:
+                tat += granted * interval
+                self._conn.execute(
+                    "INSERT INTO rate_limits (sender, tat) VALUES (?, ?) "
+                    "ON CONFLICT(sender) DO UPDATE SET tat = excluded.tat",
+                    (sender, tat),
+                )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        return granted, tat
+
+    def _purge(self, now: float) -> None:
+        self._conn.execute("DELETE FROM rate_limits WHERE tat <= ?", (now,))
+        self._blocked_until = {sender: until for sender, until in self._blocked_until.items() if until > now}
+        self._leases = {sender: lease for sender, lease in self._leases.items() if lease.expires_at > now}
+
+
+AnyRateLimiter = Union[RateLimiter, GCRARateLimiter, SQLiteRateLimiter]
+
+
+def build_rate_limiter(
+    algorithm: str,
+    max_events: int,
+    window_seconds: int,
+    backend: str = "memory",
+    path: str = "bot-ratelimit.sqlite3",
+    lease: int = 4,
+) -> AnyRateLimiter:
+    """Create the limiter selected by ``BOT_RATE_LIMIT_BACKEND`` / ``BOT_RATE_LIMIT_ALGORITHM``.
+
+    The ``sqlite`` backend is shared between processes and always uses GCRA.
+    """
+
+    if backend == "sqlite":
+        return SQLiteRateLimiter(path, max_events, window_seconds, lease=lease)
+    if backend != "memory":
+        raise ValueError(f"Unknown rate limit backend: {backend}")
+    if algorithm == "gcra":
+        return GCRARateLimiter(max_events, window_seconds)
+    if algorithm == "sliding":
+        return RateLimiter(max_events, window_seconds)
+    raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+
+
+__all__ = ["AnyRateLimiter", "GCRARateLimiter", "RateLimiter", "SQLiteRateLimiter", "build_rate_limiter"]
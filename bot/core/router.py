@@ -1,214 +1,496 @@
 """Routing logic that coordinates command handling and integrations."""
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Dict
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional, Union
 
+from bot.core.aio import call_blocking, call_io
 from bot.core.commands import CHEAT_SHEET, Command, CommandParser, CommandType
-from bot.core.ratelimit import RateLimiter
-from bot.core.state import ChatState, media_expectation
-from bot.integrations.revalidate import NextRevalidator
-from bot.integrations.supabase_client import SupabaseService
-from bot.integrations.whatsapp import InboundMessage, WhatsAppAPI
+from bot.core.dedup import DedupStore
+from bot.core.importer import detect_format, import_lesson
+from bot.core.metrics import COMMAND_SECONDS, MESSAGES, PARSE_SECONDS, RATE_LIMITED, UNAUTHORISED
+from bot.core.outbound import OutboundSender
+from bot.core.outbox import RevalidationOutbox
+from bot.core.ratelimit import AnyRateLimiter
+from bot.core.state import ChatState, ChatStateCache, media_expectation
+from bot.core.tracing import Tracer, span
+from bot.core.uow import UnitOfWork
+from bot.integrations.revalidate import AsyncNextRevalidator, NextRevalidator
+from bot.integrations.supabase_client import AsyncSupabaseService, SupabaseService
+from bot.integrations.whatsapp import AsyncWhatsAppAPI, InboundMessage, MediaTooLarge, WhatsAppAPI
 from bot.settings import Settings
 
 logger = logging.getLogger(__name__)
 
+SupabaseBackend = Union[SupabaseService, AsyncSupabaseService]
+WhatsAppBackend = Union[WhatsAppAPI, AsyncWhatsAppAPI]
+RevalidatorBackend = Union[NextRevalidator, AsyncNextRevalidator]
+
+
+@dataclass
+class _Outcome:
+    """Reply line for one command.
+
+    ``failure`` is set while the command's writes wait in the unit of work;
+    :func:`_settle` then picks ``text`` or ``failure`` once the batch lands.
+    ``halt`` stops the rest of a pasted batch, whose later commands would
+    otherwise run against the wrong (or no) lesson.
+    """
+
+    text: str
+    failure: Optional[str] = None
+    state_saved: bool = False
+    halt: bool = False
+
+
+def _settle(outcomes: List[_Outcome], ok: bool) -> None:
+    for outcome in outcomes:
+        if outcome.failure is not None:
+            if not ok:
+                outcome.text = outcome.failure
+            outcome.failure = None
+
+
+def _summary(outcomes: List[_Outcome]) -> str:
+    if len(outcomes) == 1:
+        return outcomes[0].text
+    lines = [f"Ran {len(outcomes)} commands:"]
+    lines.extend(f"{index}. {outcome.text}" for index, outcome in enumerate(outcomes, start=1))
+    return "\n".join(lines)
+
 
 class MessageRouter:
-    """Coordinate inbound WhatsApp messages with bot behaviour."""
+    """Coordinate inbound WhatsApp messages with bot behaviour.
+
+    The router is async end to end. Integrations may be either the blocking
+    clients or their ``Async*`` counterparts; blocking calls are pushed onto
+    a worker thread through :func:`bot.core.aio.call_io`.
+    """
 
     def __init__(
         self,
         settings: Settings,
-        supabase: SupabaseService,
-        whatsapp: WhatsAppAPI,
-        revalidator: NextRevalidator,
-        rate_limiter: RateLimiter,
+        supabase: SupabaseBackend,
+        whatsapp: WhatsAppBackend,
+        revalidator: RevalidatorBackend,
+        rate_limiter: AnyRateLimiter,
+        dedup: Optional[DedupStore] = None,
+        state_cache: Optional[ChatStateCache] = None,
+        write_behind: bool = False,
+        outbox: Optional[RevalidationOutbox] = None,
+        outbound: Optional[OutboundSender] = None,
+        payload_concurrency: int = 8,
+        tracer: Optional[Tracer] = None,
     ) -> None:
         self.settings = settings
         self.supabase = supabase
         self.whatsapp = whatsapp
         self.revalidator = revalidator
         self.rate_limiter = rate_limiter
+        self.dedup = dedup
+        self.state_cache = state_cache
+        self.write_behind = write_behind and state_cache is not None
+        self.outbox = outbox
+        self.outbound = outbound
+        self.payload_concurrency = max(1, payload_concurrency)
+        self.tracer = tracer
         self.parser = CommandParser()
 
     # ------------------------------------------------------------------
-    def handle_payload(self, payload: Dict) -> None:
-        messages = self.whatsapp.extract_messages(payload)
+    async def accept_payload(self, payload: Dict) -> List[InboundMessage]:
+        """Extract the payload's messages, dropping ids that were already accepted."""
+
+        return await self.accept_messages(self.whatsapp.extract_messages(payload))
+
+    async def accept_messages(self, messages: List[InboundMessage]) -> List[InboundMessage]:
+        """Drop already-accepted ids from messages decoded by the caller."""
+
+        ids = [message.message_id for message in messages if message.message_id]
+        if self.dedup is None or not ids:
+            return messages
+        marks = iter(await call_blocking(self.dedup.check_and_mark_many, ids))
+        fresh: List[InboundMessage] = []
         for message in messages:
-            self.handle_message(message)
+            if message.message_id and not next(marks):
+                logger.info(
+                    "Skipping redelivered message",
+                    extra={"sender": message.sender, "message_id": message.message_id},
+                )
+                continue
+            fresh.append(message)
+        return fresh
+
+    async def release(self, message: InboundMessage) -> None:
+        """Forget a message accepted by :meth:`accept_payload` that will not be processed."""
+
+        if self.dedup is not None and message.message_id:
+            await call_blocking(self.dedup.discard, message.message_id)
+
+    async def handle_payload(self, payload: Dict) -> None:
+        await self.handle_messages(self.whatsapp.extract_messages(payload))
+
+    async def handle_messages(self, messages: List[InboundMessage]) -> None:
+        """Process a payload's messages, one sender group at a time per slot.
+
+        Messages are grouped by sender. Each sender's messages run in arrival
+        order, while up to ``payload_concurrency`` senders run at once. A
+        failing message is logged and does not stop its group or the others.
+        """
+
+        groups: Dict[str, List[InboundMessage]] = {}
+        for message in await self.accept_messages(messages):
+            groups.setdefault(message.sender, []).append(message)
+        if len(groups) <= 1 or self.payload_concurrency == 1:
+            for group in groups.values():
+                await self._handle_group(group)
+            return
+        slots = asyncio.Semaphore(self.payload_concurrency)
+
+        async def run(group: List[InboundMessage]) -> None:
+            async with slots:
+                await self._handle_group(group)
+
+        await asyncio.gather(*(run(group) for group in groups.values()))
 
-    def handle_message(self, message: InboundMessage) -> None:
+    async def _handle_group(self, messages: List[InboundMessage]) -> None:
+        for message in messages:
+            try:
+                await self.handle_message(message)
+            except Exception as exc:
+                logger.exception(
+                    "Failed to process inbound message",
+                    extra={"sender": message.sender, "message_id": message.message_id, "error": str(exc)},
+                )
+
+    async def handle_message(self, message: InboundMessage) -> None:
+        """Handle one message, traced as a ``message`` span when a tracer is set."""
+
+        if self.tracer is None:
+            await self._handle_message(message)
+            return
+        with self.tracer.trace("message", message_id=message.message_id, type=message.type):
+            await self._handle_message(message)
+
+    async def _handle_message(self, message: InboundMessage) -> None:
         sender = message.sender
         if not (self.settings.allow_all_senders or sender in self.settings.bot_allowed_senders):
             logger.info("Ignoring message from unauthorised sender", extra={"sender": sender})
+            UNAUTHORISED.inc()
             return
 
-        if not self.rate_limiter.allow(sender):
-            self.whatsapp.send_text_message(sender, "Please slow down. Let's continue in a minute.")
+        MESSAGES.inc(message.type)
+        if not await call_blocking(self.rate_limiter.allow, sender):
+            RATE_LIMITED.inc()
+            await self._reply(sender, "Please slow down. Let's continue in a minute.")
             return
 
-        state = self.supabase.get_chat_state(sender)
+        state = await self._load_state(sender)
         if message.type == "text":
-            command = self.parser.parse(message.text or "")
-            self._handle_command(command, state)
+            with PARSE_SECONDS.time(), span("parse"):
+                commands = self.parser.parse_many(message.text or "")
+            await self._handle_commands(commands, state)
+        elif message.type == "document":
+            await self._handle_document(message, state)
         else:
-            self._handle_media(message, state)
+            await self._handle_media(message, state)
 
     # ------------------------------------------------------------------
-    def _handle_command(self, command: Command, state: ChatState) -> None:
+    async def _handle_commands(self, commands: List[Command], state: ChatState) -> None:
+        """Run one or more commands against one loaded state and send one reply.
+
+        Quiz, body and state writes are staged in a single :class:`UnitOfWork`
+        and flushed once at the end (or before a PUBLISH, which must see
+        them), so a pasted batch costs one state load, one bulk write and one
+        reply. An invalid command or a failed NEW LESSON stops the batch.
+        """
+
+        sender = state.sender_phone
+        uow = UnitOfWork(self.supabase)
+        outcomes: List[_Outcome] = []
+        stored = replace(state)
+        skipped = 0
+        for position, command in enumerate(commands):
+            if outcomes and outcomes[-1].halt:
+                skipped = len(commands) - position
+                break
+            if command.type == CommandType.PUBLISH and uow.pending:
+                flushed = await uow.commit()
+                _settle(outcomes, flushed)
+                if not flushed:
+                    outcomes.append(_Outcome("Failed to publish. Please try again."))
+                    continue
+            started = time.perf_counter()
+            with span(f"command.{command.type.value}"):
+                outcome = await self._run_command(command, state, uow)
+            COMMAND_SECONDS.observe(time.perf_counter() - started, command.type.value)
+            outcomes.append(outcome)
+            if outcome.state_saved:
+                stored = replace(state)
+        _settle(outcomes, await self._commit(uow, state, stored))
+        reply = _summary(outcomes)
+        if skipped:
+            reply += f"\nStopped there; the remaining {skipped} command(s) were not run."
+        await self._reply(sender, reply)
+
+    async def _run_command(self, command: Command, state: ChatState, uow: UnitOfWork) -> _Outcome:
         sender = state.sender_phone
         if not command.is_valid:
-            self.whatsapp.send_text_message(sender, command.error or "Unable to understand that command.")
             state.last_cmd = command.type.value
-            self.supabase.upsert_chat_state(state)
-            return
+            return _Outcome(command.error or "Unable to understand that command.", halt=True)
 
         if command.type == CommandType.HELP:
-            self.whatsapp.send_text_message(sender, CHEAT_SHEET)
             state.last_cmd = command.type.value
-            self.supabase.upsert_chat_state(state)
-            return
+            return _Outcome(CHEAT_SHEET)
 
         if command.type == CommandType.NEW_LESSON:
             payload = command.payload
-            lesson = self.supabase.create_lesson(
+            lesson = await call_io(
+                self.supabase.create_lesson,
                 title=payload["title"],
                 level=payload["level"],
                 topic=payload["topic"],
                 author_phone=sender,
             )
             if not lesson:
-                self.whatsapp.send_text_message(sender, "Could not create a lesson right now. Please try again.")
-                return
+                return _Outcome("Could not create a lesson right now. Please try again.", halt=True)
             state.active_lesson = lesson["id"]
             state.last_cmd = command.type.value
-            self.supabase.upsert_chat_state(state)
-            self.whatsapp.send_text_message(
-                sender,
-                f"Draft lesson created: {lesson['title']}\nLesson ID: {lesson['id']}",
-            )
-            return
+            return _Outcome(f"Draft lesson created: {lesson['title']}\nLesson ID: {lesson['id']}")
 
         if command.type == CommandType.ADD_BODY:
             if not state.active_lesson:
-                self.whatsapp.send_text_message(sender, "No active lesson. Use NEW LESSON first.")
-                return
-            success = self.supabase.update_lesson_body(state.active_lesson, command.payload["body"])
-            if success:
-                state.last_cmd = command.type.value
-                self.supabase.upsert_chat_state(state)
-                self.whatsapp.send_text_message(sender, "Updated the lesson body.")
-            else:
-                self.whatsapp.send_text_message(sender, "Could not update the lesson body. Please retry.")
-            return
+                return _Outcome("No active lesson. Use NEW LESSON first.")
+            uow.append_body(state.active_lesson, command.payload["body"])
+            state.last_cmd = command.type.value
+            return _Outcome("Updated the lesson body.", failure="Could not update the lesson body. Please retry.")
 
         if command.type == CommandType.ADD_QUIZ:
             if not state.active_lesson:
-                self.whatsapp.send_text_message(sender, "No active lesson. Use NEW LESSON first.")
-                return
+                return _Outcome("No active lesson. Use NEW LESSON first.")
             payload = command.payload
-            success = self.supabase.add_quiz(
+            uow.add_quiz(
                 lesson_id=state.active_lesson,
                 prompt=payload["prompt"],
                 options=payload["options"],
                 answer_idx=payload["answer_idx"],
             )
-            if success:
-                state.last_cmd = command.type.value
-                self.supabase.upsert_chat_state(state)
-                self.whatsapp.send_text_message(sender, "Quiz added to the lesson.")
-            else:
-                self.whatsapp.send_text_message(sender, "Could not add the quiz. Please retry.")
-            return
+            state.last_cmd = command.type.value
+            return _Outcome("Quiz added to the lesson.", failure="Could not add the quiz. Please retry.")
 
         if command.type == CommandType.ADD_MEDIA:
             if not state.active_lesson:
-                self.whatsapp.send_text_message(sender, "No active lesson. Use NEW LESSON first.")
-                return
+                return _Outcome("No active lesson. Use NEW LESSON first.")
             kind = command.payload["kind"]
             state.last_cmd = media_expectation(kind)
-            self.supabase.upsert_chat_state(state)
-            self.whatsapp.send_text_message(sender, f"Okay! Send the {kind} you want to attach.")
-            return
+            return _Outcome(f"Okay! Send the {kind} you want to attach.")
 
         if command.type == CommandType.PUBLISH:
             if not state.active_lesson:
-                self.whatsapp.send_text_message(sender, "No active lesson to publish.")
-                return
-            lesson = self.supabase.get_lesson(state.active_lesson)
-            if not lesson:
-                self.whatsapp.send_text_message(sender, "Could not load the lesson. Please try again.")
-                return
-            slug = lesson.get("slug") or self.supabase.generate_unique_slug(lesson.get("title", "lesson"))
-            if not self.supabase.publish_lesson(state.active_lesson, slug):
-                self.whatsapp.send_text_message(sender, "Failed to publish. Please try again.")
-                return
-            revalidation = self.revalidator.trigger([f"/lessons/{slug}"])
-            self.supabase.record_publish(state.active_lesson, "whatsapp", {"revalidation": revalidation})
-            state.active_lesson = None
-            state.last_cmd = command.type.value
-            self.supabase.upsert_chat_state(state)
-            self.whatsapp.send_text_message(
+                return _Outcome("No active lesson to publish.")
+            lesson_id = state.active_lesson
+            published = await call_io(
+                self.supabase.publish_lesson_atomic,
+                lesson_id,
                 sender,
-                f"Published! /lessons/{slug}\n(Site will refresh shortly.)",
+                "whatsapp",
+                {"revalidation": "queued" if self.outbox is not None else "inline"},
             )
-            return
+            if not published:
+                return _Outcome("Failed to publish. Please try again.")
+            slug = published["slug"]
+            path = f"/lessons/{slug}"
+            refreshed = True
+            if self.outbox is not None:
+                await call_blocking(self.outbox.enqueue, path, lesson_id=lesson_id)
+            else:
+                results = await call_io(self.revalidator.trigger, [path])
+                refreshed = await self._record_revalidation(lesson_id, published.get("publish_id"), path, results)
+            # publish_lesson_atomic already cleared the stored chat state.
+            state.active_lesson = None
+            state.last_cmd = command.type.value
+            self._remember_state(state)
+            note = "Site will refresh shortly." if refreshed else "The site could not be refreshed yet; the page may be stale."
+            return _Outcome(f"Published! /lessons/{slug}\n({note})", state_saved=True)
 
         if command.type == CommandType.CANCEL:
             state.active_lesson = None
             state.last_cmd = command.type.value
-            self.supabase.upsert_chat_state(state)
-            self.whatsapp.send_text_message(sender, "Draft cleared. Ready for the next lesson.")
+            return _Outcome("Draft cleared. Ready for the next lesson.")
+
+        return _Outcome("Command recognised but not implemented.")
+
+    async def _record_revalidation(
+        self, lesson_id: str, publish_id: Optional[str], path: str, results: List[Dict[str, Any]]
+    ) -> bool:
+        """Store an inline revalidation's statuses on the publishes row; return whether all succeeded."""
+
+        failed = [result for result in results if not 200 <= result["status"] < 300]
+        for result in failed:
+            logger.warning(
+                "Revalidation after publish failed",
+                extra={"lesson_id": lesson_id, "path": result["path"], "status": result["status"]},
+            )
+        if publish_id is not None:
+            await call_io(self.supabase.record_revalidation, publish_id, {"revalidation": results, "path": path})
+        return not failed
+
+    # ------------------------------------------------------------------
+    async def flush_chat_states(self) -> int:
+        """Persist states held back by write-behind caching; return how many were written.
+
+        States whose upsert fails are marked dirty again for the next flush.
+        """
+
+        if self.state_cache is None:
+            return 0
+        written = 0
+        for state in self.state_cache.drain_dirty():
+            if await call_io(self.supabase.upsert_chat_state, state):
+                written += 1
+            else:
+                self.state_cache.mark_dirty(state)
+        return written
+
+    def invalidate_chat_state(self, sender: Optional[str] = None) -> None:
+        """Drop cached state so the next message re-reads it from Supabase."""
+
+        if self.state_cache is not None:
+            self.state_cache.invalidate(sender)
+
+    async def _load_state(self, sender: str) -> ChatState:
+        if self.state_cache is not None:
+            cached = self.state_cache.get(sender)
+            if cached is not None:
+                return cached
+        state = await call_io(self.supabase.get_chat_state, sender)
+        if self.state_cache is not None:
+            self.state_cache.put(state)
+        return state
+
+    async def _save_state(self, state: ChatState) -> None:
+        if self.state_cache is None:
+            await call_io(self.supabase.upsert_chat_state, state)
+            return
+        if not self.state_cache.changed(state):
+            return
+        if self.write_behind:
+            self.state_cache.put(state, dirty=True)
             return
+        if await call_io(self.supabase.upsert_chat_state, state):
+            self.state_cache.put(state)
 
-        self.whatsapp.send_text_message(sender, "Command recognised but not implemented.")
+    async def _commit(self, uow: UnitOfWork, state: ChatState, stored: ChatState) -> bool:
+        """Flush ``uow`` with ``state`` folded into the same request.
+
+        ``stored`` is the state Supabase already holds; without a cache the
+        upsert is skipped when ``state`` still matches it. The state is only
+        cached (or marked dirty under write-behind) once the batch has landed,
+        so a failed write leaves the previous state in place.
+        """
+
+        if self.state_cache is not None:
+            persist = self.state_cache.changed(state)
+        else:
+            persist = state != stored
+        if persist and not self.write_behind:
+            uow.upsert_chat_state(state)
+        if not await uow.commit():
+            return False
+        if persist and self.state_cache is not None:
+            self.state_cache.put(state, dirty=self.write_behind)
+        return True
+
+    def _remember_state(self, state: ChatState) -> None:
+        """Cache a state that Supabase already holds, without writing it again."""
+
+        if self.state_cache is not None:
+            self.state_cache.put(state)
+
+    async def _reply(self, recipient: str, text: str) -> None:
+        # A full queue falls back to sending inline, which slows this handler
+        # down instead of losing the reply.
+        if self.outbound is not None and self.outbound.running and self.outbound.enqueue(recipient, text):
+            return
+        await call_io(self.whatsapp.send_text_message, recipient, text)
 
     # ------------------------------------------------------------------
-    def _handle_media(self, message: InboundMessage, state: ChatState) -> None:
+    async def _handle_media(self, message: InboundMessage, state: ChatState) -> None:
         sender = state.sender_phone
         expected_kind = state.expecting_media()
         if not expected_kind:
-            self.whatsapp.send_text_message(sender, "No media expected. Use ADD MEDIA first.")
+            await self._reply(sender, "No media expected. Use ADD MEDIA first.")
             return
         if expected_kind != message.type:
-            self.whatsapp.send_text_message(
+            await self._reply(
                 sender,
                 f"Expected a {expected_kind} but received {message.type}. Send ADD MEDIA again if needed.",
             )
             return
         if not state.active_lesson:
-            self.whatsapp.send_text_message(sender, "No active lesson. Use NEW LESSON first.")
+            await self._reply(sender, "No active lesson. Use NEW LESSON first.")
             return
         if not message.media_id:
-            self.whatsapp.send_text_message(sender, "Media payload missing reference. Please resend.")
+            await self._reply(sender, "Media payload missing reference. Please resend.")
+            return
+        try:
+            media = await call_io(self.whatsapp.stream_media, message.media_id)
+        except MediaTooLarge as exc:
+            await self._reply(sender, f"That {message.type} is too large. The limit is {exc.limit / (1024 * 1024):g} MB.")
             return
-        media = self.whatsapp.download_media(message.media_id)
         if not media:
-            self.whatsapp.send_text_message(sender, "Could not download that media. Please try again.")
-            return
-        url = self.supabase.upload_lesson_media(
-            lesson_id=state.active_lesson,
-            filename=message.media_filename or media["filename"],
-            blob=media["bytes"],
-            mime_type=media["mime_type"],
-        )
-        if not url:
-            self.whatsapp.send_text_message(sender, "Could not store the media. Please try again.")
+            await self._reply(sender, "Could not download that media. Please try again.")
             return
-        stored = self.supabase.add_media_entry(
-            lesson_id=state.active_lesson,
-            kind=message.type,
-            url=url,
-            caption=message.caption,
-        )
-        if not stored:
-            self.whatsapp.send_text_message(sender, "Media uploaded but could not record it. Please retry later.")
+        try:
+            url = await call_io(
+                self.supabase.upload_lesson_media_file,
+                lesson_id=state.active_lesson,
+                filename=message.media_filename or media.filename,
+                file=media.file,
+                size=media.size,
+                mime_type=media.mime_type,
+            )
+        finally:
+            media.close()
+        if not url:
+            await self._reply(sender, "Could not store the media. Please try again.")
             return
+        uow = UnitOfWork(self.supabase)
+        uow.add_media_entry(lesson_id=state.active_lesson, kind=message.type, url=url, caption=message.caption)
+        stored = replace(state)
         state.last_cmd = "media_attached"
-        self.supabase.upsert_chat_state(state)
-        self.whatsapp.send_text_message(sender, f"Attached {message.type} to the lesson.")
+        if not await self._commit(uow, state, stored):
+            await self._reply(sender, "Media uploaded but could not record it. Please retry later.")
+            return
+        await self._reply(sender, f"Attached {message.type} to the lesson.")
+
+    async def _handle_document(self, message: InboundMessage, state: ChatState) -> None:
+        """Import a lesson from an uploaded markdown or JSON Lines document."""
+
+        sender = state.sender_phone
+        if not message.media_id:
+            await self._reply(sender, "Media payload missing reference. Please resend.")
+            return
+        try:
+            media = await call_io(self.whatsapp.stream_media, message.media_id)
+        except MediaTooLarge as exc:
+            await self._reply(sender, f"That document is too large. The limit is {exc.limit / (1024 * 1024):g} MB.")
+            return
+        if not media:
+            await self._reply(sender, "Could not download that document. Please try again.")
+            return
+        try:
+            fmt = detect_format(message.media_filename or media.filename, media.mime_type)
+            report = await import_lesson(self.supabase, media.file, sender, fmt)
+        finally:
+            media.close()
+        if report.lesson_id is not None:
+            state.active_lesson = report.lesson_id
+            state.last_cmd = "import"
+            await self._save_state(state)
+        await self._reply(sender, report.summary())
 
 
 __all__ = ["MessageRouter"]
@@ -0,0 +1,87 @@
+"""Lesson slug allocation helpers."""
+from __future__ import annotations
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional, Set
+
+_SUFFIX = re.compile(r"^(?P<base>.+)-(?P<n>[0-9]+)$")
+
+
+def in_family(base: str, slug: str) -> bool:
+    """Return ``True`` for ``base`` itself and ``base-N`` variants."""
+
+    if slug == base:
+        return True
+    match = _SUFFIX.match(slug)
+    return match is not None and match.group("base") == base
+
+
+def next_free_slug(base: str, taken: Iterable[str]) -> str:
+    """Pick ``base`` or the lowest free ``base-N`` (N >= 2), as the loop it replaces did."""
+
+    used = {slug for slug in taken if in_family(base, slug)}
+    if base not in used:
+        return base
+    suffix = 2
+    while f"{base}-{suffix}" in used:
+        suffix += 1
+    return f"{base}-{suffix}"
+
+
+def _bases_of(slug: str) -> Set[str]:
+    match = _SUFFIX.match(slug)
+    return {slug, match.group("base")} if match else {slug}
+
+
+class SlugIndex:
+    """Bounded LRU of slug families (``base`` → slugs already taken).
+
+    A warm family lets ``generate_unique_slug`` answer without a query. Other
+    processes can still claim a slug first. The ``lessons.slug`` unique
+    constraint catches that, and the caller then calls ``invalidate`` and
+    reloads.
+    """
+
+    def __init__(self, max_bases: int = 1024) -> None:
+        self.max_bases = max(1, max_bases)
+        self._families: "OrderedDict[str, Set[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, base: str) -> Optional[Set[str]]:
+        with self._lock:
+            family = self._families.get(base)
+            if family is None:
+                return None
+            self._families.move_to_end(base)
+            return set(family)
+
+    def load(self, base: str, slugs: Iterable[str]) -> None:
+        with self._lock:
+            self._families[base] = {slug for slug in slugs if in_family(base, slug)}
+            self._families.move_to_end(base)
+            while len(self._families) > self.max_bases:
+                self._families.popitem(last=False)
+
+    def add(self, slug: str) -> None:
+        """Record a published slug in every cached family it belongs to."""
+
+        with self._lock:
+            for base in _bases_of(slug):
+                family = self._families.get(base)
+                if family is not None:
+                    family.add(slug)
+
+    def invalidate(self, slug: str) -> None:
+        """Drop every cached family ``slug`` belongs to so the next lookup re-queries."""
+
+        with self._lock:
+            for base in _bases_of(slug):
+                self._families.pop(base, None)
+
+    def __len__(self) -> int:
+        return len(self._families)
+
+
+__all__ = ["SlugIndex", "in_family", "next_free_slug"]
@@ -1,8 +1,11 @@
 """Chat state helpers."""
 from __future__ import annotations
 
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 
 _MEDIA_EXPECT_PREFIX = "EXPECT_MEDIA:"
@@ -32,4 +35,122 @@ def media_expectation(kind: str) -> str:
     return f"{_MEDIA_EXPECT_PREFIX}{kind.lower()}"
 
 
-__all__ = ["ChatState", "media_expectation"]
+_Snapshot = Tuple[Optional[str], Optional[str]]
+
+
+@dataclass
+class _CacheEntry:
+    snapshot: _Snapshot
+    expires_at: float
+    dirty: bool = False
+
+
+def _snapshot(state: ChatState) -> _Snapshot:
+    return (state.active_lesson, state.last_cmd)
+
+
+class ChatStateCache:
+    """Per-process LRU + TTL cache of :class:`ChatState` with dirty tracking.
+
+    ``get`` hands out copies so handlers can mutate freely; ``changed`` tells
+    the caller whether a mutated state differs from what is already stored.
+    Dirty entries (written behind) never expire or fall out of the LRU
+    without being returned by :meth:`drain_dirty` first.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl_seconds: float = 300.0) -> None:
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._evicted_dirty: Dict[str, _Snapshot] = {}
+        self._lock = threading.Lock()
+
+    def get(self, sender: str) -> Optional[ChatState]:
+        """Return a copy of the cached state, or ``None`` on a miss."""
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(sender)
+            if entry is not None and (entry.dirty or entry.expires_at > now):
+                self._entries.move_to_end(sender)
+                self.hits += 1
+                return ChatState(sender, *entry.snapshot)
+            if entry is not None:
+                del self._entries[sender]
+            pending = self._evicted_dirty.get(sender)
+            if pending is not None:
+                self.hits += 1
+                return ChatState(sender, *pending)
+            self.misses += 1
+            return None
+
+    def put(self, state: ChatState, dirty: bool = False) -> None:
+        """Remember ``state``; ``dirty`` marks it as not yet persisted."""
+
+        with self._lock:
+            self._evicted_dirty.pop(state.sender_phone, None)
+            self._entries[state.sender_phone] = _CacheEntry(
+                snapshot=_snapshot(state),
+                expires_at=time.monotonic() + self.ttl_seconds,
+                dirty=dirty,
+            )
+            self._entries.move_to_end(state.sender_phone)
+            while len(self._entries) > self.max_entries:
+                sender, evicted = self._entries.popitem(last=False)
+                if evicted.dirty:
+                    self._evicted_dirty[sender] = evicted.snapshot
+
+    def changed(self, state: ChatState) -> bool:
+        """Return ``True`` when ``state`` differs from the cached copy (or is unknown)."""
+
+        with self._lock:
+            entry = self._entries.get(state.sender_phone)
+            if entry is not None:
+                return entry.snapshot != _snapshot(state)
+            pending = self._evicted_dirty.get(state.sender_phone)
+            return pending is None or pending != _snapshot(state)
+
+    def drain_dirty(self) -> List[ChatState]:
+        """Return every unpersisted state and mark them clean."""
+
+        with self._lock:
+            drained = [ChatState(sender, *snapshot) for sender, snapshot in self._evicted_dirty.items()]
+            self._evicted_dirty.clear()
+            for sender, entry in self._entries.items():
+                if entry.dirty:
+                    entry.dirty = False
+                    drained.append(ChatState(sender, *entry.snapshot))
+            return drained
+
+    def mark_dirty(self, state: ChatState) -> None:
+        """Mark a drained ``state`` unpersisted again after its write failed.
+
+        A newer state cached for the sender since the drain wins; it is
+        either dirty itself or already written.
+        """
+
+        snapshot = _snapshot(state)
+        with self._lock:
+            entry = self._entries.get(state.sender_phone)
+            if entry is None:
+                self._evicted_dirty.setdefault(state.sender_phone, snapshot)
+            elif entry.snapshot == snapshot:
+                entry.dirty = True
+
+    def invalidate(self, sender: Optional[str] = None) -> None:
+        """Drop clean entries for ``sender`` (or every sender); dirty ones are kept."""
+
+        with self._lock:
+            senders = [sender] if sender is not None else list(self._entries)
+            for key in senders:
+                entry = self._entries.get(key)
+                if entry is not None and not entry.dirty:
+                    del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+__all__ = ["ChatState", "ChatStateCache", "media_expectation"]
@@ -0,0 +1,212 @@
+"""Per-message trace spans, a slow-message log and an offline OTLP JSON export."""
+from __future__ import annotations
+
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("bot_current_span", default=None)
+
+# OTLP span kinds and status codes (opentelemetry.proto.trace.v1).
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+
+class Span:
+    """One timed step of a message. Child spans share their root's trace."""
+
+    __slots__ = ("name", "kind", "trace", "span_id", "parent_id", "attributes", "start_ns", "_started", "duration", "error")
+
+    def __init__(
+        self, name: str, kind: int, trace: "Trace", parent_id: Optional[str], attributes: Dict[str, Any]
+    ) -> None:
+        self.name = name
+        self.kind = kind
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self._started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._started
+
+    @property
+    def duration_ms(self) -> float:
+        return round((self.duration or 0.0) * 1000, 2)
+
+    def offset_ms(self) -> float:
+        return round((self._started - self.trace.root._started) * 1000, 2)
+
+
+class Trace:
+    """The spans recorded while handling one inbound message."""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]) -> None:
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List[Span] = []
+        self.root = self.start(name, KIND_SERVER, None, attributes)
+
+    def start(self, name: str, kind: int, parent: Optional[Span], attributes: Dict[str, Any]) -> Span:
+        span = Span(name, kind, self, parent.span_id if parent else None, attributes)
+        self.spans.append(span)
+        return span
+
+    def breakdown(self) -> List[Dict[str, Any]]:
+        """Child spans in start order, as logged by the slow-message record."""
+
+        return [
+            {
+                "name": span.name,
+                "offset_ms": span.offset_ms(),
+                "duration_ms": span.duration_ms if span.duration is not None else None,
+                **({"error": span.error} if span.error else {}),
+            }
+            for span in self.spans[1:]
+        ]
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Time a child of the current span; a no-op outside a traced message.
+
+    The span is stored in a context variable, so it follows ``await`` and
+    ``asyncio.to_thread`` into the integration call it wraps.
+    """
+
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = parent.trace.start(name, kind, parent, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.error = str(exc) or type(exc).__name__
+        raise
+    finally:
+        child.finish()
+        _current_span.reset(token)
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+class Tracer:
+    """Start a trace per message and report it when the message finishes.
+
+    A message slower than ``slow_ms`` produces one ``Slow message`` warning
+    with its span breakdown (``0`` disables the log). With ``export_path``
+    set, every trace is appended to that file as one OTLP/JSON
+    ``ExportTraceServiceRequest`` per line, the layout the OpenTelemetry
+    Collector's file exporter writes and its ``otlpjsonfile`` receiver reads.
+    """
+
+    def __init__(self, slow_ms: float = 5000.0, export_path: Optional[str] = None, service_name: str = "ilo-bot") -> None:
+        self.slow_ms = slow_ms
+        self.export_path = export_path
+        self.service_name = service_name
+        self._export_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.slow_ms > 0 or bool(self.export_path)
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any) -> Iterator[Optional[Trace]]:
+        if not self.enabled:
+            yield None
+            return
+        trace = Trace(name, attributes)
+        token = _current_span.set(trace.root)
+        try:
+            yield trace
+        except BaseException as exc:
+            trace.root.error = str(exc) or type(exc).__name__
+            raise
+        finally:
+            trace.root.finish()
+            _current_span.reset(token)
+            self.finish(trace)
+
+    def finish(self, trace: Trace) -> None:
+        root = trace.root
+        if self.slow_ms > 0 and root.duration_ms >= self.slow_ms:
+            logger.warning(
+                "Slow message",
+                extra={
+                    "trace_id": trace.trace_id,
+                    "span": root.name,
+                    **{key: value for key, value in root.attributes.items() if value is not None},
+                    "duration_ms": root.duration_ms,
+                    "spans": trace.breakdown(),
+                },
+            )
+        if self.export_path:
+            try:
+                self.export(trace)
+            except OSError as exc:
+                logger.warning("Failed to export trace", extra={"path": self.export_path, "error": str(exc)})
+
+    def export(self, trace: Trace) -> None:
+        line = json.dumps(self.to_otlp(trace), separators=(",", ":"))
+        with self._export_lock, open(self.export_path, "a", encoding="utf-8") as handle:
+            handle.write(line + "\n")
+
+    def to_otlp(self, trace: Trace) -> Dict[str, Any]:
+        spans = []
+        for span in trace.spans:
+            end_ns = span.start_ns + int((span.duration or 0.0) * 1e9)
+            entry: Dict[str, Any] = {
+                "traceId": trace.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": span.kind,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(end_ns),
+                "attributes": _otlp_attributes(span.attributes),
+                "status": {"code": _STATUS_ERROR, "message": span.error} if span.error else {"code": _STATUS_OK},
+            }
+            if span.parent_id:
+                entry["parentSpanId"] = span.parent_id
+            spans.append(entry)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                    "scopeSpans": [{"scope": {"name": "bot"}, "spans": spans}],
+                }
+            ]
+        }
+
+
+__all__ = ["KIND_CLIENT", "KIND_INTERNAL", "KIND_SERVER", "Span", "Trace", "Tracer", "current_span", "span"]
@@ -0,0 +1,63 @@
+"""Unit of work for the Supabase writes produced by one inbound message."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional
+
+from bot.core.aio import call_io
+from bot.core.state import ChatState
+
+
+@dataclass
+class MessageWrites:
+    """Rows staged for one ``apply_message_writes`` call."""
+
+    body_appends: List[Dict[str, Any]] = field(default_factory=list)
+    quizzes: List[Dict[str, Any]] = field(default_factory=list)
+    media: List[Dict[str, Any]] = field(default_factory=list)
+    chat_state: Optional[ChatState] = None
+
+    def __len__(self) -> int:
+        return len(self.body_appends) + len(self.quizzes) + len(self.media) + (self.chat_state is not None)
+
+
+class UnitOfWork:
+    """Collect a message's writes and flush them together.
+
+    ``commit`` hands everything staged so far to the service's
+    ``apply_message_writes``, which applies it in one request and one
+    transaction, and returns a single success flag for the whole batch.
+    """
+
+    def __init__(self, supabase: Any) -> None:
+        self.supabase = supabase
+        self.writes = MessageWrites()
+
+    def append_body(self, lesson_id: str, markdown: str) -> None:
+        self.writes.body_appends.append({"lesson_id": lesson_id, "markdown": markdown})
+
+    def add_quiz(self, lesson_id: str, prompt: str, options: List[str], answer_idx: int) -> None:
+        self.writes.quizzes.append(
+            {"lesson_id": lesson_id, "prompt": prompt, "options": options, "answer_idx": answer_idx}
+        )
+
+    def add_media_entry(self, lesson_id: str, kind: str, url: str, caption: Optional[str]) -> None:
+        self.writes.media.append({"lesson_id": lesson_id, "kind": kind, "url": url, "caption": caption})
+
+    def upsert_chat_state(self, state: ChatState) -> None:
+        self.writes.chat_state = replace(state)
+
+    @property
+    def pending(self) -> int:
+        return len(self.writes)
+
+    async def commit(self) -> bool:
+        """Apply the staged writes; return ``True`` if all of them landed."""
+
+        if not self.writes:
+            return True
+        writes, self.writes = self.writes, MessageWrites()
+        return bool(await call_io(self.supabase.apply_message_writes, writes))
+
+
+__all__ = ["MessageWrites", "UnitOfWork"]
@@ -0,0 +1,80 @@
+"""Optional background warm-up of lazily built clients, reported by ``/readyz``."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from bot.core.aio import call_io
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """Track and optionally pre-open the app's outbound dependencies.
+
+    Clients are built lazily on first use. When warm-up is enabled,
+    :meth:`run` calls each dependency's ``warm()`` concurrently in the
+    background, so the first teacher message finds open keep-alive
+    connections. Each dependency then reports a ``warmup`` state of
+    ``skipped``, ``pending``, ``ok`` or ``failed``. A failed dependency is
+    retried with exponential backoff (up to ``max_attempts`` tries, or until
+    it succeeds), so a cold-start blip does not keep ``/readyz`` at 503.
+    """
+
+    def __init__(
+        self,
+        dependencies: Dict[str, Any],
+        enabled: bool = False,
+        retry_delay: float = 1.0,
+        max_retry_delay: float = 30.0,
+        max_attempts: Optional[int] = None,
+    ) -> None:
+        self.dependencies = dependencies
+        self.enabled = enabled
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_attempts = max_attempts
+        initial = "pending" if enabled else "skipped"
+        self._states: Dict[str, str] = {name: initial for name in dependencies}
+        self._elapsed: Dict[str, Optional[float]] = {name: None for name in dependencies}
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self._warm(name, dependency) for name, dependency in self.dependencies.items()))
+
+    async def _warm(self, name: str, dependency: Any) -> None:
+        delay = self.retry_delay
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            try:
+                ok = bool(await call_io(dependency.warm))
+            except Exception as exc:
+                logger.warning("Warm-up failed", extra={"dependency": name, "attempt": attempt, "error": str(exc)})
+                ok = False
+            self._elapsed[name] = time.perf_counter() - started
+            self._states[name] = "ok" if ok else "failed"
+            if ok or (self.max_attempts is not None and attempt >= self.max_attempts):
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+    @property
+    def ready(self) -> bool:
+        return all(state in ("skipped", "ok") for state in self._states.values())
+
+    def report(self) -> Dict[str, Any]:
+        dependencies = {}
+        for name, dependency in self.dependencies.items():
+            elapsed = self._elapsed[name]
+            dependencies[name] = {
+                "client": "open" if getattr(dependency, "opened", False) else "lazy",
+                "warmup": self._states[name],
+                "warmup_ms": None if elapsed is None else round(elapsed * 1000, 1),
+            }
+        return {"ready": self.ready, "dependencies": dependencies}
+
+
+__all__ = ["Warmup"]
@@ -19,6 +19,33 @@ create table if not exists lessons (
 create index if not exists lessons_slug_idx on lessons (slug);
 create index if not exists lessons_status_idx on lessons (status);
 
+-- Bumped on every body append; lets callers detect concurrent edits.
+alter table lessons add column if not exists body_version integer not null default 0;
+
+-- Append a sanitised chunk to body_md in place so ADD BODY sends only the new
+-- text. The UPDATE takes a row lock, so concurrent appends serialise instead of
+-- overwriting each other. Pass p_expected_version to make the append
+-- conditional. Returns one row with the new version, or no rows when the
+-- lesson does not exist or the version has moved on.
+create or replace function append_lesson_body(
+    p_lesson_id uuid,
+    p_chunk text,
+    p_expected_version integer default null
+) returns table (new_version integer)
+language sql
+as $$
+    update lessons
+       set body_md = case
+               when coalesce(btrim(body_md, E' \t\r\n'), '') = '' then p_chunk
+               else btrim(body_md, E' \t\r\n') || E'\n\n' || p_chunk
+           end,
+           body_version = body_version + 1,
+           updated_at = now()
+     where id = p_lesson_id
+       and (p_expected_version is null or body_version = p_expected_version)
+    returning body_version;
+$$;
+
 create table if not exists lesson_media (
     id uuid primary key default gen_random_uuid(),
     lesson_id uuid references lessons(id) on delete cascade,
@@ -56,6 +83,123 @@ create table if not exists chat_state (
     updated_at timestamptz default now()
 );
 
+-- Apply every write produced by one inbound message in a single transaction:
+-- body appends (through append_lesson_body), quiz and media inserts, and the
+-- chat state upsert. Returns the number of rows written; any failure rolls
+-- the whole batch back.
+create or replace function apply_message_writes(
+    p_body_appends jsonb default '[]'::jsonb,
+    p_quizzes jsonb default '[]'::jsonb,
+    p_media jsonb default '[]'::jsonb,
+    p_chat_state jsonb default null
+) returns table (applied integer)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+    v_applied integer := 0;
+    v_count integer;
+    v_append record;
+begin
+    for v_append in
+        select a.lesson_id, a.chunk from jsonb_to_recordset(p_body_appends) as a(lesson_id uuid, chunk text)
+    loop
+        if not exists (select 1 from append_lesson_body(v_append.lesson_id, v_append.chunk)) then
+            raise exception 'lesson % not found', v_append.lesson_id using errcode = 'P0002';
+        end if;
+        v_applied := v_applied + 1;
+    end loop;
+
+    insert into quizzes (lesson_id, prompt, options, answer_idx)
+    select q.lesson_id, q.prompt, q.options, q.answer_idx
+      from jsonb_to_recordset(p_quizzes) as q(lesson_id uuid, prompt text, options jsonb, answer_idx integer);
+    get diagnostics v_count = row_count;
+    v_applied := v_applied + v_count;
+
+    insert into lesson_media (lesson_id, kind, url, caption)
+    select m.lesson_id, m.kind, m.url, m.caption
+      from jsonb_to_recordset(p_media) as m(lesson_id uuid, kind text, url text, caption text);
+    get diagnostics v_count = row_count;
+    v_applied := v_applied + v_count;
+
+    if p_chat_state is not null then
+        insert into chat_state (sender_phone, active_lesson, last_cmd, updated_at)
+        values (
+            p_chat_state->>'sender_phone',
+            (p_chat_state->>'active_lesson')::uuid,
+            p_chat_state->>'last_cmd',
+            now()
+        )
+        on conflict (sender_phone) do update
+            set active_lesson = excluded.active_lesson,
+                last_cmd = excluded.last_cmd,
+                updated_at = excluded.updated_at;
+        v_applied := v_applied + 1;
+    end if;
+
+    return query select v_applied;
+end;
+$$;
+
+-- Publish a lesson in one transaction. The function assigns a slug (keeping an
+-- existing one, otherwise the lowest free base / base-N, the same rule as the
+-- bot's _slugify), flips the status, records the publish and clears the
+-- sender's chat state. An advisory lock on the slug base serialises concurrent
+-- publishes of the same title. Returns one row, or no rows when the lesson
+-- does not exist; ``publish_id`` lets the caller record the revalidation
+-- result on the publishes row afterwards.
+drop function if exists publish_lesson_atomic(uuid, text, text, jsonb);
+create function publish_lesson_atomic(
+    p_lesson_id uuid,
+    p_sender text,
+    p_channel text default 'whatsapp',
+    p_result jsonb default '{}'::jsonb
+) returns table (slug text, title text, publish_id uuid)
+language plpgsql
+as $$
+#variable_conflict use_column
+declare
+    v_title text;
+    v_slug text;
+    v_publish_id uuid;
+    v_base text;
+    v_suffix integer := 2;
+begin
+    select l.title, l.slug into v_title, v_slug
+      from lessons l
+     where l.id = p_lesson_id
+       for update;
+    if not found then
+        return;
+    end if;
+
+    if v_slug is null then
+        v_base := coalesce(nullif(btrim(regexp_replace(lower(v_title), '[^a-z0-9]+', '-', 'g'), '-'), ''), 'lesson');
+        perform pg_advisory_xact_lock(hashtext('lesson-slug:' || v_base));
+        v_slug := v_base;
+        while exists (select 1 from lessons l where l.slug = v_slug) loop
+            v_slug := v_base || '-' || v_suffix;
+            v_suffix := v_suffix + 1;
+        end loop;
+    end if;
+
+    update lessons
+       set status = 'published', slug = v_slug, updated_at = now()
+     where id = p_lesson_id;
+
+    insert into publishes (lesson_id, channel, result)
+    values (p_lesson_id, p_channel, p_result || jsonb_build_object('path', '/lessons/' || v_slug))
+    returning id into v_publish_id;
+
+    insert into chat_state (sender_phone, active_lesson, last_cmd, updated_at)
+    values (p_sender, null, 'publish', now())
+    on conflict (sender_phone) do update
+        set active_lesson = null, last_cmd = 'publish', updated_at = now();
+
+    return query select v_slug, v_title, v_publish_id;
+end;
+$$;
+
 -- Upsert helpers -------------------------------------------------------------
 -- Example: persist chat state from the bot (idempotent update)
 -- insert into chat_state (sender_phone, active_lesson, last_cmd, updated_at)
@@ -1,7 +1,12 @@
 """Integration with the Next.js revalidation endpoint."""
 from __future__ import annotations
 
+import asyncio
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
 from typing import Any, Dict, List, Optional
 
 import httpx
@@ -12,35 +17,180 @@ logger = logging.getLogger(__name__)
 
 
 class NextRevalidator:
-    """Client for triggering ISR revalidation in Next.js."""
+    """Client for triggering ISR revalidation in Next.js.
+
+    Paths are posted concurrently from a small thread pool, at most
+    ``BOT_REVALIDATE_CONCURRENCY`` at a time, each bounded by
+    ``BOT_REVALIDATE_TIMEOUT_SEC`` overall. httpx timeouts only bound each
+    phase, so the body is streamed against a deadline and the caller stops
+    waiting once a path's share of the deadline has passed.
+    """
+
+    metrics_name = "revalidate"
 
     def __init__(self, settings: Settings, client: Optional[httpx.Client] = None) -> None:
         self.settings = settings
-        self._client = client or httpx.Client(timeout=10.0)
+        self.concurrency = max(1, settings.bot_revalidate_concurrency)
+        self.timeout = settings.bot_revalidate_timeout_sec
+        self._http = client
+        self._http_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def _client(self) -> httpx.Client:
+        # Built on first use so importing the app does not pay for TLS setup.
+        if self._http is None:
+            with self._http_lock:
+                if self._http is None:
+                    self._http = httpx.Client(timeout=self.timeout)
+        return self._http
+
+    @property
+    def opened(self) -> bool:
+        return self._http is not None
+
+    def warm(self) -> bool:
+        """Open a keep-alive connection to the Next.js host without revalidating anything."""
+
+        try:
+            self._client.head(str(self.settings.next_revalidate_url), timeout=self.timeout)
+        except httpx.HTTPError as exc:
+            logger.warning("Revalidation warm-up failed", extra={"error": str(exc)})
+            return False
+        return True
 
     def trigger(self, paths: List[str]) -> List[Dict[str, Any]]:
-        """Trigger revalidation for each path and return response summaries."""
+        """Trigger revalidation for each distinct path and return response summaries in order."""
 
-        results: List[Dict[str, Any]] = []
-        base_url = httpx.URL(str(self.settings.next_revalidate_url))
-        for path in paths:
-            url = base_url.copy_add_param("secret", self.settings.next_revalidate_secret)
-            url = url.copy_add_param("path", path)
+        unique = _unique_paths(paths)
+        if not unique:
+            return []
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="revalidate")
+        submitted = time.monotonic()
+        futures = [self._executor.submit(self._post, path) for path in unique]
+        results = []
+        for index, (path, future) in enumerate(zip(unique, futures)):
+            # A path queued behind ``index // concurrency`` full rounds of
+            # slow paths starts at most that many deadlines late.
+            deadline = submitted + self.timeout * (index // self.concurrency + 1)
             try:
-                response = self._client.post(url)
-                body = safe_json(response)
-                results.append({
-                    "path": path,
-                    "status": response.status_code,
-                    "body": body,
-                })
-            except httpx.HTTPError as exc:  # pragma: no cover - network errors
-                logger.warning("Revalidation request failed", extra={"path": path, "error": str(exc)})
-                results.append({"path": path, "status": 500, "body": {"error": str(exc)}})
+                results.append(future.result(timeout=max(0.0, deadline - time.monotonic())))
+            except FutureTimeout as exc:
+                future.cancel()
+                results.append(_deadline_exceeded(path, exc))
         return results
 
+    def _post(self, path: str) -> Dict[str, Any]:
+        deadline = time.monotonic() + self.timeout
+        try:
+            with self._client.stream("POST", revalidate_url(self.settings, path), timeout=self.timeout) as response:
+                chunks = []
+                for chunk in response.iter_bytes():
+                    if time.monotonic() > deadline:
+                        raise httpx.ReadTimeout("Revalidation deadline exceeded", request=response.request)
+                    chunks.append(chunk)
+        except httpx.TimeoutException as exc:
+            return _deadline_exceeded(path, exc)
+        except httpx.HTTPError as exc:  # pragma: no cover - network errors
+            return _failure(path, exc)
+        content_type = {"content-type": response.headers.get("content-type", "")}
+        return _summarise(path, httpx.Response(response.status_code, headers=content_type, content=b"".join(chunks)))
+
     def close(self) -> None:
-        self._client.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._http is not None:
+            self._http.close()
+
+
+class AsyncNextRevalidator:
+    """Non-blocking counterpart of :class:`NextRevalidator`."""
+
+    metrics_name = "revalidate"
+
+    def __init__(self, settings: Settings, client: Optional[httpx.AsyncClient] = None) -> None:
+        self.settings = settings
+        self.concurrency = max(1, settings.bot_revalidate_concurrency)
+        self.timeout = settings.bot_revalidate_timeout_sec
+        self._http = client
+
+    @property
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=self.timeout)
+        return self._http
+
+    @property
+    def opened(self) -> bool:
+        return self._http is not None
+
+    async def warm(self) -> bool:
+        """Open a keep-alive connection to the Next.js host without revalidating anything."""
+
+        try:
+            await self._client.head(str(self.settings.next_revalidate_url), timeout=self.timeout)
+        except httpx.HTTPError as exc:
+            logger.warning("Revalidation warm-up failed", extra={"error": str(exc)})
+            return False
+        return True
+
+    async def trigger(self, paths: List[str]) -> List[Dict[str, Any]]:
+        """Trigger revalidation for each distinct path and return response summaries in order."""
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def _bounded(path: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._post(path)
+
+        return list(await asyncio.gather(*(_bounded(path) for path in _unique_paths(paths))))
+
+    async def _post(self, path: str) -> Dict[str, Any]:
+        # ``wait_for`` caps the whole exchange; httpx timeouts only bound each phase.
+        try:
+            response = await asyncio.wait_for(
+                self._client.post(revalidate_url(self.settings, path), timeout=self.timeout),
+                timeout=self.timeout,
+            )
+        except (asyncio.TimeoutError, httpx.TimeoutException) as exc:
+            return _deadline_exceeded(path, exc)
+        except httpx.HTTPError as exc:  # pragma: no cover - network errors
+            return _failure(path, exc)
+        return _summarise(path, response)
+
+    async def close(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+
+
+def _unique_paths(paths: List[str]) -> List[str]:
+    return list(dict.fromkeys(paths))
+
+
+def revalidate_url(settings: Settings, path: str) -> httpx.URL:
+    url = httpx.URL(str(settings.next_revalidate_url))
+    url = url.copy_add_param("secret", settings.next_revalidate_secret)
+    return url.copy_add_param("path", path)
+
+
+def _summarise(path: str, response: httpx.Response) -> Dict[str, Any]:
+    return {
+        "path": path,
+        "status": response.status_code,
+        "body": safe_json(response),
+    }
+
+
+def _failure(path: str, exc: Exception) -> Dict[str, Any]:
+    logger.warning("Revalidation request failed", extra={"path": path, "error": str(exc)})
+    return {"path": path, "status": 500, "body": {"error": str(exc)}}
+
+
+def _deadline_exceeded(path: str, exc: Exception) -> Dict[str, Any]:
+    logger.warning("Revalidation request timed out", extra={"path": path, "error": str(exc) or type(exc).__name__})
+    return {"path": path, "status": 504, "body": {"error": "Revalidation deadline exceeded"}}
 
 
 def safe_json(response: httpx.Response) -> Any:
@@ -50,4 +200,4 @@ def safe_json(response: httpx.Response) -> Any:
         return response.text
 
 
-__all__ = ["NextRevalidator"]
+__all__ = ["AsyncNextRevalidator", "NextRevalidator"]
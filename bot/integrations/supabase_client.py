@@ -1,20 +1,32 @@
 """Supabase data access layer."""
 from __future__ import annotations
 
-import io
+import abc
+import asyncio
 import logging
 import re
+import threading
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
-
-from supabase import Client, create_client
+from typing import IO, TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Generator, Iterator, List, Optional
 
+from bot.core.slugs import SlugIndex, next_free_slug
 from bot.core.state import ChatState
+from bot.core.tracing import span
+from bot.core.uow import MessageWrites
 from bot.settings import Settings
 
+if TYPE_CHECKING:  # the supabase package is imported on first use to keep cold starts fast
+    from supabase import AClient, Client
+
 logger = logging.getLogger(__name__)
 
 
+def _project_url(settings: Settings) -> str:
+    # ``HttpUrl`` renders a bare host with a trailing slash, which would double
+    # up with the ``/rest/v1`` and ``/storage/v1`` suffixes added by supabase-py.
+    return str(settings.supabase_url).rstrip("/")
+
+
 def _utcnow() -> str:
     return datetime.now(timezone.utc).isoformat()
 
@@ -31,89 +43,237 @@ def _slugify(text: str) -> str:
     return slug or "lesson"
 
 
-class SupabaseService:
-    """Wrapper around Supabase client with domain-specific helpers."""
+def _chat_state_from_rows(sender: str, data: Optional[List[Dict[str, Any]]]) -> ChatState:
+    if not data:
+        return ChatState(sender_phone=sender)
+    row = data[0]
+    return ChatState(
+        sender_phone=row.get("sender_phone", sender),
+        active_lesson=row.get("active_lesson"),
+        last_cmd=row.get("last_cmd"),
+    )
+
+
+def _chat_state_payload(state: ChatState) -> Dict[str, Any]:
+    return {
+        "sender_phone": state.sender_phone,
+        "active_lesson": state.active_lesson,
+        "last_cmd": state.last_cmd,
+        "updated_at": _utcnow(),
+    }
+
+
+def _new_lesson_payload(title: str, level: str, topic: str, author_phone: str) -> Dict[str, Any]:
+    return {
+        "title": title,
+        "level": level,
+        "topic": topic,
+        "author_phone": author_phone,
+        "status": "draft",
+        "body_md": "",
+    }
+
+
+_BODY_WRITE_ATTEMPTS = 3
+_PUBLISH_SLUG_ATTEMPTS = 3
+
+
+def _combined_body(lesson: Dict[str, Any], markdown: str) -> str:
+    existing = (lesson.get("body_md") or "").strip()
+    cleaned = _sanitize_markdown(markdown)
+    return f"{existing}\n\n{cleaned}".strip() if existing else cleaned
+
+
+_UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def _upload_headers(mime_type: Optional[str], size: int) -> Dict[str, str]:
+    return {
+        "Content-Type": mime_type or "application/octet-stream",
+        "Content-Length": str(size),
+        "x-upsert": "true",
+    }
+
+
+def _iter_file(file: IO[bytes]) -> Iterator[bytes]:
+    while chunk := file.read(_UPLOAD_CHUNK_SIZE):
+        yield chunk
+
+
+async def _aiter_file(file: IO[bytes]) -> AsyncIterator[bytes]:
+    while chunk := file.read(_UPLOAD_CHUNK_SIZE):
+        yield chunk
+
+
+def _slug_family_filter(base: str) -> str:
+    # One PostgREST ``or`` filter covering ``base`` and every ``base-N``.
+    return f"slug.eq.{base},slug.like.{base}-*"
+
+
+def _is_unique_violation(exc: Exception) -> bool:
+    return getattr(exc, "code", None) == "23505"
+
+
+def _is_missing_function(exc: Exception) -> bool:
+    # PGRST202: PostgREST cannot find the RPC; 42883: Postgres undefined_function.
+    return getattr(exc, "code", None) in {"PGRST202", "42883"}
+
+
+def _message_writes_params(writes: MessageWrites) -> Dict[str, Any]:
+    appends = []
+    for append in writes.body_appends:
+        chunk = _sanitize_markdown(append["markdown"])
+        if chunk:
+            appends.append({"lesson_id": append["lesson_id"], "chunk": chunk})
+    return {
+        "p_body_appends": appends,
+        "p_quizzes": writes.quizzes,
+        "p_media": writes.media,
+        "p_chat_state": _chat_state_payload(writes.chat_state) if writes.chat_state is not None else None,
+    }
+
+
+def _public_url(public_url: Any) -> Optional[str]:
+    if isinstance(public_url, dict):
+        data = public_url.get("data") or {}
+        return data.get("publicUrl")
+    return str(public_url)
+
+
+_Request = Callable[[Any], Any]
+_Operation = Generator[_Request, Any, Any]
+
+
+class _SupabaseOperations(abc.ABC):
+    """Request building and response parsing shared by both Supabase services.
+
+    Each operation is a generator. It yields a request, which is a function
+    that takes the client and makes one SDK call. It is then sent that call's
+    result, or has the call's exception thrown into it, and finally returns
+    the method's result. :class:`SupabaseService` and
+    :class:`AsyncSupabaseService` only provide the transport: how the client
+    is obtained and how a request is run (``_run``).
+    """
+
+    metrics_name = "supabase"
 
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
-        self.client: Client = create_client(settings.supabase_url, settings.supabase_service_role_key)
+        self.slugs = SlugIndex()
+        self._append_rpc_available = True
+        self._publish_rpc_available = True
+        self._writes_rpc_available = True
+
+    @abc.abstractmethod
+    def _run(self, operation: _Operation) -> Any:
+        """Drive ``operation`` to completion and return its result (awaitable on the async service)."""
+
+    @abc.abstractmethod
+    def _file_chunks(self, file: IO[bytes]) -> Any:
+        """Return the chunk iterator the transport's HTTP client streams an upload from."""
+
+    def _warm(self) -> _Operation:
+        try:
+            yield lambda client: client.postgrest.session.head("/")
+        except Exception as exc:
+            logger.warning("Supabase warm-up failed", extra={"error": str(exc)})
+            return False
+        return True
 
     # ------------------------------------------------------------------
     # Chat state management
     # ------------------------------------------------------------------
-    def get_chat_state(self, sender: str) -> ChatState:
+    def _get_chat_state(self, sender: str) -> _Operation:
         try:
-            response = self.client.table("chat_state").select("sender_phone, active_lesson, last_cmd").eq("sender_phone", sender).execute()
+            response = yield lambda client: (
+                client.table("chat_state").select("sender_phone, active_lesson, last_cmd").eq("sender_phone", sender).execute()
+            )
         except Exception as exc:  # pragma: no cover - network errors
             logger.exception("Failed to fetch chat state", extra={"sender": sender, "error": str(exc)})
             return ChatState(sender_phone=sender)
-        data = response.data or []
-        if not data:
-            return ChatState(sender_phone=sender)
-        row = data[0]
-        return ChatState(
-            sender_phone=row.get("sender_phone", sender),
-            active_lesson=row.get("active_lesson"),
-            last_cmd=row.get("last_cmd"),
-        )
-
-    def upsert_chat_state(self, state: ChatState) -> None:
-        payload = {
-            "sender_phone": state.sender_phone,
-            "active_lesson": state.active_lesson,
-            "last_cmd": state.last_cmd,
-            "updated_at": _utcnow(),
-        }
+        return _chat_state_from_rows(sender, response.data)
+
+    def _upsert_chat_state(self, state: ChatState) -> _Operation:
+        payload = _chat_state_payload(state)
         try:
-            self.client.table("chat_state").upsert(payload).execute()
+            yield lambda client: client.table("chat_state").upsert(payload).execute()
+            return True
         except Exception as exc:  # pragma: no cover - network errors
             logger.exception("Failed to upsert chat state", extra={"sender": state.sender_phone, "error": str(exc)})
+            return False
 
     # ------------------------------------------------------------------
     # Lessons
     # ------------------------------------------------------------------
-    def create_lesson(self, title: str, level: str, topic: str, author_phone: str) -> Optional[Dict[str, Any]]:
-        payload = {
-            "title": title,
-            "level": level,
-            "topic": topic,
-            "author_phone": author_phone,
-            "status": "draft",
-            "body_md": "",
-        }
+    def _create_lesson(self, title: str, level: str, topic: str, author_phone: str) -> _Operation:
+        payload = _new_lesson_payload(title, level, topic, author_phone)
         try:
-            response = self.client.table("lessons").insert(payload).select("id, title, level, topic, status").execute()
+            response = yield lambda client: client.table("lessons").insert(payload).execute()
         except Exception as exc:  # pragma: no cover - network errors
             logger.exception("Failed to create lesson", extra={"payload": payload, "error": str(exc)})
             return None
         data = response.data or []
         return data[0] if data else None
 
-    def get_lesson(self, lesson_id: str) -> Optional[Dict[str, Any]]:
+    def _get_lesson(self, lesson_id: str) -> _Operation:
         try:
-            response = self.client.table("lessons").select("id, title, body_md, status, slug").eq("id", lesson_id).execute()
+            response = yield lambda client: (
+                client.table("lessons").select("id, title, body_md, status, slug").eq("id", lesson_id).execute()
+            )
         except Exception as exc:  # pragma: no cover - network errors
             logger.exception("Failed to fetch lesson", extra={"lesson_id": lesson_id, "error": str(exc)})
             return None
         data = response.data or []
         return data[0] if data else None
 
-    def update_lesson_body(self, lesson_id: str, markdown: str) -> bool:
-        lesson = self.get_lesson(lesson_id)
-        if lesson is None:
-            return False
-        existing = (lesson.get("body_md") or "").strip()
-        cleaned = _sanitize_markdown(markdown)
-        combined = f"{existing}\n\n{cleaned}".strip() if existing else cleaned
-        payload = {"body_md": combined, "updated_at": _utcnow()}
-        try:
-            self.client.table("lessons").update(payload).eq("id", lesson_id).execute()
-            return True
-        except Exception as exc:  # pragma: no cover - network errors
-            logger.exception("Failed to update lesson body", extra={"lesson_id": lesson_id, "error": str(exc)})
-            return False
+    def _update_lesson_body(self, lesson_id: str, markdown: str) -> _Operation:
+        if self._append_rpc_available:
+            chunk = _sanitize_markdown(markdown)
+            if not chunk:
+                return True
+            try:
+                return (yield from self._append_lesson_body(lesson_id, chunk)) is not None
+            except Exception as exc:
+                if not _is_missing_function(exc):
+                    logger.exception("Failed to append lesson body", extra={"lesson_id": lesson_id, "error": str(exc)})
+                    return False
+                logger.warning("append_lesson_body RPC missing; falling back to compare-and-swap updates")
+                self._append_rpc_available = False
+        return (yield from self._update_lesson_body_cas(lesson_id, markdown))
 
-    def add_quiz(self, lesson_id: str, prompt: str, options: List[str], answer_idx: int) -> bool:
+    def _append_lesson_body(self, lesson_id: str, chunk: str, expected_version: Optional[int] = None) -> _Operation:
+        params = {"p_lesson_id": lesson_id, "p_chunk": chunk, "p_expected_version": expected_version}
+        response = yield lambda client: client.rpc("append_lesson_body", params).execute()
+        rows = response.data or []
+        return rows[0]["new_version"] if rows else None
+
+    def _update_lesson_body_cas(self, lesson_id: str, markdown: str) -> _Operation:
+        # Schemas without the RPC: read-modify-write guarded by ``updated_at``.
+        for _ in range(_BODY_WRITE_ATTEMPTS):
+            try:
+                response = yield lambda client: (
+                    client.table("lessons").select("body_md, updated_at").eq("id", lesson_id).execute()
+                )
+                if not response.data:
+                    return False
+                lesson = response.data[0]
+                payload = {"body_md": _combined_body(lesson, markdown), "updated_at": _utcnow()}
+                written = yield lambda client: (
+                    client.table("lessons")
+                    .update(payload)
+                    .eq("id", lesson_id)
+                    .eq("updated_at", lesson["updated_at"])
+                    .execute()
+                )
+            except Exception as exc:  # pragma: no cover - network errors
+                logger.exception("Failed to update lesson body", extra={"lesson_id": lesson_id, "error": str(exc)})
+                return False
+            if written.data:
+                return True
+            logger.info("Lesson body changed concurrently; retrying", extra={"lesson_id": lesson_id})
+        return False
+
+    def _add_quiz(self, lesson_id: str, prompt: str, options: List[str], answer_idx: int) -> _Operation:
         payload = {
             "lesson_id": lesson_id,
             "prompt": prompt,
@@ -121,13 +281,13 @@ class SupabaseService:
             "answer_idx": answer_idx,
         }
         try:
-            self.client.table("quizzes").insert(payload).execute()
+            yield lambda client: client.table("quizzes").insert(payload).execute()
             return True
         except Exception as exc:  # pragma: no cover - network errors
             logger.exception("Failed to add quiz", extra={"lesson_id": lesson_id, "error": str(exc)})
             return False
 
-    def add_media_entry(self, lesson_id: str, kind: str, url: str, caption: Optional[str]) -> bool:
+    def _add_media_entry(self, lesson_id: str, kind: str, url: str, caption: Optional[str]) -> _Operation:
         payload = {
             "lesson_id": lesson_id,
             "kind": kind,
@@ -135,44 +295,139 @@ class SupabaseService:
             "caption": caption,
         }
         try:
-            self.client.table("lesson_media").insert(payload).execute()
+            yield lambda client: client.table("lesson_media").insert(payload).execute()
             return True
         except Exception as exc:  # pragma: no cover - network errors
             logger.exception("Failed to add media entry", extra={"lesson_id": lesson_id, "error": str(exc)})
             return False
 
-    def publish_lesson(self, lesson_id: str, slug: str) -> bool:
+    def _apply_message_writes(self, writes: MessageWrites) -> _Operation:
+        if self._writes_rpc_available:
+            params = _message_writes_params(writes)
+            try:
+                yield lambda client: client.rpc("apply_message_writes", params).execute()
+                return True
+            except Exception as exc:
+                if not _is_missing_function(exc):
+                    logger.exception("Failed to apply message writes", extra={"writes": len(writes), "error": str(exc)})
+                    return False
+                logger.warning("apply_message_writes RPC missing; falling back to one call per write")
+                self._writes_rpc_available = False
+        return (yield from self._apply_message_writes_steps(writes))
+
+    def _apply_message_writes_steps(self, writes: MessageWrites) -> _Operation:
+        for append in writes.body_appends:
+            if not (yield from self._update_lesson_body(append["lesson_id"], append["markdown"])):
+                return False
+        for quiz in writes.quizzes:
+            if not (yield from self._add_quiz(**quiz)):
+                return False
+        for media in writes.media:
+            if not (yield from self._add_media_entry(**media)):
+                return False
+        if writes.chat_state is not None:
+            yield from self._upsert_chat_state(writes.chat_state)
+        return True
+
+    def _publish_lesson(self, lesson_id: str, slug: str) -> _Operation:
         payload = {"status": "published", "slug": slug, "updated_at": _utcnow()}
         try:
-            self.client.table("lessons").update(payload).eq("id", lesson_id).execute()
-            return True
-        except Exception as exc:  # pragma: no cover - network errors
+            yield lambda client: client.table("lessons").update(payload).eq("id", lesson_id).execute()
+        except Exception as exc:
+            if _is_unique_violation(exc):
+                logger.info("Slug claimed concurrently", extra={"lesson_id": lesson_id, "slug": slug})
+                self.slugs.invalidate(slug)
+                return False
             logger.exception("Failed to publish lesson", extra={"lesson_id": lesson_id, "error": str(exc)})
             return False
+        self.slugs.add(slug)
+        return True
 
-    def record_publish(self, lesson_id: str, channel: str, result: Dict[str, Any]) -> None:
+    def _publish_lesson_atomic(self, lesson_id: str, sender: str, channel: str, result: Dict[str, Any]) -> _Operation:
+        if self._publish_rpc_available:
+            params = {"p_lesson_id": lesson_id, "p_sender": sender, "p_channel": channel, "p_result": result}
+            try:
+                response = yield lambda client: client.rpc("publish_lesson_atomic", params).execute()
+            except Exception as exc:
+                if not _is_missing_function(exc):
+                    logger.exception("Failed to publish lesson", extra={"lesson_id": lesson_id, "error": str(exc)})
+                    return None
+                logger.warning("publish_lesson_atomic RPC missing; falling back to sequential publish")
+                self._publish_rpc_available = False
+            else:
+                rows = response.data or []
+                if not rows:
+                    return None
+                self.slugs.add(rows[0]["slug"])
+                return rows[0]
+        return (yield from self._publish_lesson_steps(lesson_id, sender, channel, result))
+
+    def _publish_lesson_steps(self, lesson_id: str, sender: str, channel: str, result: Dict[str, Any]) -> _Operation:
+        lesson = yield from self._get_lesson(lesson_id)
+        if not lesson:
+            return None
+        slug = lesson.get("slug")
+        if slug:
+            with span("supabase.publish_lesson"):
+                published = yield from self._publish_lesson(lesson_id, slug)
+        else:
+            published = False
+            for attempt in range(1, _PUBLISH_SLUG_ATTEMPTS + 1):
+                with span("supabase.generate_unique_slug", attempt=attempt):
+                    slug = yield from self._generate_unique_slug(lesson.get("title", "lesson"))
+                with span("supabase.publish_lesson", attempt=attempt):
+                    published = yield from self._publish_lesson(lesson_id, slug)
+                if published:
+                    break
+        if not published:
+            return None
+        publish_id = yield from self._record_publish(lesson_id, channel, {**result, "path": f"/lessons/{slug}"})
+        yield from self._upsert_chat_state(ChatState(sender_phone=sender, active_lesson=None, last_cmd="publish"))
+        return {"slug": slug, "title": lesson.get("title"), "publish_id": publish_id}
+
+    def _record_publish(self, lesson_id: str, channel: str, result: Dict[str, Any]) -> _Operation:
         payload = {
             "lesson_id": lesson_id,
             "channel": channel,
             "result": result,
         }
         try:
-            self.client.table("publishes").insert(payload).execute()
+            response = yield lambda client: client.table("publishes").insert(payload).execute()
         except Exception as exc:  # pragma: no cover - network errors
             logger.exception("Failed to record publish", extra={"lesson_id": lesson_id, "error": str(exc)})
+            return None
+        data = response.data or []
+        return data[0].get("id") if data else None
 
-    def generate_unique_slug(self, title: str) -> str:
+    def _record_revalidation(self, publish_id: str, result: Dict[str, Any]) -> _Operation:
+        try:
+            yield lambda client: client.table("publishes").update({"result": result}).eq("id", publish_id).execute()
+            return True
+        except Exception as exc:  # pragma: no cover - network errors
+            logger.exception("Failed to record revalidation", extra={"publish_id": publish_id, "error": str(exc)})
+            return False
+
+    def _generate_unique_slug(self, title: str) -> _Operation:
         base = _slugify(title)
-        candidate = base
-        suffix = 2
-        while self.slug_exists(candidate):
-            candidate = f"{base}-{suffix}"
-            suffix += 1
-        return candidate
+        taken = self.slugs.get(base)
+        if taken is None:
+            taken = yield from self._slug_family(base)
+        return next_free_slug(base, taken)
 
-    def slug_exists(self, slug: str) -> bool:
+    def _slug_family(self, base: str) -> _Operation:
+        try:
+            response = yield lambda client: client.table("lessons").select("slug").or_(_slug_family_filter(base)).execute()
+        except Exception as exc:  # pragma: no cover - network errors
+            # The unique constraint still guards publish_lesson if this guess collides.
+            logger.exception("Failed to load slug family", extra={"slug": base, "error": str(exc)})
+            return []
+        slugs = [row["slug"] for row in response.data or [] if row.get("slug")]
+        self.slugs.load(base, slugs)
+        return slugs
+
+    def _slug_exists(self, slug: str) -> _Operation:
         try:
-            response = self.client.table("lessons").select("slug").eq("slug", slug).execute()
+            response = yield lambda client: client.table("lessons").select("slug").eq("slug", slug).execute()
         except Exception as exc:  # pragma: no cover - network errors
             logger.exception("Failed to check slug", extra={"slug": slug, "error": str(exc)})
             return True
@@ -181,26 +436,310 @@ class SupabaseService:
     # ------------------------------------------------------------------
     # Storage
     # ------------------------------------------------------------------
-    def upload_lesson_media(self, lesson_id: str, filename: str, blob: bytes, mime_type: Optional[str]) -> Optional[str]:
+    def _upload_lesson_media(self, lesson_id: str, filename: str, blob: bytes, mime_type: Optional[str]) -> _Operation:
         path = f"{lesson_id}/{filename}"
-        bucket = self.client.storage.from_(self.settings.bot_media_bucket)
-        buffer = io.BytesIO(blob)
-        buffer.seek(0)
+        bucket = self.settings.bot_media_bucket
         options = {"content-type": mime_type or "application/octet-stream", "upsert": "true"}
         try:
-            bucket.upload(path, buffer, options)
+            yield lambda client: client.storage.from_(bucket).upload(path, blob, options)
         except Exception as exc:  # pragma: no cover - network errors
             logger.exception("Failed to upload media", extra={"lesson_id": lesson_id, "path": path, "error": str(exc)})
             return None
+        return (yield from self._public_url(path))
+
+    def _upload_lesson_media_file(
+        self,
+        lesson_id: str,
+        filename: str,
+        file: IO[bytes],
+        size: int,
+        mime_type: Optional[str],
+    ) -> _Operation:
+        path = f"{lesson_id}/{filename}"
         try:
-            public_url = bucket.get_public_url(path)
+            response = yield lambda client: client.storage.session.post(
+                f"/object/{self.settings.bot_media_bucket}/{path}",
+                content=self._file_chunks(file),
+                headers=_upload_headers(mime_type, size),
+            )
+            response.raise_for_status()
+        except Exception as exc:  # pragma: no cover - network errors
+            logger.exception("Failed to upload media", extra={"lesson_id": lesson_id, "path": path, "error": str(exc)})
+            return None
+        return (yield from self._public_url(path))
+
+    def _public_url(self, path: str) -> _Operation:
+        bucket = self.settings.bot_media_bucket
+        try:
+            public_url = yield lambda client: client.storage.from_(bucket).get_public_url(path)
         except Exception as exc:  # pragma: no cover - network errors
             logger.exception("Failed to fetch public URL", extra={"path": path, "error": str(exc)})
             return None
-        if isinstance(public_url, dict):
-            data = public_url.get("data") or {}
-            return data.get("publicUrl")
-        return str(public_url)
+        return _public_url(public_url)
+
+
+class SupabaseService(_SupabaseOperations):
+    """Wrapper around Supabase client with domain-specific helpers."""
+
+    def __init__(self, settings: Settings, client: Optional[Client] = None) -> None:
+        super().__init__(settings)
+        self._client = client
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self) -> Client:
+        """The Supabase client, created (and the SDK imported) on first use."""
+
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from supabase import create_client
+
+                    self._client = create_client(_project_url(self.settings), self.settings.supabase_service_role_key)
+        return self._client
+
+    @property
+    def opened(self) -> bool:
+        return self._client is not None
+
+    def _run(self, operation: _Operation) -> Any:
+        try:
+            request = next(operation)
+            while True:
+                try:
+                    response = request(self.client)
+                except Exception as exc:
+                    request = operation.throw(exc)
+                else:
+                    request = operation.send(response)
+        except StopIteration as stop:
+            return stop.value
+
+    def _file_chunks(self, file: IO[bytes]) -> Iterator[bytes]:
+        return _iter_file(file)
+
+    def warm(self) -> bool:
+        """Build the client and open a keep-alive connection to PostgREST."""
+
+        return self._run(self._warm())
+
+    def get_chat_state(self, sender: str) -> ChatState:
+        return self._run(self._get_chat_state(sender))
+
+    def upsert_chat_state(self, state: ChatState) -> bool:
+        return self._run(self._upsert_chat_state(state))
+
+    def create_lesson(self, title: str, level: str, topic: str, author_phone: str) -> Optional[Dict[str, Any]]:
+        return self._run(self._create_lesson(title, level, topic, author_phone))
+
+    def get_lesson(self, lesson_id: str) -> Optional[Dict[str, Any]]:
+        return self._run(self._get_lesson(lesson_id))
+
+    def update_lesson_body(self, lesson_id: str, markdown: str) -> bool:
+        """Append ``markdown`` to the lesson body, sending only the new chunk."""
+
+        return self._run(self._update_lesson_body(lesson_id, markdown))
+
+    def append_lesson_body(self, lesson_id: str, chunk: str, expected_version: Optional[int] = None) -> Optional[int]:
+        """Call the ``append_lesson_body`` RPC; return the new ``body_version`` or ``None`` on a version mismatch."""
+
+        return self._run(self._append_lesson_body(lesson_id, chunk, expected_version))
+
+    def add_quiz(self, lesson_id: str, prompt: str, options: List[str], answer_idx: int) -> bool:
+        return self._run(self._add_quiz(lesson_id, prompt, options, answer_idx))
+
+    def add_media_entry(self, lesson_id: str, kind: str, url: str, caption: Optional[str]) -> bool:
+        return self._run(self._add_media_entry(lesson_id, kind, url, caption))
+
+    def apply_message_writes(self, writes: MessageWrites) -> bool:
+        """Apply a message's staged writes in one ``apply_message_writes`` RPC.
+
+        The function runs in a single transaction, so either every row lands
+        or none does. Schemas without it fall back to one call per write.
+        """
+
+        return self._run(self._apply_message_writes(writes))
+
+    def publish_lesson(self, lesson_id: str, slug: str) -> bool:
+        return self._run(self._publish_lesson(lesson_id, slug))
+
+    def publish_lesson_atomic(
+        self, lesson_id: str, sender: str, channel: str, result: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Publish, record and clear chat state in one ``publish_lesson_atomic`` RPC.
+
+        Returns ``{"slug", "title", "publish_id"}`` or ``None`` when the lesson
+        is missing or the call failed. Schemas without the function fall back to the
+        step-by-step calls.
+        """
+
+        return self._run(self._publish_lesson_atomic(lesson_id, sender, channel, result))
+
+    def record_publish(self, lesson_id: str, channel: str, result: Dict[str, Any]) -> Optional[str]:
+        """Insert a publishes row and return its id."""
+
+        return self._run(self._record_publish(lesson_id, channel, result))
+
+    def record_revalidation(self, publish_id: str, result: Dict[str, Any]) -> bool:
+        """Replace a publishes row's ``result`` once its revalidation has run."""
+
+        return self._run(self._record_revalidation(publish_id, result))
+
+    def generate_unique_slug(self, title: str) -> str:
+        """Return a free slug for ``title`` using at most one prefix query."""
+
+        return self._run(self._generate_unique_slug(title))
+
+    def slug_exists(self, slug: str) -> bool:
+        return self._run(self._slug_exists(slug))
+
+    def upload_lesson_media(self, lesson_id: str, filename: str, blob: bytes, mime_type: Optional[str]) -> Optional[str]:
+        return self._run(self._upload_lesson_media(lesson_id, filename, blob, mime_type))
+
+    def upload_lesson_media_file(
+        self,
+        lesson_id: str,
+        filename: str,
+        file: IO[bytes],
+        size: int,
+        mime_type: Optional[str],
+    ) -> Optional[str]:
+        """Upload ``file`` in fixed-size chunks so the body is never held in memory whole."""
+
+        return self._run(self._upload_lesson_media_file(lesson_id, filename, file, size, mime_type))
+
+
+class AsyncSupabaseService(_SupabaseOperations):
+    """Non-blocking counterpart of :class:`SupabaseService`.
+
+    The underlying ``AClient`` is created on first use because ``acreate_client``
+    is a coroutine and cannot run during module import.
+    """
+
+    def __init__(self, settings: Settings, client: Optional[AClient] = None) -> None:
+        super().__init__(settings)
+        self.client: Optional[AClient] = client
+        self._client_lock = asyncio.Lock()
+
+    async def _get_client(self) -> AClient:
+        if self.client is None:
+            async with self._client_lock:
+                if self.client is None:
+                    from supabase import acreate_client
+
+                    self.client = await acreate_client(
+                        _project_url(self.settings),
+                        self.settings.supabase_service_role_key,
+                    )
+        return self.client
+
+    @property
+    def opened(self) -> bool:
+        return self.client is not None
+
+    async def _run(self, operation: _Operation) -> Any:
+        try:
+            request = next(operation)
+            while True:
+                try:
+                    response = await request(await self._get_client())
+                except Exception as exc:
+                    request = operation.throw(exc)
+                else:
+                    request = operation.send(response)
+        except StopIteration as stop:
+            return stop.value
+
+    def _file_chunks(self, file: IO[bytes]) -> AsyncIterator[bytes]:
+        return _aiter_file(file)
+
+    async def warm(self) -> bool:
+        """Build the client and open a keep-alive connection to PostgREST."""
+
+        return await self._run(self._warm())
+
+    async def get_chat_state(self, sender: str) -> ChatState:
+        return await self._run(self._get_chat_state(sender))
+
+    async def upsert_chat_state(self, state: ChatState) -> bool:
+        return await self._run(self._upsert_chat_state(state))
+
+    async def create_lesson(self, title: str, level: str, topic: str, author_phone: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._create_lesson(title, level, topic, author_phone))
+
+    async def get_lesson(self, lesson_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get_lesson(lesson_id))
+
+    async def update_lesson_body(self, lesson_id: str, markdown: str) -> bool:
+        """Append ``markdown`` to the lesson body, sending only the new chunk."""
+
+        return await self._run(self._update_lesson_body(lesson_id, markdown))
+
+    async def append_lesson_body(
+        self, lesson_id: str, chunk: str, expected_version: Optional[int] = None
+    ) -> Optional[int]:
+        """Call the ``append_lesson_body`` RPC; return the new ``body_version`` or ``None`` on a version mismatch."""
+
+        return await self._run(self._append_lesson_body(lesson_id, chunk, expected_version))
+
+    async def add_quiz(self, lesson_id: str, prompt: str, options: List[str], answer_idx: int) -> bool:
+        return await self._run(self._add_quiz(lesson_id, prompt, options, answer_idx))
+
+    async def add_media_entry(self, lesson_id: str, kind: str, url: str, caption: Optional[str]) -> bool:
+        return await self._run(self._add_media_entry(lesson_id, kind, url, caption))
+
+    async def apply_message_writes(self, writes: MessageWrites) -> bool:
+        """Apply a message's staged writes in one ``apply_message_writes`` RPC; see :class:`SupabaseService`."""
+
+        return await self._run(self._apply_message_writes(writes))
+
+    async def publish_lesson(self, lesson_id: str, slug: str) -> bool:
+        return await self._run(self._publish_lesson(lesson_id, slug))
+
+    async def publish_lesson_atomic(
+        self, lesson_id: str, sender: str, channel: str, result: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Publish, record and clear chat state in one RPC; see :class:`SupabaseService`."""
+
+        return await self._run(self._publish_lesson_atomic(lesson_id, sender, channel, result))
+
+    async def record_publish(self, lesson_id: str, channel: str, result: Dict[str, Any]) -> Optional[str]:
+        """Insert a publishes row and return its id."""
+
+        return await self._run(self._record_publish(lesson_id, channel, result))
+
+    async def record_revalidation(self, publish_id: str, result: Dict[str, Any]) -> bool:
+        """Replace a publishes row's ``result`` once its revalidation has run."""
+
+        return await self._run(self._record_revalidation(publish_id, result))
+
+    async def generate_unique_slug(self, title: str) -> str:
+        """Return a free slug for ``title`` using at most one prefix query."""
+
+        return await self._run(self._generate_unique_slug(title))
+
+    async def slug_exists(self, slug: str) -> bool:
+        return await self._run(self._slug_exists(slug))
+
+    async def upload_lesson_media(self, lesson_id: str, filename: str, blob: bytes, mime_type: Optional[str]) -> Optional[str]:
+        return await self._run(self._upload_lesson_media(lesson_id, filename, blob, mime_type))
+
+    async def upload_lesson_media_file(
+        self,
+        lesson_id: str,
+        filename: str,
+        file: IO[bytes],
+        size: int,
+        mime_type: Optional[str],
+    ) -> Optional[str]:
+        """Upload ``file`` in fixed-size chunks so the body is never held in memory whole."""
+
+        return await self._run(self._upload_lesson_media_file(lesson_id, filename, file, size, mime_type))
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.postgrest.aclose()
+            await self.client.storage.aclose()
 
 
-__all__ = ["SupabaseService"]
+__all__ = ["AsyncSupabaseService", "SupabaseService"]
@@ -7,10 +7,15 @@ import hmac
 import json
 import logging
 import mimetypes
+import re
+import tempfile
+import threading
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import IO, Any, Dict, List, Mapping, Optional
 
 import httpx
+from pydantic import TypeAdapter, ValidationError
+from typing_extensions import TypedDict
 
 from bot.settings import Settings
 
@@ -30,14 +35,130 @@ class InboundMessage:
     caption: Optional[str] = None
 
 
-class WhatsAppAPI:
-    """Minimal client for WhatsApp Business Cloud operations."""
+@dataclass
+class MediaDownload:
+    """Media spooled to a temporary file by ``stream_media``.
+
+    ``file`` is positioned at the start; small files stay in memory and larger
+    ones roll over to disk once they pass ``BOT_MEDIA_SPOOL_BYTES``.
+    """
+
+    file: IO[bytes]
+    size: int
+    mime_type: Optional[str]
+    filename: str
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class MediaTooLarge(Exception):
+    """Raised when a media object exceeds ``BOT_MEDIA_MAX_BYTES``."""
+
+    def __init__(self, media_id: str, limit: int) -> None:
+        super().__init__(f"Media {media_id} exceeds {limit} bytes")
+        self.media_id = media_id
+        self.limit = limit
+
+
+_INBOUND_TYPES = frozenset({"text", "image", "audio", "video", "document"})
+# ``"messages"`` as a key; every change also carries ``"field": "messages"`` as a value.
+_MESSAGES_KEY = re.compile(rb'"messages"\s*:')
+
+
+# Typed view of the webhook body. Only the keys the bot reads are declared;
+# pydantic-core skips everything else while parsing instead of building it.
+class _WebhookText(TypedDict, total=False):
+    body: str
+
+
+class _WebhookMedia(TypedDict, total=False):
+    id: str
+    filename: Optional[str]
+    caption: Optional[str]
+
+
+_WebhookMessage = TypedDict(
+    "_WebhookMessage",
+    {
+        "from": str,
+        "id": str,
+        "type": str,
+        "text": _WebhookText,
+        "image": _WebhookMedia,
+        "audio": _WebhookMedia,
+        "video": _WebhookMedia,
+        "document": _WebhookMedia,
+    },
+    total=False,
+)
+
+
+class _WebhookContact(TypedDict, total=False):
+    wa_id: str
+
+
+class _WebhookValue(TypedDict, total=False):
+    messages: List[_WebhookMessage]
+    contacts: List[_WebhookContact]
+
+
+class _WebhookChange(TypedDict, total=False):
+    value: _WebhookValue
+
+
+class _WebhookEntry(TypedDict, total=False):
+    changes: List[_WebhookChange]
+
+
+class _WebhookPayload(TypedDict, total=False):
+    entry: List[_WebhookEntry]
+
+
+_WEBHOOK_DECODER: TypeAdapter[_WebhookPayload] = TypeAdapter(_WebhookPayload)
+
+
+def _inbound_messages(payload: Mapping[str, Any]) -> List[InboundMessage]:
+    """Walk a webhook payload (plain or typed view) into :class:`InboundMessage` objects."""
+
+    messages: List[InboundMessage] = []
+    for entry in payload.get("entry", ()):
+        for change in entry.get("changes", ()):
+            value = change.get("value", {})
+            contacts = value.get("contacts")
+            for message in value.get("messages", ()):
+                message_type = message.get("type")
+                if message_type not in _INBOUND_TYPES:
+                    continue
+                sender = message.get("from") or (contacts[0].get("wa_id") if contacts else None)
+                if not sender:
+                    continue
+                inbound = InboundMessage(sender=sender, message_id=message.get("id", ""), type=message_type)
+                if message_type == "text":
+                    inbound.text = message.get("text", {}).get("body", "")
+                else:
+                    media_block = message.get(message_type, {})
+                    inbound.media_id = media_block.get("id")
+                    inbound.media_filename = media_block.get("filename")
+                    inbound.caption = media_block.get("caption")
+                messages.append(inbound)
+    return messages
+
+
+class _WhatsAppBase:
+    """Transport-independent helpers shared by the sync and async clients."""
 
     GRAPH_BASE = "https://graph.facebook.com/v20.0"
+    metrics_name = "whatsapp"
+    MEDIA_CHUNK_SIZE = 64 * 1024
 
-    def __init__(self, settings: Settings, client: Optional[httpx.Client] = None) -> None:
-        self.settings = settings
-        self._client = client or httpx.Client(timeout=15.0)
+    settings: Settings
+
+    @property
+    def graph_base(self) -> str:
+        """``WHATSAPP_GRAPH_BASE`` when set (e.g. a local stand-in), else :attr:`GRAPH_BASE`."""
+
+        return (getattr(self.settings, "whatsapp_graph_base", None) or self.GRAPH_BASE).rstrip("/")
 
     # ------------------------------------------------------------------
     # Webhook helpers
@@ -61,45 +182,149 @@ class WhatsAppAPI:
     def extract_messages(self, payload: Dict[str, Any]) -> List[InboundMessage]:
         """Extract inbound messages from the webhook payload."""
 
-        messages: List[InboundMessage] = []
-        for entry in payload.get("entry", []):
-            for change in entry.get("changes", []):
-                value = change.get("value", {})
-                for message in value.get("messages", []):
-                    message_type = message.get("type")
-                    if message_type not in {"text", "image", "audio", "video"}:
-                        continue
-                    sender = message.get("from") or value.get("contacts", [{}])[0].get("wa_id")
-                    if not sender:
-                        continue
-                    inbound = InboundMessage(
-                        sender=sender,
-                        message_id=message.get("id", ""),
-                        type=message_type,
-                    )
-                    if message_type == "text":
-                        inbound.text = message.get("text", {}).get("body", "")
-                    else:
-                        media_block = message.get(message_type, {})
-                        inbound.media_id = media_block.get("id")
-                        inbound.media_filename = media_block.get("filename")
-                        inbound.caption = media_block.get("caption")
-                    messages.append(inbound)
-        return messages
+        return _inbound_messages(payload)
+
+    @staticmethod
+    def has_messages(raw_body: bytes) -> bool:
+        """Cheap pre-filter run before any JSON parsing.
+
+        ``False`` means the payload has no ``messages`` key and so nothing to
+        route. Most webhooks are delivery and read ``statuses`` like that. A
+        ``True`` can be a false positive (for example, the word quoted inside
+        a status error), and the decoder then simply finds no messages.
+        """
+
+        return _MESSAGES_KEY.search(raw_body) is not None
+
+    def decode_messages(self, raw_body: bytes) -> List[InboundMessage]:
+        """Parse a raw webhook body straight into :class:`InboundMessage` objects.
+
+        pydantic-core parses and type-checks the body in one pass and drops
+        the keys the bot never reads (statuses, pricing, metadata). A body
+        whose shape the typed view rejects falls back to the tolerant
+        :meth:`extract_messages` walk.
+        Raises ``ValueError`` when the body is not JSON.
+        """
+
+        try:
+            payload = _WEBHOOK_DECODER.validate_json(raw_body)
+        except ValidationError as exc:
+            if any(error["type"] == "json_invalid" for error in exc.errors()):
+                raise ValueError("Invalid JSON") from exc
+            data = json.loads(raw_body)
+            return self.extract_messages(data) if isinstance(data, dict) else []
+        return _inbound_messages(payload)
 
     # ------------------------------------------------------------------
-    # Outbound messaging
-    # ------------------------------------------------------------------
-    def send_text_message(self, recipient: str, text: str) -> None:
-        """Send a plain text WhatsApp message."""
+    def _messages_url(self) -> str:
+        return f"{self.graph_base}/{self.settings.whatsapp_phone_number_id}/messages"
 
-        url = f"{self.GRAPH_BASE}/{self.settings.whatsapp_phone_number_id}/messages"
-        payload = {
+    @staticmethod
+    def _text_payload(recipient: str, text: str) -> Dict[str, Any]:
+        return {
             "messaging_product": "whatsapp",
             "to": recipient,
             "text": {"preview_url": False, "body": text[:4096]},
         }
-        response = self._client.post(url, json=payload, headers=self._headers)
+
+    @staticmethod
+    def _media_filename(media_id: str, metadata: Dict[str, Any], mime_type: Optional[str]) -> str:
+        filename = metadata.get("file_name")
+        if not filename:
+            extension = mimetypes.guess_extension(mime_type or "") or ""
+            filename = f"{media_id}{extension}"
+        return filename
+
+    @classmethod
+    def _media_result(
+        cls,
+        media_id: str,
+        metadata: Dict[str, Any],
+        download_response: httpx.Response,
+    ) -> Dict[str, Any]:
+        mime_type = metadata.get("mime_type") or download_response.headers.get("Content-Type")
+        return {
+            "bytes": download_response.content,
+            "mime_type": mime_type,
+            "filename": cls._media_filename(media_id, metadata, mime_type),
+        }
+
+    def _new_spool(self) -> IO[bytes]:
+        return tempfile.SpooledTemporaryFile(max_size=self.settings.bot_media_spool_bytes)
+
+    def _enforce_media_limit(self, media_id: str, size: int) -> None:
+        limit = self.settings.bot_media_max_bytes
+        if limit and size > limit:
+            logger.warning("Media exceeds size limit", extra={"media_id": media_id, "size": size, "limit": limit})
+            raise MediaTooLarge(media_id, limit)
+
+    def _check_declared_size(self, media_id: str, metadata: Dict[str, Any], response: httpx.Response) -> None:
+        for declared in (metadata.get("file_size"), response.headers.get("Content-Length")):
+            if declared is not None and str(declared).isdigit():
+                self._enforce_media_limit(media_id, int(declared))
+
+    def _spooled_result(
+        self,
+        media_id: str,
+        metadata: Dict[str, Any],
+        response: httpx.Response,
+        spool: IO[bytes],
+        size: int,
+    ) -> MediaDownload:
+        spool.seek(0)
+        mime_type = metadata.get("mime_type") or response.headers.get("Content-Type")
+        return MediaDownload(
+            file=spool,
+            size=size,
+            mime_type=mime_type,
+            filename=self._media_filename(media_id, metadata, mime_type),
+        )
+
+    @property
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.settings.whatsapp_token}",
+        }
+
+
+class WhatsAppAPI(_WhatsAppBase):
+    """Minimal client for WhatsApp Business Cloud operations."""
+
+    def __init__(self, settings: Settings, client: Optional[httpx.Client] = None) -> None:
+        self.settings = settings
+        self._http = client
+        self._http_lock = threading.Lock()
+
+    @property
+    def _client(self) -> httpx.Client:
+        # Built on first use so importing the app does not pay for TLS setup.
+        if self._http is None:
+            with self._http_lock:
+                if self._http is None:
+                    self._http = httpx.Client(timeout=15.0)
+        return self._http
+
+    @property
+    def opened(self) -> bool:
+        return self._http is not None
+
+    def warm(self) -> bool:
+        """Open a keep-alive connection to the Graph API ahead of the first message."""
+
+        try:
+            self._client.head(self.graph_base, timeout=5.0)
+        except httpx.HTTPError as exc:
+            logger.warning("WhatsApp warm-up failed", extra={"error": str(exc)})
+            return False
+        return True
+
+    # ------------------------------------------------------------------
+    # Outbound messaging
+    # ------------------------------------------------------------------
+    def send_text_message(self, recipient: str, text: str) -> None:
+        """Send a plain text WhatsApp message."""
+
+        response = self.post_text_message(recipient, text)
         try:
             response.raise_for_status()
         except httpx.HTTPError:
@@ -108,13 +333,65 @@ class WhatsAppAPI:
                 extra={"status": response.status_code, "body": safe_json(response)},
             )
 
+    def post_text_message(self, recipient: str, text: str) -> httpx.Response:
+        """POST a text message and return the raw response so callers can retry."""
+
+        payload = self._text_payload(recipient, text)
+        return self._client.post(self._messages_url(), json=payload, headers=self._headers)
+
     # ------------------------------------------------------------------
     # Media handling
     # ------------------------------------------------------------------
     def download_media(self, media_id: str) -> Optional[Dict[str, Any]]:
         """Download media bytes and metadata for the given WhatsApp media id."""
 
-        meta_url = f"{self.GRAPH_BASE}/{media_id}"
+        metadata = self._media_metadata(media_id)
+        if metadata is None:
+            return None
+        download_response = self._client.get(metadata["url"], headers=self._headers, timeout=30.0)
+        try:
+            download_response.raise_for_status()
+        except httpx.HTTPError:
+            logger.warning(
+                "Failed to download media",
+                extra={"status": download_response.status_code, "media_id": media_id},
+            )
+            return None
+        return self._media_result(media_id, metadata, download_response)
+
+    def stream_media(self, media_id: str) -> Optional[MediaDownload]:
+        """Stream media into a spooled temporary file without buffering it whole.
+
+        Raises :class:`MediaTooLarge` as soon as the declared or received size
+        passes ``BOT_MEDIA_MAX_BYTES``.
+        """
+
+        metadata = self._media_metadata(media_id)
+        if metadata is None:
+            return None
+        spool = self._new_spool()
+        size = 0
+        try:
+            with self._client.stream("GET", metadata["url"], headers=self._headers, timeout=30.0) as response:
+                if response.is_error:
+                    logger.warning(
+                        "Failed to download media",
+                        extra={"status": response.status_code, "media_id": media_id},
+                    )
+                    spool.close()
+                    return None
+                self._check_declared_size(media_id, metadata, response)
+                for chunk in response.iter_bytes(self.MEDIA_CHUNK_SIZE):
+                    size += len(chunk)
+                    self._enforce_media_limit(media_id, size)
+                    spool.write(chunk)
+        except Exception:
+            spool.close()
+            raise
+        return self._spooled_result(media_id, metadata, response, spool, size)
+
+    def _media_metadata(self, media_id: str) -> Optional[Dict[str, Any]]:
+        meta_url = f"{self.graph_base}/{media_id}"
         meta_response = self._client.get(meta_url, headers=self._headers, timeout=15.0)
         try:
             meta_response.raise_for_status()
@@ -125,11 +402,76 @@ class WhatsAppAPI:
             )
             return None
         metadata = meta_response.json()
-        download_url = metadata.get("url")
-        if not download_url:
+        if not metadata.get("url"):
             logger.warning("Media metadata missing download URL", extra={"media_id": media_id})
             return None
-        download_response = self._client.get(download_url, headers=self._headers, timeout=30.0)
+        return metadata
+
+    def close(self) -> None:
+        """Close the underlying HTTP client."""
+
+        if self._http is not None:
+            self._http.close()
+
+
+class AsyncWhatsAppAPI(_WhatsAppBase):
+    """Non-blocking counterpart of :class:`WhatsAppAPI` built on ``httpx.AsyncClient``."""
+
+    def __init__(self, settings: Settings, client: Optional[httpx.AsyncClient] = None) -> None:
+        self.settings = settings
+        self._http = client
+
+    @property
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=15.0)
+        return self._http
+
+    @property
+    def opened(self) -> bool:
+        return self._http is not None
+
+    async def warm(self) -> bool:
+        """Open a keep-alive connection to the Graph API ahead of the first message."""
+
+        try:
+            await self._client.head(self.graph_base, timeout=5.0)
+        except httpx.HTTPError as exc:
+            logger.warning("WhatsApp warm-up failed", extra={"error": str(exc)})
+            return False
+        return True
+
+    # ------------------------------------------------------------------
+    # Outbound messaging
+    # ------------------------------------------------------------------
+    async def send_text_message(self, recipient: str, text: str) -> None:
+        """Send a plain text WhatsApp message."""
+
+        response = await self.post_text_message(recipient, text)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPError:
+            logger.warning(
+                "Failed to send WhatsApp message",
+                extra={"status": response.status_code, "body": safe_json(response)},
+            )
+
+    async def post_text_message(self, recipient: str, text: str) -> httpx.Response:
+        """POST a text message and return the raw response so callers can retry."""
+
+        payload = self._text_payload(recipient, text)
+        return await self._client.post(self._messages_url(), json=payload, headers=self._headers)
+
+    # ------------------------------------------------------------------
+    # Media handling
+    # ------------------------------------------------------------------
+    async def download_media(self, media_id: str) -> Optional[Dict[str, Any]]:
+        """Download media bytes and metadata for the given WhatsApp media id."""
+
+        metadata = await self._media_metadata(media_id)
+        if metadata is None:
+            return None
+        download_response = await self._client.get(metadata["url"], headers=self._headers, timeout=30.0)
         try:
             download_response.raise_for_status()
         except httpx.HTTPError:
@@ -138,27 +480,61 @@ class WhatsAppAPI:
                 extra={"status": download_response.status_code, "media_id": media_id},
             )
             return None
-        mime_type = metadata.get("mime_type") or download_response.headers.get("Content-Type")
-        filename = metadata.get("file_name")
-        if not filename:
-            extension = mimetypes.guess_extension(mime_type or "") or ""
-            filename = f"{media_id}{extension}"
-        return {
-            "bytes": download_response.content,
-            "mime_type": mime_type,
-            "filename": filename,
-        }
+        return self._media_result(media_id, metadata, download_response)
 
-    def close(self) -> None:
-        """Close the underlying HTTP client."""
+    async def stream_media(self, media_id: str) -> Optional[MediaDownload]:
+        """Stream media into a spooled temporary file without buffering it whole.
 
-        self._client.close()
+        Raises :class:`MediaTooLarge` as soon as the declared or received size
+        passes ``BOT_MEDIA_MAX_BYTES``.
+        """
 
-    # ------------------------------------------------------------------
-    def _headers(self) -> Dict[str, str]:
-        return {
-            "Authorization": f"Bearer {self.settings.whatsapp_token}",
-        }
+        metadata = await self._media_metadata(media_id)
+        if metadata is None:
+            return None
+        spool = self._new_spool()
+        size = 0
+        try:
+            async with self._client.stream("GET", metadata["url"], headers=self._headers, timeout=30.0) as response:
+                if response.is_error:
+                    logger.warning(
+                        "Failed to download media",
+                        extra={"status": response.status_code, "media_id": media_id},
+                    )
+                    spool.close()
+                    return None
+                self._check_declared_size(media_id, metadata, response)
+                async for chunk in response.aiter_bytes(self.MEDIA_CHUNK_SIZE):
+                    size += len(chunk)
+                    self._enforce_media_limit(media_id, size)
+                    spool.write(chunk)
+        except Exception:
+            spool.close()
+            raise
+        return self._spooled_result(media_id, metadata, response, spool, size)
+
+    async def _media_metadata(self, media_id: str) -> Optional[Dict[str, Any]]:
+        meta_url = f"{self.graph_base}/{media_id}"
+        meta_response = await self._client.get(meta_url, headers=self._headers, timeout=15.0)
+        try:
+            meta_response.raise_for_status()
+        except httpx.HTTPError:
+            logger.warning(
+                "Failed to fetch media metadata",
+                extra={"status": meta_response.status_code, "media_id": media_id},
+            )
+            return None
+        metadata = meta_response.json()
+        if not metadata.get("url"):
+            logger.warning("Media metadata missing download URL", extra={"media_id": media_id})
+            return None
+        return metadata
+
+    async def close(self) -> None:
+        """Close the underlying HTTP client."""
+
+        if self._http is not None:
+            await self._http.aclose()
 
 
 def safe_json(response: httpx.Response) -> Any:
@@ -170,4 +546,4 @@ def safe_json(response: httpx.Response) -> Any:
         return response.text
 
 
-__all__ = ["InboundMessage", "WhatsAppAPI"]
+__all__ = ["AsyncWhatsAppAPI", "InboundMessage", "MediaDownload", "MediaTooLarge", "WhatsAppAPI"]
@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import logging
 from functools import lru_cache
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from dotenv import load_dotenv
 from pydantic import Field, HttpUrl, field_validator
@@ -28,8 +28,48 @@ class Settings(BaseSettings):
     bot_allowed_senders: List[str] = Field(default_factory=list, alias="BOT_ALLOWED_SENDERS")
     bot_rate_limit_window_sec: int = Field(60, alias="BOT_RATE_LIMIT_WINDOW_SEC")
     bot_rate_limit_max: int = Field(20, alias="BOT_RATE_LIMIT_MAX")
+    bot_rate_limit_algorithm: Literal["sliding", "gcra"] = Field("sliding", alias="BOT_RATE_LIMIT_ALGORITHM")
+    bot_rate_limit_backend: Literal["memory", "sqlite"] = Field("memory", alias="BOT_RATE_LIMIT_BACKEND")
+    bot_rate_limit_sqlite_path: str = Field("bot-ratelimit.sqlite3", alias="BOT_RATE_LIMIT_SQLITE_PATH")
+    bot_rate_limit_lease: int = Field(4, alias="BOT_RATE_LIMIT_LEASE")
     bot_media_bucket: str = Field("lesson-media", alias="BOT_MEDIA_BUCKET")
+    bot_media_max_bytes: int = Field(16 * 1024 * 1024, alias="BOT_MEDIA_MAX_BYTES")
+    bot_media_spool_bytes: int = Field(1024 * 1024, alias="BOT_MEDIA_SPOOL_BYTES")
+    bot_import_token: Optional[str] = Field(default=None, alias="BOT_IMPORT_TOKEN")
     whatsapp_app_secret: Optional[str] = Field(default=None, alias="WHATSAPP_APP_SECRET")
+    whatsapp_graph_base: Optional[str] = Field(default=None, alias="WHATSAPP_GRAPH_BASE")
+    bot_dedup_backend: Literal["memory", "sqlite", "none"] = Field("memory", alias="BOT_DEDUP_BACKEND")
+    bot_dedup_ttl_sec: int = Field(86400, alias="BOT_DEDUP_TTL_SEC")
+    bot_dedup_max_entries: int = Field(100_000, alias="BOT_DEDUP_MAX_ENTRIES")
+    bot_dedup_sqlite_path: str = Field("bot-dedup.sqlite3", alias="BOT_DEDUP_SQLITE_PATH")
+    bot_state_cache_size: int = Field(0, alias="BOT_STATE_CACHE_SIZE")
+    bot_state_cache_ttl_sec: float = Field(300.0, alias="BOT_STATE_CACHE_TTL_SEC")
+    bot_state_write_behind_sec: float = Field(0.0, alias="BOT_STATE_WRITE_BEHIND_SEC")
+    bot_async_io: bool = Field(False, alias="BOT_ASYNC_IO")
+    bot_warmup: bool = Field(False, alias="BOT_WARMUP")
+    bot_log_queue: bool = Field(True, alias="BOT_LOG_QUEUE")
+    bot_log_fast_json: bool = Field(True, alias="BOT_LOG_FAST_JSON")
+    bot_log_sampling: str = Field("", alias="BOT_LOG_SAMPLING")
+    bot_log_max_field_chars: int = Field(2000, alias="BOT_LOG_MAX_FIELD_CHARS")
+    bot_slow_message_ms: float = Field(5000.0, alias="BOT_SLOW_MESSAGE_MS")
+    bot_trace_export_path: Optional[str] = Field(default=None, alias="BOT_TRACE_EXPORT_PATH")
+    bot_ingest_workers: int = Field(0, alias="BOT_INGEST_WORKERS")
+    bot_ingest_queue_size: int = Field(1000, alias="BOT_INGEST_QUEUE_SIZE")
+    bot_ingest_drain_on_shutdown: bool = Field(True, alias="BOT_INGEST_DRAIN_ON_SHUTDOWN")
+    bot_ingest_drain_timeout_sec: float = Field(10.0, alias="BOT_INGEST_DRAIN_TIMEOUT_SEC")
+    bot_payload_concurrency: int = Field(8, alias="BOT_PAYLOAD_CONCURRENCY")
+    bot_outbound_queue_size: int = Field(0, alias="BOT_OUTBOUND_QUEUE_SIZE")
+    bot_outbound_workers: int = Field(4, alias="BOT_OUTBOUND_WORKERS")
+    bot_outbound_rate_per_sec: float = Field(20.0, alias="BOT_OUTBOUND_RATE_PER_SEC")
+    bot_outbound_burst: int = Field(20, alias="BOT_OUTBOUND_BURST")
+    bot_outbound_max_attempts: int = Field(5, alias="BOT_OUTBOUND_MAX_ATTEMPTS")
+    bot_outbound_sqlite_path: Optional[str] = Field(default=None, alias="BOT_OUTBOUND_SQLITE_PATH")
+    bot_revalidate_concurrency: int = Field(8, alias="BOT_REVALIDATE_CONCURRENCY")
+    bot_revalidate_timeout_sec: float = Field(10.0, alias="BOT_REVALIDATE_TIMEOUT_SEC")
+    bot_revalidate_outbox: bool = Field(False, alias="BOT_REVALIDATE_OUTBOX")
+    bot_revalidate_outbox_path: str = Field("bot-outbox.sqlite3", alias="BOT_REVALIDATE_OUTBOX_PATH")
+    bot_revalidate_debounce_sec: float = Field(5.0, alias="BOT_REVALIDATE_DEBOUNCE_SEC")
+    bot_revalidate_max_attempts: int = Field(8, alias="BOT_REVALIDATE_MAX_ATTEMPTS")
 
     @field_validator("bot_allowed_senders", mode="before")
     @classmethod
@@ -50,6 +90,25 @@ class Settings(BaseSettings):
             raise ValueError("Rate limit values must be integers") from exc
         return max(1, parsed)
 
+    @field_validator(
+        "bot_ingest_workers",
+        "bot_ingest_queue_size",
+        "bot_payload_concurrency",
+        "bot_state_cache_size",
+        "bot_outbound_queue_size",
+        "bot_media_max_bytes",
+        "bot_media_spool_bytes",
+        "bot_log_max_field_chars",
+        mode="before",
+    )
+    @classmethod
+    def _ensure_non_negative(cls, value: object) -> int:
+        try:
+            parsed = int(value)
+        except (TypeError, ValueError) as exc:
+            raise ValueError("Queue, cache and media sizes must be integers") from exc
+        return max(0, parsed)
+
     @property
     def allow_all_senders(self) -> bool:
         return len(self.bot_allowed_senders) == 0
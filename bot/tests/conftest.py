@@ -0,0 +1,177 @@
+"""Shared test doubles."""
+from __future__ import annotations
+
+import fnmatch
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from postgrest.exceptions import APIError
+
+# Primary key per table for ``upsert``; every other table is keyed on ``id``.
+_KEYS = {"chat_state": "sender_phone"}
+
+
+def postgrest_error(code: str, message: str = "error") -> APIError:
+    return APIError({"code": code, "message": message, "details": "", "hint": ""})
+
+
+class FakeQuery:
+    """One PostgREST builder chain against :class:`FakePostgrest`'s tables."""
+
+    def __init__(self, client: "FakePostgrest", table: str) -> None:
+        self.client = client
+        self.table = table
+        self.action = "select"
+        self.columns: Optional[List[str]] = None
+        self.payload: Optional[Dict[str, Any]] = None
+        self.filters: List[Tuple[str, Any]] = []
+
+    def select(self, *columns: str) -> "FakeQuery":
+        names = [name.strip() for column in columns for name in column.split(",")]
+        self.columns = None if not names or "*" in names else names
+        return self
+
+    def insert(self, payload: Dict[str, Any]) -> "FakeQuery":
+        self.action, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload: Dict[str, Any]) -> "FakeQuery":
+        self.action, self.payload = "upsert", payload
+        return self
+
+    def update(self, payload: Dict[str, Any]) -> "FakeQuery":
+        self.action, self.payload = "update", payload
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        self.filters.append((column, value))
+        return self
+
+    def or_(self, expression: str) -> "FakeQuery":
+        self.filters.append(("or", expression))
+        return self
+
+    def execute(self) -> SimpleNamespace:
+        client = self.client
+        client.requests.append((self.table, self.action, self.payload, list(self.filters)))
+        if client.on_execute is not None:
+            client.on_execute(self)
+        rows = client.tables.setdefault(self.table, [])
+        if self.action == "select":
+            found = [row for row in rows if self._matches(row)]
+            if self.columns is not None:
+                found = [{column: row.get(column) for column in self.columns} for row in found]
+            return SimpleNamespace(data=[dict(row) for row in found])
+        if self.action == "update":
+            found = [row for row in rows if self._matches(row)]
+            for row in found:
+                client.check_unique(self.table, {**row, **self.payload}, row)
+                row.update(self.payload)
+            return SimpleNamespace(data=[dict(row) for row in found])
+        key = _KEYS.get(self.table, "id")
+        row = dict(self.payload)
+        existing = next((old for old in rows if key in row and old.get(key) == row[key]), None)
+        if existing is not None and self.action == "upsert":
+            client.check_unique(self.table, row, existing)
+            existing.update(row)
+            return SimpleNamespace(data=[dict(existing)])
+        if existing is not None:
+            raise postgrest_error("23505", "duplicate key")
+        row.setdefault(key, f"{self.table}-{len(rows) + 1}")
+        client.check_unique(self.table, row, None)
+        rows.append(row)
+        return SimpleNamespace(data=[dict(row)])
+
+    def _matches(self, row: Dict[str, Any]) -> bool:
+        for column, value in self.filters:
+            if column == "or":
+                if not any(_term_matches(row, term) for term in value.split(",")):
+                    return False
+            elif row.get(column) != value:
+                return False
+        return True
+
+
+def _term_matches(row: Dict[str, Any], term: str) -> bool:
+    # Just the ``column.eq.value`` and ``column.like.pattern`` terms the bot sends.
+    column, operator, value = term.split(".", 2)
+    current = row.get(column)
+    if operator == "like":
+        return current is not None and fnmatch.fnmatchcase(str(current), value)
+    return current == value
+
+
+class FakePostgrest:
+    """In-memory stand-in for the sync ``supabase`` client's table and RPC builders.
+
+    ``tables`` seeds rows per table, ``rpcs`` maps installed function names to
+    handlers (any other name raises PGRST202, like a schema without it) and
+    ``unique`` lists the ``(table, column)`` pairs that raise 23505 on a
+    duplicate. Every request is logged in ``requests``: ``(table, action,
+    payload, filters)`` or ``("rpc", name, params)``. ``on_execute`` runs
+    before each table request, so a test can land a concurrent write.
+    """
+
+    def __init__(
+        self,
+        tables: Optional[Dict[str, Iterable[Dict[str, Any]]]] = None,
+        rpcs: Optional[Dict[str, Callable[[Dict[str, Any]], Any]]] = None,
+        unique: Iterable[Tuple[str, str]] = (),
+    ) -> None:
+        self.tables: Dict[str, List[Dict[str, Any]]] = {
+            name: [dict(row) for row in rows] for name, rows in (tables or {}).items()
+        }
+        self.rpcs = dict(rpcs or {})
+        self.unique = set(unique)
+        self.requests: List[Tuple[Any, ...]] = []
+        self.on_execute: Optional[Callable[[FakeQuery], None]] = None
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> SimpleNamespace:
+        def execute() -> SimpleNamespace:
+            self.requests.append(("rpc", name, params))
+            if name not in self.rpcs:
+                raise postgrest_error("PGRST202", "function not found")
+            return SimpleNamespace(data=self.rpcs[name](params))
+
+        return SimpleNamespace(execute=execute)
+
+    def rows(self, table: str) -> List[Dict[str, Any]]:
+        return self.tables.setdefault(table, [])
+
+    def actions(self) -> List[Tuple[str, str]]:
+        return [(request[0], request[1]) for request in self.requests]
+
+    def check_unique(self, table: str, row: Dict[str, Any], current: Optional[Dict[str, Any]]) -> None:
+        for unique_table, column in self.unique:
+            value = row.get(column)
+            if unique_table != table or value is None:
+                continue
+            if any(other is not current and other.get(column) == value for other in self.rows(table)):
+                raise postgrest_error("23505", "duplicate key")
+
+
+class AsyncFakePostgrest(FakePostgrest):
+    """:class:`FakePostgrest` whose ``execute`` calls are awaited, like the async SDK's."""
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> Any:
+        return _awaitable(super().rpc(name, params))
+
+    def table(self, name: str) -> Any:
+        return _awaitable(super().table(name))
+
+
+def _awaitable(builder: Any) -> Any:
+    class Builder:
+        def __getattr__(self, attr: str) -> Any:
+            method = getattr(builder, attr)
+            if attr == "execute":
+                async def execute() -> Any:
+                    return method()
+
+                return execute
+            return lambda *args: _awaitable(method(*args))
+
+    return Builder()
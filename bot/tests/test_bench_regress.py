@@ -0,0 +1,29 @@
+"""Tests for the micro-benchmark regression check."""
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from bot.benchmarks.bench_regress import BASELINE_PATH, compare, load_baselines, run_check, select
+
+
+def test_compare_flags_only_cases_past_their_threshold() -> None:
+    baselines = {"fast": {"relative": 1.0}, "noisy": {"relative": 1.0}, "steady": {"relative": 1.0}}
+    results = {
+        "fast": {"relative": 1.3},
+        "noisy": {"relative": 1.3},
+        "steady": {"relative": 0.8},
+        "new": {"relative": 9.0},
+    }
+    failures = compare(results, baselines, {"noisy": 0.5}, default_threshold=0.25)
+    assert failures == ["fast: +30% vs baseline (limit +25%)"]
+
+
+def test_every_case_has_a_stored_baseline() -> None:
+    assert {case.name for case in select()} <= set(load_baselines(BASELINE_PATH))
+
+
+@pytest.mark.skipif(not os.environ.get("BOT_BENCH_REGRESSION"), reason="set BOT_BENCH_REGRESSION=1 to run")
+def test_hot_paths_have_not_regressed() -> None:
+    assert run_check() == []
@@ -1,9 +1,12 @@
 """Unit tests for the command parser."""
 from __future__ import annotations
 
+import random
+
 import pytest
 
-from bot.core.commands import CHEAT_SHEET, CommandType, parse_command
+from bot.benchmarks.legacy_commands import LegacyCommandParser
+from bot.core.commands import CHEAT_SHEET, CommandParser, CommandType, parse_command
 
 
 @pytest.mark.parametrize(
@@ -61,3 +64,98 @@ def test_unknown_command() -> None:
     assert command.type is CommandType.UNKNOWN
     assert not command.is_valid
     assert "Unknown" in command.error
+
+
+_EDGE_CASES = [
+    "ADD BODY:",
+    "ADD BODY :",
+    "add body   spaced out",
+    "ADD BODY: <script>alert(1)</script>",
+    "helpme",
+    "HELP please",
+    "newlesson:T|level:L|topic:X",
+    "NEW LESSON: : | Level: : | Topic: :",
+    "NEW LESSON:  | Level: G | Topic: T",
+    "NEW LESSON: A | Level: G | Topic: line\nbreak",
+    "NEW LESSON: A | Level: G | Topic: x | y",
+    "NEW LESSON: A\nB | Level:\nG | Topic:\nT",
+    'ADD QUIZ: "a "quoted" | piped prompt" | A) 1 | B) 2 | C) 3 | ANS: b',
+    'ADD QUIZ:"q"|a)1|b)2|c)3|ansC',
+    'ADD QUIZ: "q" | A)   | B) 2 | C) 3 | ANS: A',
+    'ADD QUIZ: "q" | A) | B) 2 | C) 3 | ANS: A',
+    'ADD QUIZ: "" | A) 1 | B) 2 | C) 3 | ANS: A',
+    'ADD QUIZ: """ | A) 1 | B) 2 | C) 3 | ANS: A',
+    'ADD QUIZ:: "q" | A) 1 | B) 2 | C) 3 | ANS: A',
+    'ADD QUIZ: "q" | A) 1 | B) 2 | C) 3 | ANS :: A',
+    'ADD QUIZ: "q" | A) 1 | B) 2 | C) 3 | ANS: D',
+    'ADD QUIZ: "q" | A) 1 | B) 2 | C) 3 | ANſ: A',
+    'ADD QUIZ: "q" | A) 1 | B) 2 | C) 3 | ANS: A',
+    "ADD MEDIA image",
+    "ADD MEDIA: : image",
+    "ADD MEDIA: İmage",
+    "add   media  :  VIDEO",
+    "publish now",
+    "",
+    "   ",
+]
+
+
+@pytest.mark.parametrize("text", _EDGE_CASES)
+def test_parser_matches_legacy_regex_cascade(text: str) -> None:
+    assert CommandParser().parse(text) == LegacyCommandParser().parse(text)
+
+
+def test_parser_matches_legacy_on_generated_commands() -> None:
+    rng = random.Random(1234)
+    pieces = ["ADD", "add", "QUIZ", "BODY", "MEDIA", "NEW", "LESSON", "level", "topic", "ANS", "image",
+              ":", " ", "\n", "|", '"', "A)", "b)", "C)", "A", "c", "x", "help", "publish", "cancel"]
+    parser, legacy = CommandParser(), LegacyCommandParser()
+    for _ in range(3000):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 20)))
+        assert parser.parse(text) == legacy.parse(text), text
+
+
+def test_pathological_quiz_is_rejected() -> None:
+    # Its parse time is tracked by the parse.pathological case of bench_regress.
+    text = 'ADD QUIZ: "q" | A) ' + " " * 20_000 + "x"
+    assert parse_command(text).type is CommandType.UNKNOWN
+
+
+def test_parse_many_splits_pasted_commands_and_keeps_multiline_bodies() -> None:
+    text = (
+        "NEW LESSON: Tides | Level: Grade 7 | Topic: Science\n"
+        "ADD BODY: # Tides\n"
+        "\n"
+        "The moon pulls the sea.\n"
+        "Publishing this soon.\n"
+        'ADD QUIZ: "What pulls the sea?" | A) Moon | B) Sun | C) Wind | ANS: A\n'
+        "publish\n"
+    )
+    commands = CommandParser().parse_many(text)
+    assert [command.type for command in commands] == [
+        CommandType.NEW_LESSON,
+        CommandType.ADD_BODY,
+        CommandType.ADD_QUIZ,
+        CommandType.PUBLISH,
+    ]
+    assert commands[1].payload["body"] == "# Tides\n\nThe moon pulls the sea.\nPublishing this soon."
+
+
+@pytest.mark.parametrize("word", ["Help", "Publish", "Cancel", "  PUBLISH  "])
+def test_parse_many_keeps_bare_keywords_inside_a_body(word: str) -> None:
+    text = f"ADD BODY: # Steps\nFirst read.\n{word}\nThen write."
+    parser = CommandParser()
+    assert parser.parse_many(text) == [parser.parse(text)]
+    assert parser.parse_many(text)[0].payload["body"] == f"# Steps\nFirst read.\n{word}\nThen write."
+
+    batch = parser.parse_many(f"NEW LESSON: Steps | Level: Grade 5 | Topic: Writing\n{text}\nADD MEDIA: image")
+    assert [command.type for command in batch] == [CommandType.NEW_LESSON, CommandType.ADD_BODY, CommandType.ADD_MEDIA]
+    assert batch[1].payload["body"].endswith(f"{word}\nThen write.")
+
+
+def test_parse_many_single_command_matches_parse() -> None:
+    parser = CommandParser()
+    for text in ("ADD BODY: Help\nwanted", "  help  ", "nonsense", ""):
+        assert parser.parse_many(text) == [parser.parse(text)]
+    leading = parser.parse_many("hello\nHELP")
+    assert [command.type for command in leading] == [CommandType.UNKNOWN, CommandType.HELP]
@@ -0,0 +1,46 @@
+"""Tests for the message-id dedup stores."""
+from __future__ import annotations
+
+from pathlib import Path
+
+from bot.core.dedup import InMemoryDedupStore, SQLiteDedupStore, build_dedup_store
+from bot.core.metrics import DEDUP_CHECKS, REGISTRY
+
+
+def test_memory_store_counts_hits_and_expires(monkeypatch) -> None:
+    clock = [1000.0]
+    monkeypatch.setattr("bot.core.dedup.time.time", lambda: clock[0])
+    hits, misses = DEDUP_CHECKS.value("hit"), DEDUP_CHECKS.value("miss")
+    store = InMemoryDedupStore(ttl_seconds=60, max_entries=10)
+    assert store.check_and_mark("wamid.1")
+    assert not store.check_and_mark("wamid.1")
+    clock[0] += 61
+    assert store.check_and_mark("wamid.1")
+    assert store.stats() == {"hits": 1, "misses": 2, "size": 1}
+    assert (DEDUP_CHECKS.value("hit"), DEDUP_CHECKS.value("miss")) == (hits + 1, misses + 2)
+    assert 'bot_dedup_checks_total{result="hit"}' in REGISTRY.render()
+
+
+def test_memory_store_is_bounded() -> None:
+    store = InMemoryDedupStore(ttl_seconds=60, max_entries=3)
+    for index in range(5):
+        store.check_and_mark(f"wamid.{index}")
+    assert len(store) == 3
+    assert store.check_and_mark("wamid.0")
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path: Path) -> None:
+    path = str(tmp_path / "dedup.sqlite3")
+    first = SQLiteDedupStore(path, ttl_seconds=60)
+    second = SQLiteDedupStore(path, ttl_seconds=60)
+    assert first.check_and_mark("wamid.A")
+    assert not second.check_and_mark("wamid.A")
+    second.discard("wamid.A")
+    assert first.check_and_mark("wamid.A")
+    first.close()
+    second.close()
+
+
+def test_build_dedup_store_none_disables_dedup() -> None:
+    assert build_dedup_store("none", 60, 10, "") is None
+    assert isinstance(build_dedup_store("memory", 60, 10, ""), InMemoryDedupStore)
@@ -0,0 +1,167 @@
+"""Tests for bulk lesson imports."""
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+from typing import Dict, List, Optional
+
+from bot.core.importer import LessonImporter, detect_format
+from bot.core.uow import MessageWrites
+
+
+class FakeSupabase:
+    def __init__(self, fail_batches: int = 0) -> None:
+        self.lessons: List[Dict] = []
+        self.batches: List[MessageWrites] = []
+        self.fail_batches = fail_batches
+
+    def create_lesson(self, title: str, level: str, topic: str, author_phone: str) -> Optional[Dict]:
+        lesson = {"id": f"lesson-{len(self.lessons) + 1}", "title": title, "level": level, "topic": topic}
+        self.lessons.append(lesson)
+        return lesson
+
+    def apply_message_writes(self, writes: MessageWrites) -> bool:
+        self.batches.append(writes)
+        if self.fail_batches:
+            self.fail_batches -= 1
+            return False
+        return True
+
+
+MARKDOWN = """---
+title: Tides
+level: Grade 7
+topic: Science
+---
+# Tides
+
+The moon pulls the sea.
+
+ADD QUIZ: "What pulls the sea?" | A) Moon | B) Sun | C) Wind | ANS: A
+ADD QUIZ: "Broken" | A) Moon | B) | C) Wind | ANS: A
+MEDIA: image https://cdn.example/tide.png High tide
+MEDIA: gif https://cdn.example/tide.gif
+
+High tide happens twice a day.
+"""
+
+
+def _run(importer: LessonImporter, text: str, fmt: str = "markdown"):
+    return asyncio.run(importer.run(io.BytesIO(text.encode()), "+1555", fmt))
+
+
+def test_markdown_import_bulk_writes_and_reports_per_line_errors() -> None:
+    supabase = FakeSupabase()
+    report = _run(LessonImporter(supabase), MARKDOWN)
+
+    assert supabase.lessons[0]["title"] == "Tides"
+    assert report.lesson_id == "lesson-1"
+    assert (report.body_chunks, report.quizzes, report.media) == (1, 1, 1)
+    assert [(issue.line, issue.message) for issue in report.errors] == [
+        (11, "ADD QUIZ requires three answer options."),
+        (13, "Media kind must be image, audio or video."),
+    ]
+    assert len(supabase.batches) == 1
+    batch = supabase.batches[0]
+    assert batch.body_appends[0]["markdown"].startswith("# Tides\n\nThe moon pulls the sea.\n\n\n")
+    assert batch.body_appends[0]["markdown"].endswith("High tide happens twice a day.\n")
+    assert batch.quizzes[0]["answer_idx"] == 0
+    assert batch.media[0] == {"lesson_id": "lesson-1", "kind": "image", "url": "https://cdn.example/tide.png", "caption": "High tide"}
+    assert "Line 11" in report.summary()
+
+
+def test_large_imports_are_flushed_in_bounded_batches() -> None:
+    supabase = FakeSupabase()
+    importer = LessonImporter(supabase, flush_rows=4)
+    importer.BODY_CHUNK_CHARS = 16
+    paragraphs = "\n".join(f"Paragraph {index} has some words.\n" for index in range(10))
+    report = _run(importer, "---\ntitle: Long\nlevel: 1\ntopic: x\n---\n" + paragraphs)
+
+    assert report.body_chunks == 10 and not report.errors
+    assert [len(batch) for batch in supabase.batches] == [4, 4, 2]
+
+
+def test_failed_flush_is_reported_with_its_line_range() -> None:
+    supabase = FakeSupabase(fail_batches=1)
+    lines = [{"type": "lesson", "title": "Maths", "level": "1", "topic": "Numbers"}]
+    lines += [{"type": "quiz", "prompt": f"{n}+{n}?", "options": ["1", "2", str(2 * n)], "answer": "C"} for n in range(3)]
+    report = _run(LessonImporter(supabase, flush_rows=2), "\n".join(json.dumps(line) for line in lines), "jsonl")
+
+    assert report.quizzes == 1
+    assert [(issue.line, issue.message) for issue in report.errors] == [
+        (2, "Could not save lines 2-3. Please retry them.")
+    ]
+
+
+def test_jsonl_import_validates_each_line() -> None:
+    supabase = FakeSupabase()
+    text = "\n".join(
+        [
+            json.dumps({"type": "body", "markdown": "Too early"}),
+            json.dumps({"type": "lesson", "title": "Maths", "level": "1", "topic": "Numbers"}),
+            json.dumps({"type": "body", "markdown": "Count to ten."}),
+            json.dumps({"type": "quiz", "prompt": "1+1?", "options": ["1", "2", "3"], "answer": "D"}),
+            "{not json",
+            json.dumps({"type": "media", "kind": "video", "url": "https://cdn.example/count.mp4"}),
+            json.dumps({"type": "lesson", "title": "Again", "level": "1", "topic": "x"}),
+        ]
+    )
+    report = _run(LessonImporter(supabase), text, "jsonl")
+
+    assert report.lesson_id == "lesson-1" and len(supabase.lessons) == 1
+    assert (report.body_chunks, report.quizzes, report.media) == (1, 0, 1)
+    assert [issue.line for issue in report.errors] == [1, 4, 5, 7]
+    assert report.errors[1].message == "ADD QUIZ answer must be A, B or C."
+
+
+def test_missing_front_matter_fails_without_creating_a_lesson() -> None:
+    supabase = FakeSupabase()
+    report = _run(LessonImporter(supabase), "# Just a body\n")
+    assert report.lesson_id is None and supabase.lessons == []
+    assert report.summary().startswith("Import failed.")
+
+
+def test_json_document_import_reads_an_array_and_falls_back_to_lines() -> None:
+    items = [
+        {"type": "lesson", "title": "Maths", "level": "1", "topic": "Numbers"},
+        {"type": "body", "markdown": "Count to ten."},
+        {"type": "quiz", "prompt": "1+1?", "options": ["1", "2", "3"], "answer": "B"},
+        "not an object",
+    ]
+    supabase = FakeSupabase()
+    report = _run(LessonImporter(supabase), json.dumps(items, indent=2), "json")
+    assert report.lesson_id == "lesson-1" and (report.body_chunks, report.quizzes) == (1, 1)
+    assert [(issue.line, issue.message) for issue in report.errors] == [(4, "Each item must be a JSON object.")]
+
+    lines = "\n".join(json.dumps(item) for item in items[:3])
+    assert _run(LessonImporter(FakeSupabase()), lines, "json").quizzes == 1
+
+    single = _run(LessonImporter(FakeSupabase()), json.dumps(items[0]), "json")
+    assert single.lesson_id is None and "use .jsonl" in single.errors[0].message
+
+
+def test_json_document_import_decodes_one_item_at_a_time(monkeypatch) -> None:
+    import bot.core.importer as importer
+
+    monkeypatch.setattr(importer, "_JSON_READ_CHARS", 7)
+    items = [{"type": "lesson", "title": "Maths", "level": "1", "topic": "Numbers"}]
+    items += [{"type": "quiz", "prompt": f"{n}+1?", "options": ["1", "2", "3"], "answer": "B"} for n in range(40)]
+    items.append(12345)
+    report = _run(LessonImporter(FakeSupabase()), json.dumps(items, indent=1), "json")
+    assert report.quizzes == 40
+    assert [(issue.line, issue.message) for issue in report.errors] == [(42, "Each item must be a JSON object.")]
+
+    truncated = _run(LessonImporter(FakeSupabase()), json.dumps(items[:3])[:-20], "json")
+    assert truncated.quizzes == 1
+    assert [(issue.line, issue.message) for issue in truncated.errors] == [(3, "Not valid JSON.")]
+
+    assert _run(LessonImporter(FakeSupabase()), "  [ ]", "json").lesson_id is None
+
+
+def test_detect_format() -> None:
+    assert detect_format("lesson.jsonl", None) == "jsonl"
+    assert detect_format("lesson.json", None) == "json"
+    assert detect_format(None, "application/json; charset=utf-8") == "json"
+    assert detect_format(None, "application/x-ndjson") == "jsonl"
+    assert detect_format("lesson.md", "text/markdown") == "markdown"
@@ -0,0 +1,76 @@
+"""Tests for the sharded ingestion queue."""
+from __future__ import annotations
+
+import asyncio
+from typing import List, Tuple
+
+from bot.core.ingest import IngestQueue
+from bot.integrations.whatsapp import InboundMessage
+
+
+def _message(sender: str, message_id: str) -> InboundMessage:
+    return InboundMessage(sender=sender, message_id=message_id, type="text", text="help")
+
+
+def test_messages_from_one_sender_run_in_order() -> None:
+    handled: List[Tuple[str, str]] = []
+
+    async def handler(message: InboundMessage) -> None:
+        # Later messages finish faster; ordering must still hold per sender.
+        await asyncio.sleep(0.01 / int(message.message_id))
+        handled.append((message.sender, message.message_id))
+
+    async def scenario() -> None:
+        queue = IngestQueue(handler, workers=4, max_depth=100)
+        await queue.start()
+        for index in range(1, 6):
+            assert queue.submit(_message("+1555", str(index)))
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert [message_id for _, message_id in handled] == ["1", "2", "3", "4", "5"]
+
+
+def test_different_senders_are_processed_in_parallel() -> None:
+    async def scenario() -> float:
+        async def handler(message: InboundMessage) -> None:
+            await asyncio.sleep(0.05)
+
+        queue = IngestQueue(handler, workers=8, max_depth=100)
+        await queue.start()
+        senders = [f"+1555000{index}" for index in range(8)]
+        assert len({queue.shard_for(sender) for sender in senders}) > 1
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for sender in senders:
+            queue.submit(_message(sender, "1"))
+        await queue.stop()
+        return loop.time() - started
+
+    assert asyncio.run(scenario()) < 0.05 * 8
+
+
+def test_full_shard_rejects_and_handler_errors_are_isolated() -> None:
+    handled: List[str] = []
+    release = asyncio.Event()
+
+    async def handler(message: InboundMessage) -> None:
+        await release.wait()
+        if message.message_id == "1":
+            raise RuntimeError("boom")
+        handled.append(message.message_id)
+
+    async def scenario() -> None:
+        queue = IngestQueue(handler, workers=1, max_depth=2)
+        await queue.start()
+        assert queue.submit(_message("+1555", "1"))
+        await asyncio.sleep(0)  # let the worker take the first message
+        assert queue.submit(_message("+1555", "2"))
+        assert queue.submit(_message("+1555", "3"))
+        assert not queue.submit(_message("+1555", "4"))
+        release.set()
+        await queue.stop(drain=True)
+        assert not queue.running
+
+    asyncio.run(scenario())
+    assert handled == ["2", "3"]
@@ -0,0 +1,75 @@
+"""Tests for append-only lesson body updates."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from bot.integrations.supabase_client import SupabaseService
+from bot.tests.conftest import FakePostgrest, FakeQuery
+
+
+def _client(rpc_installed: bool = True, concurrent_edits: int = 0) -> FakePostgrest:
+    client = FakePostgrest(tables={"lessons": [{"id": "lesson-1", "body_md": "Intro", "updated_at": "t0", "body_version": 0}]})
+    lesson = client.rows("lessons")[0]
+
+    def append_lesson_body(params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        expected = params["p_expected_version"]
+        if expected is not None and expected != lesson["body_version"]:
+            return []
+        lesson["body_md"] = f"{lesson['body_md']}\n\n{params['p_chunk']}"
+        lesson["body_version"] += 1
+        return [{"new_version": lesson["body_version"]}]
+
+    def land_concurrent_edit(query: FakeQuery) -> None:
+        # Another writer lands between our read and our write.
+        nonlocal concurrent_edits
+        if query.action == "update" and concurrent_edits:
+            concurrent_edits -= 1
+            lesson["body_md"] += "\n\nTheirs"
+            lesson["updated_at"] = "t-theirs"
+
+    if rpc_installed:
+        client.rpcs["append_lesson_body"] = append_lesson_body
+    client.on_execute = land_concurrent_edit
+    return client
+
+
+def _service(client: FakePostgrest) -> SupabaseService:
+    return SupabaseService(SimpleNamespace(), client=client)
+
+
+def _rpc_calls(client: FakePostgrest) -> List[Dict[str, Any]]:
+    return [request[2] for request in client.requests if request[0] == "rpc"]
+
+
+def _reads(client: FakePostgrest) -> int:
+    return client.actions().count(("lessons", "select"))
+
+
+def test_add_body_sends_only_the_sanitised_chunk() -> None:
+    client = _client()
+    service = _service(client)
+    assert service.update_lesson_body("lesson-1", "  Part <script>two</script>  ")
+    assert _rpc_calls(client) == [{"p_lesson_id": "lesson-1", "p_chunk": "Part two", "p_expected_version": None}]
+    assert _reads(client) == 0
+    assert client.rows("lessons")[0]["body_md"] == "Intro\n\nPart two"
+
+
+def test_expected_version_mismatch_returns_none() -> None:
+    client = _client()
+    service = _service(client)
+    assert service.append_lesson_body("lesson-1", "One", expected_version=0) == 1
+    assert service.append_lesson_body("lesson-1", "Stale", expected_version=0) is None
+    assert client.rows("lessons")[0]["body_md"] == "Intro\n\nOne"
+
+
+def test_missing_rpc_falls_back_to_compare_and_swap() -> None:
+    client = _client(rpc_installed=False, concurrent_edits=1)
+    service = _service(client)
+    assert service.update_lesson_body("lesson-1", "Mine")
+    # The concurrent edit is kept rather than overwritten.
+    assert client.rows("lessons")[0]["body_md"] == "Intro\n\nTheirs\n\nMine"
+    assert _reads(client) == 2
+
+    assert service.update_lesson_body("lesson-1", "More")
+    assert len(_rpc_calls(client)) == 1  # the RPC is not retried once known missing
@@ -0,0 +1,62 @@
+"""Tests for the structured logging pipeline."""
+from __future__ import annotations
+
+import io
+import json
+import logging
+
+import pytest
+
+from bot.core import logs
+from bot.core.logs import JsonFormatter, SamplingFilter, parse_sampling, setup_logging, stop_logging
+
+
+def _record(name: str = "bot.test", level: int = logging.INFO, **extra) -> logging.LogRecord:
+    record = logging.LogRecord(name, level, __file__, 1, "Saved %s", ("lesson",), None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_formatter_truncates_large_fields_and_uses_record_time() -> None:
+    record = _record(payload={"body_md": "x" * 50, "title": "Rain"}, error="short")
+    record.created = 0.0
+    line = json.loads(JsonFormatter(max_field_chars=10, fast_json=False).format(record))
+    assert line["timestamp"] == "1970-01-01T00:00:00+00:00"
+    assert line["message"] == "Saved lesson"
+    assert line["payload"] == {"body_md": "xxxxxxxxxx...[truncated 40 chars]", "title": "Rain"}
+    assert line["error"] == "short"
+
+
+@pytest.mark.skipif(logs.orjson is None, reason="orjson is not installed")
+def test_fast_encoder_matches_stdlib_output() -> None:
+    record = _record(sender="+1555", count=3, nested={"ok": True})
+    fast = json.loads(JsonFormatter(fast_json=True).format(record))
+    slow = json.loads(JsonFormatter(fast_json=False).format(record))
+    assert fast == slow
+
+
+def test_sampling_keeps_warnings_and_applies_to_child_loggers() -> None:
+    sampler = SamplingFilter(parse_sampling("httpx=0, bot.core.router=1"))
+    assert not sampler.filter(_record("httpx._client"))
+    assert sampler.filter(_record("httpx", level=logging.WARNING))
+    assert sampler.filter(_record("bot.core.router"))
+    assert sampler.filter(_record("bot.app"))
+    with pytest.raises(ValueError):
+        parse_sampling("httpx=often")
+
+
+def test_queue_handler_writes_on_the_listener_thread() -> None:
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    stream = io.StringIO()
+    try:
+        setup_logging(stream=stream, sampling={"noisy": 0.0})
+        logging.getLogger("noisy").info("dropped")
+        logging.getLogger("bot.test").info("Kept %d", 1, extra={"body": "y" * 5000})
+        stop_logging()
+    finally:
+        root.handlers[:] = saved_handlers
+        root.setLevel(saved_level)
+    [line] = [json.loads(text) for text in stream.getvalue().splitlines()]
+    assert line["message"] == "Kept 1"
+    assert line["body"].endswith("...[truncated 3000 chars]")
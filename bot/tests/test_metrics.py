@@ -0,0 +1,69 @@
+"""Tests for the in-process metrics registry."""
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from bot.core.aio import call_io
+from bot.core.metrics import DEPENDENCY_SECONDS, MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    registry = MetricsRegistry()
+    histogram = registry.histogram("demo_seconds", "Demo latency.", ("command",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "help")
+    histogram.observe(0.5, "help")
+    histogram.observe(5.0, "help")
+    counter = registry.counter("demo_total", "Demo count.")
+    counter.inc()
+
+    text = registry.render()
+    assert "# TYPE demo_seconds histogram" in text
+    assert 'demo_seconds_bucket{command="help",le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{command="help",le="1"} 2' in text
+    assert 'demo_seconds_bucket{command="help",le="+Inf"} 3' in text
+    assert 'demo_seconds_count{command="help"} 3' in text
+    assert "demo_total 1" in text.splitlines()
+    with pytest.raises(ValueError):
+        histogram.observe(1.0)
+
+
+def test_samples_from_many_threads_are_all_counted() -> None:
+    registry = MetricsRegistry()
+    counter = registry.counter("threads_total", "Per-thread increments.", ("kind",))
+
+    def work() -> None:
+        for _ in range(1000):
+            counter.inc("x")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.value("x") == 8000
+
+
+class NamedDependency:
+    metrics_name = "fake"
+
+    def fetch(self) -> str:
+        return "ok"
+
+    async def fail(self) -> None:
+        raise RuntimeError("down")
+
+
+def test_call_io_times_named_dependencies() -> None:
+    dependency = NamedDependency()
+    before_ok = DEPENDENCY_SECONDS.count("fake", "fetch", "ok")
+    before_error = DEPENDENCY_SECONDS.count("fake", "fail", "error")
+
+    assert asyncio.run(call_io(dependency.fetch)) == "ok"
+    with pytest.raises(RuntimeError):
+        asyncio.run(call_io(dependency.fail))
+
+    assert DEPENDENCY_SECONDS.count("fake", "fetch", "ok") == before_ok + 1
+    assert DEPENDENCY_SECONDS.count("fake", "fail", "error") == before_error + 1
@@ -0,0 +1,122 @@
+"""Tests for the paced outbound reply queue."""
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+import httpx
+
+from bot.core.metrics import OUTBOUND_QUEUE_SECONDS, OUTBOUND_REPLIES, REGISTRY
+from bot.core.outbound import OutboundSender, retry_after_seconds
+from bot.core.ratelimit import SQLiteRateLimiter
+
+
+@dataclass
+class PhoneSettings:
+    whatsapp_phone_number_id: str = "1234"
+
+
+@dataclass
+class ScriptedWhatsApp:
+    responses: List[httpx.Response] = field(default_factory=list)
+    settings: PhoneSettings = field(default_factory=PhoneSettings)
+    sent: List[Tuple[str, str, float]] = field(default_factory=list)
+
+    async def post_text_message(self, recipient: str, text: str) -> httpx.Response:
+        self.sent.append((recipient, text, time.monotonic()))
+        return self.responses.pop(0) if self.responses else httpx.Response(200, json={})
+
+
+def _run(sender: OutboundSender, messages: List[Tuple[str, str]]) -> List[bool]:
+    async def scenario() -> List[bool]:
+        await sender.start()
+        accepted = [sender.enqueue(recipient, text) for recipient, text in messages]
+        await sender.stop(drain=True, timeout=5)
+        return accepted
+
+    return asyncio.run(scenario())
+
+
+def test_replies_keep_per_recipient_order_and_record_latency() -> None:
+    whatsapp = ScriptedWhatsApp()
+    sender = OutboundSender(whatsapp, rate_per_sec=1000, burst=100, workers=4)
+    sent, observed = OUTBOUND_REPLIES.value("sent"), OUTBOUND_QUEUE_SECONDS.count()
+    _run(sender, [("+1", "a"), ("+2", "x"), ("+1", "b"), ("+1", "c")])
+    assert [text for recipient, text, _ in whatsapp.sent if recipient == "+1"] == ["a", "b", "c"]
+    stats = sender.stats()
+    assert stats["sent"] == 4 and stats["dropped"] == 0
+    assert stats["latency_p95_sec"] is not None
+    assert (OUTBOUND_REPLIES.value("sent"), OUTBOUND_QUEUE_SECONDS.count()) == (sent + 4, observed + 4)
+    assert "bot_outbound_queue_seconds_bucket" in REGISTRY.render()
+
+
+def test_token_bucket_paces_sends() -> None:
+    whatsapp = ScriptedWhatsApp()
+    sender = OutboundSender(whatsapp, rate_per_sec=50, burst=1, workers=2)
+    _run(sender, [(f"+{index}", "hi") for index in range(6)])
+    times = sorted(sent_at for _, _, sent_at in whatsapp.sent)
+    assert times[-1] - times[0] >= 5 / 50 * 0.9
+
+
+def test_429_honours_retry_after_and_5xx_is_retried() -> None:
+    whatsapp = ScriptedWhatsApp(
+        responses=[
+            httpx.Response(429, headers={"Retry-After": "0.2"}),
+            httpx.Response(503),
+            httpx.Response(200, json={}),
+        ]
+    )
+    sender = OutboundSender(whatsapp, rate_per_sec=1000, burst=10)
+    sender.BACKOFF_BASE_SECONDS = 0.01
+    _run(sender, [("+1", "hello")])
+    assert len(whatsapp.sent) == 3
+    assert whatsapp.sent[1][2] - whatsapp.sent[0][2] >= 0.2
+    assert sender.stats()["retried"] == 2 and sender.sent == 1
+
+
+def test_permanent_errors_and_exhausted_retries_count_as_failed() -> None:
+    whatsapp = ScriptedWhatsApp(responses=[httpx.Response(400)] + [httpx.Response(500)] * 2)
+    sender = OutboundSender(whatsapp, rate_per_sec=1000, burst=10, workers=1, max_attempts=2)
+    sender.BACKOFF_BASE_SECONDS = 0.01
+    _run(sender, [("+1", "bad"), ("+1", "flaky")])
+    assert len(whatsapp.sent) == 3
+    assert sender.failed == 2 and sender.sent == 0
+
+
+def test_full_queue_drops_and_counts() -> None:
+    whatsapp = ScriptedWhatsApp()
+    sender = OutboundSender(whatsapp, rate_per_sec=1000, burst=10, max_depth=2, workers=1)
+    accepted = _run(sender, [("+1", str(index)) for index in range(4)])
+    assert accepted.count(False) == sender.stats()["dropped"] >= 1
+
+
+def test_shared_pacer_holds_every_process_to_one_rate(tmp_path) -> None:
+    path = str(tmp_path / "outbound.sqlite3")
+    whatsapp = ScriptedWhatsApp()
+    senders = [
+        OutboundSender(whatsapp, rate_per_sec=1000, burst=10, pacer=SQLiteRateLimiter(path, 1, 1 / 50))
+        for _ in range(2)
+    ]
+
+    async def scenario() -> None:
+        for sender in senders:
+            await sender.start()
+        for index in range(6):
+            senders[index % 2].enqueue(f"+{index}", "hi")
+        for sender in senders:
+            await sender.stop(drain=True, timeout=5)
+
+    asyncio.run(scenario())
+    times = sorted(sent_at for _, _, sent_at in whatsapp.sent)
+    assert len(times) == 6
+    assert times[-1] - times[0] >= 5 / 50 * 0.9
+
+
+def test_retry_after_accepts_http_dates() -> None:
+    response = httpx.Response(429, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+    assert retry_after_seconds(response) == 0.0
+    assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "3"})) == 3.0
+    assert retry_after_seconds(httpx.Response(429)) is None
+
@@ -0,0 +1,91 @@
+"""Tests for the durable revalidation outbox."""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Dict, List
+
+from bot.core.outbox import RevalidationOutbox
+
+
+class ScriptedRevalidator:
+    def __init__(self, statuses: List[int]) -> None:
+        self.statuses = statuses
+        self.calls: List[List[str]] = []
+
+    def trigger(self, paths: List[str]) -> List[Dict]:
+        self.calls.append(list(paths))
+        status = self.statuses.pop(0) if self.statuses else 200
+        return [{"path": path, "status": status, "body": {}} for path in paths]
+
+
+def test_repeated_requests_within_window_are_sent_once() -> None:
+    outbox = RevalidationOutbox(":memory:", debounce_seconds=0)
+    for _ in range(5):
+        outbox.enqueue("/lessons/gravity", lesson_id="lesson-1")
+    outbox.enqueue("/lessons/tides")
+    revalidator = ScriptedRevalidator([])
+
+    assert asyncio.run(outbox.dispatch_due(revalidator)) == 2
+    assert sorted(revalidator.calls[0]) == ["/lessons/gravity", "/lessons/tides"]
+    assert len(outbox) == 0
+
+
+def test_debounce_delays_the_first_attempt() -> None:
+    outbox = RevalidationOutbox(":memory:", debounce_seconds=60)
+    outbox.enqueue("/lessons/gravity")
+    assert outbox.claim_due() == []
+    assert [row["path"] for row in outbox.claim_due(now=time.time() + 61)] == ["/lessons/gravity"]
+
+
+def test_failures_back_off_then_park_as_failed() -> None:
+    outbox = RevalidationOutbox(":memory:", debounce_seconds=0, max_attempts=2)
+    outbox.enqueue("/lessons/gravity")
+    revalidator = ScriptedRevalidator([503, 503])
+
+    assert asyncio.run(outbox.dispatch_due(revalidator)) == 0
+    pending = outbox.report()["pending"]
+    assert pending[0]["attempts"] == 1 and pending[0]["last_error"].startswith("503")
+    assert outbox.claim_due() == []  # backing off
+
+    outbox.mark_failed("/lessons/gravity", "503: {}")
+    report = outbox.report()
+    assert report["pending"] == []
+    assert report["failed"][0]["attempts"] == 2
+
+    # A fresh request revives a parked entry.
+    outbox.enqueue("/lessons/gravity")
+    assert outbox.report()["pending"][0]["attempts"] == 0
+    assert outbox.backoff(1) == 2.0 and outbox.backoff(20) == outbox.BACKOFF_MAX_SECONDS
+
+
+def test_request_arriving_mid_flight_is_not_lost() -> None:
+    outbox = RevalidationOutbox(":memory:", debounce_seconds=0)
+    outbox.enqueue("/lessons/gravity")
+    (claimed,) = outbox.claim_due()
+    outbox.enqueue("/lessons/gravity")
+    outbox.mark_delivered(claimed["path"], claimed["version"])
+    assert [row["path"] for row in outbox.claim_due()] == ["/lessons/gravity"]
+
+
+class ThreadRecordingOutbox(RevalidationOutbox):
+    def __init__(self) -> None:
+        super().__init__(":memory:", debounce_seconds=0)
+        self.threads: List[str] = []
+
+    def claim_due(self, limit: int = 50, now=None) -> List[Dict]:
+        self.threads.append(threading.current_thread().name)
+        return super().claim_due(limit, now)
+
+    def mark_delivered(self, path: str, version: int) -> None:
+        self.threads.append(threading.current_thread().name)
+        super().mark_delivered(path, version)
+
+
+def test_dispatch_runs_sqlite_calls_off_the_event_loop() -> None:
+    outbox = ThreadRecordingOutbox()
+    outbox.enqueue("/lessons/gravity")
+
+    assert asyncio.run(outbox.dispatch_due(ScriptedRevalidator([]))) == 1
+    assert len(outbox.threads) == 2 and threading.main_thread().name not in outbox.threads
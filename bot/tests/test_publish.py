@@ -0,0 +1,100 @@
+"""Tests for the single-round-trip PUBLISH path."""
+from __future__ import annotations
+
+import asyncio
+import os
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Iterable, Type
+
+import pytest
+
+from bot.integrations.supabase_client import AsyncSupabaseService, SupabaseService
+from bot.tests.conftest import AsyncFakePostgrest, FakePostgrest, FakeQuery
+
+SCHEMA = Path(__file__).resolve().parents[1] / "db" / "schema.sql"
+
+
+def _client(rpc_installed: bool = True, claimed_elsewhere: Iterable[str] = (), cls: Type[FakePostgrest] = FakePostgrest) -> Any:
+    lessons = [
+        {"id": "lesson-0", "title": "Greetings", "status": "published", "slug": "greetings"},
+        {"id": "lesson-1", "title": "Greetings", "body_md": "", "status": "draft", "slug": None},
+    ]
+    published = [{"slug": "greetings-2", "title": "Greetings", "publish_id": "publish-1"}]
+    client = cls(
+        tables={"lessons": lessons},
+        rpcs={"publish_lesson_atomic": lambda params: published} if rpc_installed else {},
+        unique=[("lessons", "slug")],
+    )
+    claimed = set(claimed_elsewhere)
+
+    def claim_first(query: FakeQuery) -> None:
+        # Another process publishes under the slug just before this update lands.
+        slug = (query.payload or {}).get("slug")
+        if query.action == "update" and slug in claimed:
+            claimed.discard(slug)
+            client.rows("lessons").append({"id": "lesson-elsewhere", "slug": slug})
+
+    client.on_execute = claim_first
+    return client
+
+
+def test_publish_is_one_rpc_and_warms_the_slug_index() -> None:
+    client = _client()
+    service = SupabaseService(SimpleNamespace(), client=client)
+    service.slugs.load("greetings", ["greetings"])
+
+    published = service.publish_lesson_atomic("lesson-1", "+1555", "whatsapp", {"revalidation": "queued"})
+    assert published == {"slug": "greetings-2", "title": "Greetings", "publish_id": "publish-1"}
+    assert client.actions() == [("rpc", "publish_lesson_atomic")]
+    assert service.slugs.get("greetings") == {"greetings", "greetings-2"}
+
+
+def test_missing_rpc_falls_back_to_sequential_publish_with_slug_retry() -> None:
+    client = _client(rpc_installed=False, claimed_elsewhere=["greetings-2"])
+    service = SupabaseService(SimpleNamespace(), client=client)
+
+    published = service.publish_lesson_atomic("lesson-1", "+1555", "whatsapp", {"revalidation": "inline"})
+    assert published == {"slug": "greetings-3", "title": "Greetings", "publish_id": "publishes-1"}
+    assert client.rows("lessons")[1]["status"] == "published"
+    assert client.rows("publishes")[0]["result"] == {"revalidation": "inline", "path": "/lessons/greetings-3"}
+    state = client.rows("chat_state")[0]
+    assert state["active_lesson"] is None and state["last_cmd"] == "publish"
+
+    client.requests.clear()
+    service.publish_lesson_atomic("lesson-1", "+1555", "whatsapp", {})
+    assert ("rpc", "publish_lesson_atomic") not in client.actions()
+
+
+def test_async_service_runs_the_same_fallback_publish() -> None:
+    client = _client(rpc_installed=False, claimed_elsewhere=["greetings-2"], cls=AsyncFakePostgrest)
+    service = AsyncSupabaseService(SimpleNamespace(), client=client)
+
+    published = asyncio.run(service.publish_lesson_atomic("lesson-1", "+1555", "whatsapp", {"revalidation": "inline"}))
+    assert published == {"slug": "greetings-3", "title": "Greetings", "publish_id": "publishes-1"}
+    assert client.rows("publishes")[0]["result"] == {"revalidation": "inline", "path": "/lessons/greetings-3"}
+    assert client.rows("chat_state")[0]["last_cmd"] == "publish"
+    assert not service._publish_rpc_available
+
+
+@pytest.mark.skipif(not os.environ.get("BOT_TEST_POSTGRES_DSN"), reason="set BOT_TEST_POSTGRES_DSN to run")
+def test_publish_function_against_local_postgres() -> None:
+    psycopg = pytest.importorskip("psycopg")
+    with psycopg.connect(os.environ["BOT_TEST_POSTGRES_DSN"]) as conn:
+        conn.execute(SCHEMA.read_text())
+        lesson_ids = [
+            conn.execute("insert into lessons (title) values ('Greetings!') returning id").fetchone()[0]
+            for _ in range(2)
+        ]
+        slugs = [
+            conn.execute("select slug from publish_lesson_atomic(%s, '+1555')", (lesson_id,)).fetchone()[0]
+            for lesson_id in lesson_ids
+        ]
+        assert slugs == ["greetings", "greetings-2"]
+        assert conn.execute(
+            "select count(*) from publishes where lesson_id = any(%s)", (lesson_ids,)
+        ).fetchone()[0] == 2
+        assert conn.execute(
+            "select active_lesson, last_cmd from chat_state where sender_phone = '+1555'"
+        ).fetchone() == (None, "publish")
+        conn.rollback()
@@ -0,0 +1,83 @@
+"""Tests for the rate limiters."""
+from __future__ import annotations
+
+import pytest
+
+from bot.core.ratelimit import GCRARateLimiter, RateLimiter, SQLiteRateLimiter, build_rate_limiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("bot.core.ratelimit.time.monotonic", lambda: now[0])
+    return now
+
+
+def test_gcra_allows_burst_then_refills_smoothly(clock) -> None:
+    limiter = GCRARateLimiter(max_events=3, window_seconds=3)
+    assert [limiter.allow("+1") for _ in range(4)] == [True, True, True, False]
+    clock[0] += 1.0
+    assert limiter.allow("+1")
+    assert not limiter.allow("+1")
+    assert limiter.allow("+2")
+
+
+def test_gcra_sweeps_idle_senders(clock) -> None:
+    limiter = GCRARateLimiter(max_events=5, window_seconds=10, stripes=4, sweep_interval=30)
+    for index in range(100):
+        limiter.allow(f"+{index}")
+    assert len(limiter) == 100
+    clock[0] += 31
+    assert limiter.sweep() == 100
+    assert len(limiter) == 0
+
+
+def test_gcra_sweeps_stripe_lazily_on_allow(clock) -> None:
+    limiter = GCRARateLimiter(max_events=5, window_seconds=10, stripes=1, sweep_interval=30)
+    for index in range(10):
+        limiter.allow(f"+{index}")
+    clock[0] += 31
+    limiter.allow("+fresh")
+    assert len(limiter) == 1
+
+
+def test_build_rate_limiter_selects_algorithm() -> None:
+    assert isinstance(build_rate_limiter("sliding", 5, 60), RateLimiter)
+    assert isinstance(build_rate_limiter("gcra", 5, 60), GCRARateLimiter)
+    with pytest.raises(ValueError):
+        build_rate_limiter("leaky", 5, 60)
+
+
+def test_sqlite_limiter_is_shared_between_processes(tmp_path, monkeypatch) -> None:
+    now = [5000.0]
+    monkeypatch.setattr("bot.core.ratelimit.time.time", lambda: now[0])
+    path = str(tmp_path / "limits.sqlite3")
+    first = SQLiteRateLimiter(path, max_events=2, window_seconds=10)
+    second = SQLiteRateLimiter(path, max_events=2, window_seconds=10)
+    assert first.allow("+1")
+    assert second.allow("+1")
+    assert not first.allow("+1")
+    assert not second.allow("+1")
+    now[0] += 5
+    assert second.allow("+1")
+    assert not first.allow("+1")
+    first.close()
+    second.close()
+
+
+def test_sqlite_limiter_spends_leased_slots_without_touching_the_file(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr("bot.core.ratelimit.time.time", lambda: 5000.0)
+    path = str(tmp_path / "limits.sqlite3")
+    first = SQLiteRateLimiter(path, max_events=100, window_seconds=10, lease=8)
+    takes = []
+    take = first._take
+    monkeypatch.setattr(first, "_take", lambda *args: takes.append(args[2]) or take(*args))
+    assert all(first.allow("+1") for _ in range(15))
+    assert takes == [1, 2, 4, 8]
+
+    second = SQLiteRateLimiter(path, max_events=20, window_seconds=10, lease=8)
+    third = SQLiteRateLimiter(path, max_events=20, window_seconds=10, lease=8)
+    allowed = sum(limiter.allow("+2") for _ in range(30) for limiter in (second, third))
+    assert allowed == 20
+    for limiter in (first, second, third):
+        limiter.close()
@@ -0,0 +1,129 @@
+"""Tests for concurrent Next.js revalidation fan-out."""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import httpx
+
+from bot.integrations.revalidate import AsyncNextRevalidator, NextRevalidator
+
+
+@dataclass
+class RevalidateSettings:
+    next_revalidate_url: str = "https://site.example/api/revalidate"
+    next_revalidate_secret: str = "secret"
+    bot_revalidate_concurrency: int = 4
+    bot_revalidate_timeout_sec: float = 1.0
+
+
+class InFlightTracker:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+        self.paths: List[str] = []
+
+    def enter(self, request: httpx.Request) -> None:
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+            self.paths.append(request.url.params["path"])
+
+    def leave(self) -> None:
+        with self.lock:
+            self.current -= 1
+
+
+def test_sync_trigger_is_concurrent_bounded_and_deduplicated() -> None:
+    tracker = InFlightTracker()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        tracker.enter(request)
+        time.sleep(0.05)
+        tracker.leave()
+        return httpx.Response(200, json={"revalidated": True})
+
+    revalidator = NextRevalidator(
+        RevalidateSettings(),
+        client=httpx.Client(transport=httpx.MockTransport(handler)),
+    )
+    paths = [f"/lessons/{index}" for index in range(12)] + ["/lessons/0", "/lessons/5"]
+    started = time.perf_counter()
+    results = revalidator.trigger(paths)
+    elapsed = time.perf_counter() - started
+    revalidator.close()
+
+    assert [result["path"] for result in results] == [f"/lessons/{index}" for index in range(12)]
+    assert all(result == {"path": result["path"], "status": 200, "body": {"revalidated": True}} for result in results)
+    assert sorted(tracker.paths) == sorted(set(paths))
+    assert 1 < tracker.peak <= 4
+    assert elapsed < 0.05 * 12
+
+
+def test_async_trigger_enforces_per_path_deadline() -> None:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.params["path"] == "/slow":
+            await asyncio.sleep(1.0)
+        return httpx.Response(200, json={"revalidated": True})
+
+    async def scenario():
+        revalidator = AsyncNextRevalidator(
+            RevalidateSettings(bot_revalidate_timeout_sec=0.1),
+            client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+        results = await revalidator.trigger(["/fast", "/slow", "/fast"])
+        await revalidator.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [(result["path"], result["status"]) for result in results] == [("/fast", 200), ("/slow", 504)]
+
+
+class TricklingHandler(BaseHTTPRequestHandler):
+    def do_POST(self) -> None:
+        path = self.path.rsplit("path=", 1)[-1]
+        body = b'{"revalidated": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body) if path == "%2Ffast" else 10_000))
+        self.end_headers()
+        if path == "%2Ffast":
+            self.wfile.write(body)
+            return
+        for _ in range(100):  # one byte every 50 ms: each read is quick, the whole body is not
+            try:
+                self.wfile.write(b" ")
+                self.wfile.flush()
+            except OSError:
+                return
+            time.sleep(0.05)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def test_sync_trigger_enforces_per_path_deadline_against_a_trickling_server() -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TricklingHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    settings = RevalidateSettings(
+        next_revalidate_url=f"http://127.0.0.1:{server.server_port}/api/revalidate", bot_revalidate_timeout_sec=0.3
+    )
+    revalidator = NextRevalidator(settings)
+    try:
+        started = time.perf_counter()
+        results = revalidator.trigger(["/slow", "/fast"])
+        elapsed = time.perf_counter() - started
+    finally:
+        revalidator.close()
+        server.shutdown()
+        server.server_close()
+
+    assert [(result["path"], result["status"]) for result in results] == [("/slow", 504), ("/fast", 200)]
+    assert results[1]["body"] == {"revalidated": True}
+    assert elapsed < 2.0
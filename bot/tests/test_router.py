@@ -1,14 +1,27 @@
 """Tests for the message routing layer."""
 from __future__ import annotations
 
+import asyncio
+import io
+import json
 import re
+import threading
 from dataclasses import dataclass
+from types import SimpleNamespace
 from typing import Dict, List
 
-from bot.core.ratelimit import RateLimiter
+import httpx
+
+from bot.core.commands import CHEAT_SHEET
+from bot.core.dedup import InMemoryDedupStore, SQLiteDedupStore
+from bot.core.metrics import COMMAND_SECONDS, RATE_LIMITED, UNAUTHORISED
+from bot.core.outbound import OutboundSender
+from bot.core.outbox import RevalidationOutbox
+from bot.core.ratelimit import RateLimiter, SQLiteRateLimiter
 from bot.core.router import MessageRouter
-from bot.core.state import ChatState
-from bot.integrations.whatsapp import InboundMessage
+from bot.core.state import ChatState, ChatStateCache, media_expectation
+from bot.core.uow import MessageWrites
+from bot.integrations.whatsapp import InboundMessage, MediaDownload, MediaTooLarge
 
 
 @dataclass
@@ -25,16 +38,18 @@ class FakeSupabase:
         self.states: Dict[str, ChatState] = {}
         self.lessons: Dict[str, Dict] = {}
         self.publishes: List[Dict] = []
+        self.batches: List[MessageWrites] = []
 
     def get_chat_state(self, sender: str) -> ChatState:
         return self.states.get(sender, ChatState(sender))
 
-    def upsert_chat_state(self, state: ChatState) -> None:
+    def upsert_chat_state(self, state: ChatState) -> bool:
         self.states[state.sender_phone] = ChatState(
             sender_phone=state.sender_phone,
             active_lesson=state.active_lesson,
             last_cmd=state.last_cmd,
         )
+        return True
 
     def create_lesson(self, title: str, level: str, topic: str, author_phone: str) -> Dict:
         lesson_id = f"lesson-{len(self.lessons) + 1}"
@@ -76,11 +91,40 @@ class FakeSupabase:
             suffix += 1
         return candidate
 
-    def record_publish(self, lesson_id: str, channel: str, result: Dict) -> None:
-        self.publishes.append({"lesson_id": lesson_id, "channel": channel, "result": result})
+    def record_publish(self, lesson_id: str, channel: str, result: Dict) -> str:
+        self.publishes.append({"id": f"publish-{len(self.publishes) + 1}", "lesson_id": lesson_id, "channel": channel, "result": result})
+        return self.publishes[-1]["id"]
+
+    def record_revalidation(self, publish_id: str, result: Dict) -> bool:
+        row = next(row for row in self.publishes if row["id"] == publish_id)
+        row["result"] = result
+        return True
+
+    def publish_lesson_atomic(self, lesson_id: str, sender: str, channel: str, result: Dict) -> Dict:
+        lesson = self.lessons.get(lesson_id)
+        if not lesson:
+            return None
+        slug = lesson.get("slug") or self.generate_unique_slug(lesson["title"])
+        self.publish_lesson(lesson_id, slug)
+        publish_id = self.record_publish(lesson_id, channel, {**result, "path": f"/lessons/{slug}"})
+        self.upsert_chat_state(ChatState(sender_phone=sender, last_cmd="publish"))
+        return {"slug": slug, "title": lesson["title"], "publish_id": publish_id}
+
+    def apply_message_writes(self, writes: MessageWrites) -> bool:
+        self.batches.append(writes)
+        rows = writes.body_appends + writes.quizzes + writes.media
+        if any(row["lesson_id"] not in self.lessons for row in rows):
+            return False
+        for append in writes.body_appends:
+            self.update_lesson_body(append["lesson_id"], append["markdown"])
+        for quiz in writes.quizzes:
+            self.add_quiz(**quiz)
+        if writes.chat_state is not None:
+            self.upsert_chat_state(writes.chat_state)
+        return True
 
     # Methods not exercised in these tests
-    def upload_lesson_media(self, *args, **kwargs):  # pragma: no cover - tests do not hit media flow
+    def upload_lesson_media_file(self, *args, **kwargs):  # pragma: no cover - tests do not hit media flow
         raise NotImplementedError
 
     def add_media_entry(self, *args, **kwargs):  # pragma: no cover - tests do not hit media flow
@@ -97,17 +141,18 @@ class FakeWhatsApp:
     def send_text_message(self, recipient: str, text: str) -> None:
         self.sent_messages.append({"recipient": recipient, "text": text})
 
-    def download_media(self, media_id: str):  # pragma: no cover - not used here
+    def stream_media(self, media_id: str):  # pragma: no cover - not used here
         return None
 
 
 class FakeRevalidator:
-    def __init__(self) -> None:
+    def __init__(self, status: int = 200) -> None:
+        self.status = status
         self.triggered_paths: List[str] = []
 
     def trigger(self, paths: List[str]) -> List[Dict]:
         self.triggered_paths.extend(paths)
-        return [{"path": path, "status": 200} for path in paths]
+        return [{"path": path, "status": self.status} for path in paths]
 
 
 def build_router() -> MessageRouter:
@@ -123,7 +168,7 @@ def build_router() -> MessageRouter:
 def test_help_command_sends_cheatsheet() -> None:
     router = build_router()
     message = InboundMessage(sender="+15551234567", message_id="1", type="text", text="help")
-    router.handle_message(message)
+    asyncio.run(router.handle_message(message))
     assert router.whatsapp.sent_messages[-1]["text"].startswith("Lesson Bot commands")
     state = router.supabase.get_chat_state("+15551234567")
     assert state.last_cmd == "help"
@@ -137,7 +182,7 @@ def test_new_lesson_creates_state() -> None:
         type="text",
         text="NEW LESSON: Rain Cycle | Level: Grade 5 | Topic: Science",
     )
-    router.handle_message(message)
+    asyncio.run(router.handle_message(message))
     state = router.supabase.get_chat_state("+15551234567")
     assert state.active_lesson is not None
     assert router.whatsapp.sent_messages[-1]["text"].startswith("Draft lesson created")
@@ -146,7 +191,7 @@ def test_new_lesson_creates_state() -> None:
 def test_add_body_requires_active_lesson() -> None:
     router = build_router()
     message = InboundMessage(sender="+15551234567", message_id="3", type="text", text="ADD BODY: Content")
-    router.handle_message(message)
+    asyncio.run(router.handle_message(message))
     assert router.whatsapp.sent_messages[-1]["text"].startswith("No active lesson")
 
 
@@ -157,8 +202,520 @@ def test_publish_clears_state_and_revalidates() -> None:
     router.supabase.lessons[lesson_id] = {"id": lesson_id, "title": "Gravity", "status": "draft"}
     router.supabase.states[sender] = ChatState(sender_phone=sender, active_lesson=lesson_id)
     message = InboundMessage(sender=sender, message_id="4", type="text", text="publish")
-    router.handle_message(message)
+    asyncio.run(router.handle_message(message))
     state = router.supabase.get_chat_state(sender)
     assert state.active_lesson is None
     assert router.revalidator.triggered_paths == ["/lessons/gravity"]
     assert "Published" in router.whatsapp.sent_messages[-1]["text"]
+    assert router.supabase.publishes[0]["result"] == {"revalidation": [{"path": "/lessons/gravity", "status": 200}], "path": "/lessons/gravity"}
+
+
+def test_failed_inline_revalidation_is_recorded_and_reported() -> None:
+    router = build_router()
+    router.revalidator = FakeRevalidator(status=504)
+    sender = "+15551234567"
+    router.supabase.lessons["lesson-42"] = {"id": "lesson-42", "title": "Gravity", "status": "draft"}
+    router.supabase.states[sender] = ChatState(sender_phone=sender, active_lesson="lesson-42")
+    asyncio.run(router.handle_message(InboundMessage(sender=sender, message_id="4", type="text", text="publish")))
+    assert router.supabase.publishes[0]["result"]["revalidation"] == [{"path": "/lessons/gravity", "status": 504}]
+    assert "could not be refreshed" in router.whatsapp.sent_messages[-1]["text"]
+
+
+class AsyncFakeSupabase(FakeSupabase):
+    async def get_chat_state(self, sender: str) -> ChatState:
+        return FakeSupabase.get_chat_state(self, sender)
+
+    async def upsert_chat_state(self, state: ChatState) -> bool:
+        return FakeSupabase.upsert_chat_state(self, state)
+
+    async def create_lesson(self, title: str, level: str, topic: str, author_phone: str) -> Dict:
+        return FakeSupabase.create_lesson(self, title, level, topic, author_phone)
+
+    async def apply_message_writes(self, writes: MessageWrites) -> bool:
+        self.batches.append(writes)
+        if writes.chat_state is not None:
+            await self.upsert_chat_state(writes.chat_state)
+        return True
+
+
+class AsyncFakeWhatsApp(FakeWhatsApp):
+    async def send_text_message(self, recipient: str, text: str) -> None:
+        FakeWhatsApp.send_text_message(self, recipient, text)
+
+
+def test_router_awaits_async_integrations() -> None:
+    settings = DummySettings(bot_allowed_senders=[])
+    router = MessageRouter(settings, AsyncFakeSupabase(), AsyncFakeWhatsApp(), FakeRevalidator(), RateLimiter(10, 60))
+    message = InboundMessage(
+        sender="+15550000000",
+        message_id="5",
+        type="text",
+        text="NEW LESSON: Tides | Level: Grade 7 | Topic: Science",
+    )
+    asyncio.run(router.handle_message(message))
+    state = router.supabase.states["+15550000000"]
+    assert state.active_lesson == "lesson-1"
+    assert router.whatsapp.sent_messages[-1]["text"].startswith("Draft lesson created")
+
+
+class PayloadFakeWhatsApp(FakeWhatsApp):
+    def extract_messages(self, payload: Dict) -> List[InboundMessage]:
+        return [InboundMessage(**message) for message in payload["messages"]]
+
+
+def test_router_records_command_and_rejection_metrics() -> None:
+    router = build_router()
+    router.rate_limiter = RateLimiter(1, 60)
+    help_runs = COMMAND_SECONDS.count("help")
+    rate_limited = RATE_LIMITED.value()
+    unauthorised = UNAUTHORISED.value()
+
+    for message_id in ("m1", "m2"):
+        asyncio.run(router.handle_message(InboundMessage("+15551234567", message_id, "text", text="help")))
+    asyncio.run(router.handle_message(InboundMessage("+15550000000", "m3", "text", text="help")))
+
+    assert COMMAND_SECONDS.count("help") == help_runs + 1
+    assert RATE_LIMITED.value() == rate_limited + 1
+    assert UNAUTHORISED.value() == unauthorised + 1
+
+
+class ThreadRecordingLimiter(SQLiteRateLimiter):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.threads: List[str] = []
+
+    def allow(self, sender: str) -> bool:
+        self.threads.append(threading.current_thread().name)
+        return super().allow(sender)
+
+
+def test_sqlite_rate_limiter_runs_off_the_event_loop(tmp_path) -> None:
+    router = build_router()
+    limiter = router.rate_limiter = ThreadRecordingLimiter(str(tmp_path / "ratelimit.sqlite3"), 1, 60)
+    for message_id in ("m1", "m2"):
+        asyncio.run(router.handle_message(InboundMessage("+15551234567", message_id, "text", text="help")))
+    limiter.close()
+
+    assert len(limiter.threads) == 2 and threading.main_thread().name not in limiter.threads
+    assert router.whatsapp.sent_messages[-1]["text"] == "Please slow down. Let's continue in a minute."
+
+
+def test_redelivered_payload_is_processed_once() -> None:
+    settings = DummySettings(bot_allowed_senders=[])
+    router = MessageRouter(
+        settings,
+        FakeSupabase(),
+        PayloadFakeWhatsApp(),
+        FakeRevalidator(),
+        RateLimiter(10, 60),
+        dedup=InMemoryDedupStore(),
+    )
+    payload = {
+        "messages": [
+            {
+                "sender": "+15551234567",
+                "message_id": "wamid.1",
+                "type": "text",
+                "text": "NEW LESSON: Tides | Level: Grade 7 | Topic: Science",
+            }
+        ]
+    }
+    asyncio.run(router.handle_payload(payload))
+    asyncio.run(router.handle_payload(payload))
+    assert len(router.supabase.lessons) == 1
+    assert router.dedup.hits == 1
+
+
+class ThreadRecordingDedup(SQLiteDedupStore):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.threads: List[str] = []
+
+    def check_and_mark_many(self, message_ids: List[str]) -> List[bool]:
+        self.threads.append(threading.current_thread().name)
+        return super().check_and_mark_many(message_ids)
+
+
+def test_sqlite_dedup_runs_off_the_event_loop_once_per_payload(tmp_path) -> None:
+    dedup = ThreadRecordingDedup(str(tmp_path / "dedup.sqlite3"))
+    router = MessageRouter(
+        DummySettings(bot_allowed_senders=[]), FakeSupabase(), FakeWhatsApp(), FakeRevalidator(), RateLimiter(10, 60), dedup=dedup
+    )
+    messages = [
+        InboundMessage(sender="+1555", message_id="wamid.1", type="text", text="help"),
+        InboundMessage(sender="+1555", message_id="", type="text", text="help"),
+        InboundMessage(sender="+1555", message_id="wamid.1", type="text", text="help"),
+        InboundMessage(sender="+1666", message_id="wamid.2", type="text", text="help"),
+    ]
+    accepted = asyncio.run(router.accept_messages(messages))
+    dedup.close()
+
+    assert accepted == messages[:2] + messages[3:]
+    assert len(dedup.threads) == 1 and dedup.threads[0] != threading.main_thread().name
+
+
+class SlowStateSupabase(AsyncFakeSupabase):
+    async def get_chat_state(self, sender: str) -> ChatState:
+        if sender == "+boom":
+            raise RuntimeError("database unavailable")
+        if sender == "+slow":
+            await asyncio.sleep(0.05)
+        return FakeSupabase.get_chat_state(self, sender)
+
+
+def test_payload_senders_run_concurrently_in_order_and_failures_are_isolated() -> None:
+    whatsapp = AsyncFakeWhatsApp()
+    router = MessageRouter(
+        DummySettings(bot_allowed_senders=[]), SlowStateSupabase(), whatsapp, FakeRevalidator(), RateLimiter(10, 60)
+    )
+    messages = [
+        InboundMessage(sender="+slow", message_id="1", type="text", text="help"),
+        InboundMessage(sender="+boom", message_id="2", type="text", text="help"),
+        InboundMessage(sender="+slow", message_id="3", type="text", text="cancel"),
+        InboundMessage(sender="+fast", message_id="4", type="text", text="cancel"),
+    ]
+    asyncio.run(router.handle_messages(messages))
+
+    replies = [(sent["recipient"], sent["text"]) for sent in whatsapp.sent_messages]
+    assert replies[0] == ("+fast", "Draft cleared. Ready for the next lesson.")
+    assert replies[1:] == [("+slow", CHEAT_SHEET), ("+slow", "Draft cleared. Ready for the next lesson.")]
+
+
+class CountingSupabase(FakeSupabase):
+    def __init__(self) -> None:
+        super().__init__()
+        self.reads = 0
+        self.writes = 0
+
+    def get_chat_state(self, sender: str) -> ChatState:
+        self.reads += 1
+        return super().get_chat_state(sender)
+
+    def upsert_chat_state(self, state: ChatState) -> bool:
+        self.writes += 1
+        return super().upsert_chat_state(state)
+
+
+def test_state_cache_skips_unchanged_upserts() -> None:
+    supabase = CountingSupabase()
+    router = MessageRouter(
+        DummySettings(bot_allowed_senders=[]),
+        supabase,
+        FakeWhatsApp(),
+        FakeRevalidator(),
+        RateLimiter(10, 60),
+        state_cache=ChatStateCache(),
+    )
+    for index in range(3):
+        message = InboundMessage(sender="+15551234567", message_id=str(index), type="text", text="help")
+        asyncio.run(router.handle_message(message))
+    assert supabase.reads == 1
+    assert supabase.writes == 1
+
+
+def test_unchanged_state_is_not_written_without_a_cache() -> None:
+    supabase = CountingSupabase()
+    router = MessageRouter(DummySettings(bot_allowed_senders=[]), supabase, FakeWhatsApp(), FakeRevalidator(), RateLimiter(10, 60))
+    for index, text in enumerate(["help", "help", "ADD BODY: Content"]):
+        message = InboundMessage(sender="+15551234567", message_id=str(index), type="text", text=text)
+        asyncio.run(router.handle_message(message))
+    assert router.whatsapp.sent_messages[-1]["text"].startswith("No active lesson")
+    assert supabase.writes == 1
+
+
+def test_write_behind_defers_upserts_until_flush() -> None:
+    supabase = CountingSupabase()
+    router = MessageRouter(
+        DummySettings(bot_allowed_senders=[]),
+        supabase,
+        FakeWhatsApp(),
+        FakeRevalidator(),
+        RateLimiter(10, 60),
+        state_cache=ChatStateCache(),
+        write_behind=True,
+    )
+    for text in ("help", "cancel", "help"):
+        message = InboundMessage(sender="+15551234567", message_id=text, type="text", text=text)
+        asyncio.run(router.handle_message(message))
+    assert supabase.writes == 0
+    assert asyncio.run(router.flush_chat_states()) == 1
+    assert supabase.states["+15551234567"].last_cmd == "help"
+
+
+class FlakyUpsertSupabase(CountingSupabase):
+    def upsert_chat_state(self, state: ChatState) -> bool:
+        self.writes += 1
+        return self.writes > 1 and FakeSupabase.upsert_chat_state(self, state)
+
+
+def test_failed_write_behind_flush_is_retried() -> None:
+    supabase = FlakyUpsertSupabase()
+    router = MessageRouter(
+        DummySettings(bot_allowed_senders=[]),
+        supabase,
+        FakeWhatsApp(),
+        FakeRevalidator(),
+        RateLimiter(10, 60),
+        state_cache=ChatStateCache(),
+        write_behind=True,
+    )
+    supabase.lessons["lesson-1"] = {"id": "lesson-1", "title": "Gravity"}
+    supabase.states["+15551234567"] = ChatState("+15551234567", active_lesson="lesson-1")
+    asyncio.run(router.handle_message(InboundMessage(sender="+15551234567", message_id="m", type="text", text="cancel")))
+    assert asyncio.run(router.flush_chat_states()) == 0
+    assert asyncio.run(router.flush_chat_states()) == 1
+    assert supabase.writes == 2
+    assert supabase.states["+15551234567"] == ChatState("+15551234567", None, "cancel")
+
+
+def test_add_quiz_writes_quiz_and_state_in_one_batch() -> None:
+    supabase = CountingSupabase()
+    router = MessageRouter(
+        DummySettings(bot_allowed_senders=[]),
+        supabase,
+        FakeWhatsApp(),
+        FakeRevalidator(),
+        RateLimiter(10, 60),
+        state_cache=ChatStateCache(),
+    )
+    sender = "+15551234567"
+    supabase.create_lesson("Gravity", "beginner", "science", sender)
+    supabase.states[sender] = ChatState(sender, active_lesson="lesson-1", last_cmd="new_lesson")
+    quiz = InboundMessage(sender=sender, message_id="q", type="text", text='ADD QUIZ: "Up?" | A) Yes | B) No | C) Maybe | ANS: A')
+    asyncio.run(router.handle_message(quiz))
+
+    assert len(supabase.batches) == 1
+    batch = supabase.batches[0]
+    assert len(batch.quizzes) == 1 and batch.chat_state.last_cmd == "add_quiz"
+    assert supabase.writes == 1
+    assert router.whatsapp.sent_messages[-1]["text"] == "Quiz added to the lesson."
+
+    # A failed batch replies once and leaves the cached state untouched.
+    del supabase.lessons["lesson-1"]
+    body = InboundMessage(sender=sender, message_id="b", type="text", text="ADD BODY: More")
+    asyncio.run(router.handle_message(body))
+    assert router.whatsapp.sent_messages[-1]["text"] == "Could not update the lesson body. Please retry."
+    assert router.state_cache.get(sender).last_cmd == "add_quiz"
+
+
+def test_pasted_batch_uses_one_state_load_one_write_and_one_reply() -> None:
+    supabase = CountingSupabase()
+    router = MessageRouter(
+        DummySettings(bot_allowed_senders=[]),
+        supabase,
+        FakeWhatsApp(),
+        FakeRevalidator(),
+        RateLimiter(1, 60),
+    )
+    quizzes = "".join(
+        f'ADD QUIZ: "Question {index}?" | A) Yes | B) No | C) Maybe | ANS: B\n' for index in range(10)
+    )
+    text = "NEW LESSON: Gravity | Level: Grade 5 | Topic: Science\nADD BODY: Things fall.\n" + quizzes
+    asyncio.run(router.handle_message(InboundMessage(sender="+1555", message_id="m", type="text", text=text)))
+
+    assert supabase.reads == 1 and supabase.writes == 1
+    assert len(supabase.batches) == 1
+    batch = supabase.batches[0]
+    assert len(batch.quizzes) == 10 and len(batch.body_appends) == 1
+    assert len(supabase.lessons["lesson-1"]["quizzes"]) == 10
+    assert supabase.states["+1555"].last_cmd == "add_quiz"
+    replies = router.whatsapp.sent_messages
+    assert len(replies) == 1
+    assert replies[0]["text"].startswith("Ran 12 commands:\n1. Draft lesson created: Gravity")
+    assert replies[0]["text"].endswith("12. Quiz added to the lesson.")
+
+
+def test_batch_flushes_before_publish() -> None:
+    router = build_router()
+    sender = "+15551234567"
+    text = (
+        "NEW LESSON: Gravity | Level: Grade 5 | Topic: Science\nADD BODY: Things fall.\n"
+        'ADD QUIZ: "What falls?" | A) Apples | B) Clouds | C) Nothing | ANS: A\nPUBLISH'
+    )
+    asyncio.run(router.handle_message(InboundMessage(sender=sender, message_id="m", type="text", text=text)))
+
+    supabase = router.supabase
+    assert supabase.lessons["lesson-1"]["body_md"] == "Things fall."
+    assert supabase.lessons["lesson-1"]["status"] == "published"
+    assert [len(batch) for batch in supabase.batches] == [2]
+    assert supabase.states[sender] == ChatState(sender, None, "publish")
+    assert router.whatsapp.sent_messages[-1]["text"].endswith("4. Published! /lessons/gravity\n(Site will refresh shortly.)")
+
+
+class FailingCreateSupabase(FakeSupabase):
+    def create_lesson(self, title: str, level: str, topic: str, author_phone: str) -> Dict:
+        return None
+
+
+def test_failed_new_lesson_stops_the_batch() -> None:
+    supabase = FailingCreateSupabase()
+    sender = "+15551234567"
+    supabase.lessons["old"] = {"id": "old", "title": "Old draft", "body_md": "Old body.", "status": "draft"}
+    supabase.states[sender] = ChatState(sender, "old", "add_body")
+    router = MessageRouter(
+        DummySettings(bot_allowed_senders=[sender]), supabase, FakeWhatsApp(), FakeRevalidator(), RateLimiter(10, 60)
+    )
+    text = "NEW LESSON: X | Level: Grade 5 | Topic: Science\nADD BODY: brand new content\nADD MEDIA: image\nPUBLISH"
+    asyncio.run(router.handle_message(InboundMessage(sender=sender, message_id="m", type="text", text=text)))
+
+    assert supabase.lessons["old"]["body_md"] == "Old body."
+    assert supabase.lessons["old"]["status"] == "draft"
+    assert supabase.publishes == []
+    assert router.revalidator.triggered_paths == []
+    assert router.whatsapp.sent_messages[-1]["text"] == (
+        "Could not create a lesson right now. Please try again.\n"
+        "Stopped there; the remaining 3 command(s) were not run."
+    )
+
+
+class DocumentWhatsApp(FakeWhatsApp):
+    def __init__(self, content: bytes) -> None:
+        super().__init__()
+        self.content = content
+
+    def stream_media(self, media_id: str) -> MediaDownload:
+        return MediaDownload(io.BytesIO(self.content), len(self.content), "application/octet-stream", media_id)
+
+
+def test_document_message_imports_a_lesson_and_activates_it() -> None:
+    lines = [
+        {"type": "lesson", "title": "Tides", "level": "Grade 7", "topic": "Science"},
+        {"type": "body", "markdown": "The moon pulls the sea."},
+        {"type": "quiz", "prompt": "What pulls the sea?", "options": ["Moon", "Sun", "Wind"], "answer": "A"},
+    ]
+    content = "\n".join(json.dumps(line) for line in lines).encode()
+    router = MessageRouter(
+        DummySettings(bot_allowed_senders=[]), FakeSupabase(), DocumentWhatsApp(content), FakeRevalidator(), RateLimiter(10, 60)
+    )
+    message = InboundMessage(sender="+1555", message_id="d", type="document", media_id="doc-1", media_filename="tides.jsonl")
+    asyncio.run(router.handle_message(message))
+
+    lesson = router.supabase.lessons["lesson-1"]
+    assert lesson["body_md"] == "The moon pulls the sea." and len(lesson["quizzes"]) == 1
+    assert router.supabase.states["+1555"] == ChatState("+1555", "lesson-1", "import")
+    assert router.whatsapp.sent_messages[-1]["text"].startswith("Imported draft lesson: Tides")
+
+
+class OversizedMediaWhatsApp(FakeWhatsApp):
+    def stream_media(self, media_id: str):
+        raise MediaTooLarge(media_id, 16 * 1024 * 1024)
+
+
+def test_oversized_media_is_refused() -> None:
+    sender = "+15551234567"
+    supabase = FakeSupabase()
+    supabase.states[sender] = ChatState(sender_phone=sender, active_lesson="lesson-1", last_cmd=media_expectation("video"))
+    router = MessageRouter(
+        DummySettings(bot_allowed_senders=[]),
+        supabase,
+        OversizedMediaWhatsApp(),
+        FakeRevalidator(),
+        RateLimiter(10, 60),
+    )
+    message = InboundMessage(sender=sender, message_id="m1", type="video", media_id="media-1")
+    asyncio.run(router.handle_message(message))
+    assert router.whatsapp.sent_messages[-1]["text"] == "That video is too large. The limit is 16 MB."
+
+
+class ThreadRecordingOutbox(RevalidationOutbox):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.threads: List[str] = []
+
+    def enqueue(self, path: str, lesson_id=None) -> None:
+        self.threads.append(threading.current_thread().name)
+        super().enqueue(path, lesson_id)
+
+
+def test_publish_with_outbox_defers_revalidation() -> None:
+    sender = "+15551234567"
+    supabase = FakeSupabase()
+    supabase.lessons["lesson-42"] = {"id": "lesson-42", "title": "Gravity", "status": "draft"}
+    supabase.states[sender] = ChatState(sender_phone=sender, active_lesson="lesson-42")
+    outbox = ThreadRecordingOutbox(":memory:", debounce_seconds=0)
+    router = MessageRouter(
+        DummySettings(bot_allowed_senders=[]),
+        supabase,
+        FakeWhatsApp(),
+        FakeRevalidator(),
+        RateLimiter(10, 60),
+        outbox=outbox,
+    )
+    asyncio.run(router.handle_message(InboundMessage(sender=sender, message_id="p1", type="text", text="publish")))
+    assert "Published" in router.whatsapp.sent_messages[-1]["text"]
+    assert router.revalidator.triggered_paths == []
+    assert supabase.publishes[0]["result"] == {"revalidation": "queued", "path": "/lessons/gravity"}
+
+    assert outbox.threads and threading.main_thread().name not in outbox.threads
+
+    assert asyncio.run(outbox.dispatch_due(router.revalidator)) == 1
+    assert router.revalidator.triggered_paths == ["/lessons/gravity"]
+
+
+class QueueingWhatsApp(FakeWhatsApp):
+    def __init__(self) -> None:
+        super().__init__()
+        self.settings = SimpleNamespace(whatsapp_phone_number_id="1234")
+
+    async def post_text_message(self, recipient: str, text: str) -> httpx.Response:
+        self.sent_messages.append({"recipient": recipient, "text": text, "queued": True})
+        return httpx.Response(200, json={})
+
+
+def test_replies_go_through_running_outbound_queue() -> None:
+    whatsapp = QueueingWhatsApp()
+    outbound = OutboundSender(whatsapp, rate_per_sec=1000, burst=10)
+    router = MessageRouter(
+        DummySettings(bot_allowed_senders=[]),
+        FakeSupabase(),
+        whatsapp,
+        FakeRevalidator(),
+        RateLimiter(10, 60),
+        outbound=outbound,
+    )
+
+    async def scenario() -> None:
+        await outbound.start()
+        await router.handle_message(InboundMessage(sender="+15551234567", message_id="q1", type="text", text="help"))
+        await outbound.stop()
+
+    asyncio.run(scenario())
+    assert whatsapp.sent_messages[-1]["queued"] is True
+    assert outbound.sent == 1
+
+
+
+class StalledWhatsApp(QueueingWhatsApp):
+    release: asyncio.Event
+
+    async def post_text_message(self, recipient: str, text: str) -> httpx.Response:
+        await self.release.wait()
+        return await super().post_text_message(recipient, text)
+
+
+def test_reply_is_sent_inline_when_the_outbound_queue_is_full() -> None:
+    whatsapp = StalledWhatsApp()
+    outbound = OutboundSender(whatsapp, rate_per_sec=1000, burst=10, max_depth=1, workers=1)
+    router = MessageRouter(
+        DummySettings(bot_allowed_senders=[]),
+        FakeSupabase(),
+        whatsapp,
+        FakeRevalidator(),
+        RateLimiter(10, 60),
+        outbound=outbound,
+    )
+
+    async def scenario() -> None:
+        whatsapp.release = asyncio.Event()
+        await outbound.start()
+        outbound.enqueue("+15550000000", "in flight")
+        await asyncio.sleep(0.01)
+        outbound.enqueue("+15550000000", "waiting")
+        await router.handle_message(InboundMessage(sender="+15551234567", message_id="q1", type="text", text="help"))
+        whatsapp.release.set()
+        await outbound.stop()
+
+    asyncio.run(scenario())
+    assert outbound.dropped == 1
+    assert whatsapp.sent_messages[0] == {"recipient": "+15551234567", "text": CHEAT_SHEET}
+    assert outbound.sent == 2
@@ -0,0 +1,61 @@
+"""Tests for single-query slug allocation."""
+from __future__ import annotations
+
+from types import SimpleNamespace
+from typing import List
+
+from bot.core.slugs import SlugIndex, in_family, next_free_slug
+from bot.integrations.supabase_client import SupabaseService
+from bot.tests.conftest import FakePostgrest
+
+
+def test_next_free_slug_matches_sequential_probe() -> None:
+    assert next_free_slug("greetings", []) == "greetings"
+    assert next_free_slug("greetings", ["greetings"]) == "greetings-2"
+    taken = ["greetings"] + [f"greetings-{n}" for n in range(2, 10)] + ["greetings-extra", "greetings-3-2"]
+    assert next_free_slug("greetings", taken) == "greetings-10"
+    assert next_free_slug("greetings", ["greetings", "greetings-3"]) == "greetings-2"
+    assert in_family("greetings-3", "greetings-3-2") and not in_family("greetings", "greetings-3-2")
+
+
+def test_slug_index_tracks_published_slugs_and_invalidates() -> None:
+    index = SlugIndex(max_bases=2)
+    index.load("greetings", ["greetings", "greetings-2", "other"])
+    index.add("greetings-3")
+    assert index.get("greetings") == {"greetings", "greetings-2", "greetings-3"}
+    index.invalidate("greetings-3")
+    assert index.get("greetings") is None
+    for base in ("a", "b", "c"):
+        index.load(base, [base])
+    assert len(index) == 2 and index.get("a") is None
+
+
+def _client(slugs: List[str], drafts: List[str]) -> FakePostgrest:
+    lessons = [{"id": f"published-{n}", "slug": slug} for n, slug in enumerate(slugs)]
+    lessons += [{"id": lesson_id, "slug": None} for lesson_id in drafts]
+    return FakePostgrest(tables={"lessons": lessons}, unique=[("lessons", "slug")])
+
+
+def test_generate_unique_slug_uses_one_query_then_the_warm_index() -> None:
+    client = _client(["greetings"] + [f"greetings-{n}" for n in range(2, 10)], drafts=["lesson-10"])
+    service = SupabaseService(SimpleNamespace(), client=client)
+
+    slug = service.generate_unique_slug("Greetings")
+    assert slug == "greetings-10"
+    assert client.requests == [("lessons", "select", None, [("or", "slug.eq.greetings,slug.like.greetings-*")])]
+
+    assert service.publish_lesson("lesson-10", slug)
+    assert service.generate_unique_slug("Greetings!") == "greetings-11"
+    assert client.rows("lessons")[-1]["slug"] == "greetings-10"
+    assert client.actions() == [("lessons", "select"), ("lessons", "update")]  # no further lookups
+
+
+def test_unique_violation_invalidates_the_index() -> None:
+    client = _client(["greetings"], drafts=["lesson-2", "lesson-3"])
+    service = SupabaseService(SimpleNamespace(), client=client)
+    assert service.generate_unique_slug("Greetings") == "greetings-2"
+    client.rows("lessons")[-1]["slug"] = "greetings-2"  # claimed by another process
+
+    assert not service.publish_lesson("lesson-2", "greetings-2")
+    assert service.slugs.get("greetings") is None
+    assert service.generate_unique_slug("Greetings") == "greetings-3"
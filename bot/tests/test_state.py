@@ -0,0 +1,58 @@
+"""Tests for the chat state cache."""
+from __future__ import annotations
+
+from bot.core.state import ChatState, ChatStateCache
+
+
+def test_cache_hands_out_copies_and_tracks_changes() -> None:
+    cache = ChatStateCache(max_entries=10, ttl_seconds=60)
+    assert cache.get("+1555") is None
+    cache.put(ChatState("+1555", active_lesson="lesson-1", last_cmd="help"))
+    state = cache.get("+1555")
+    assert state == ChatState("+1555", "lesson-1", "help")
+    assert not cache.changed(state)
+    state.last_cmd = "add_body"
+    assert cache.changed(state)
+    assert cache.get("+1555").last_cmd == "help"
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_expired_clean_entries_are_dropped(monkeypatch) -> None:
+    clock = [100.0]
+    monkeypatch.setattr("bot.core.state.time.monotonic", lambda: clock[0])
+    cache = ChatStateCache(ttl_seconds=5)
+    cache.put(ChatState("+1"))
+    cache.put(ChatState("+2", last_cmd="cancel"), dirty=True)
+    clock[0] += 10
+    assert cache.get("+1") is None
+    assert cache.get("+2").last_cmd == "cancel"
+
+
+def test_dirty_entries_survive_eviction_until_drained() -> None:
+    cache = ChatStateCache(max_entries=1, ttl_seconds=60)
+    cache.put(ChatState("+1", last_cmd="help"), dirty=True)
+    cache.put(ChatState("+2", last_cmd="cancel"), dirty=True)
+    assert cache.get("+1").last_cmd == "help"
+    drained = {state.sender_phone for state in cache.drain_dirty()}
+    assert drained == {"+1", "+2"}
+    assert cache.drain_dirty() == []
+
+
+def test_invalidate_keeps_dirty_entries() -> None:
+    cache = ChatStateCache()
+    cache.put(ChatState("+1"))
+    cache.put(ChatState("+2"), dirty=True)
+    cache.invalidate()
+    assert cache.get("+1") is None
+    assert cache.get("+2") is not None
+
+
+def test_mark_dirty_requeues_a_failed_write_unless_superseded() -> None:
+    cache = ChatStateCache()
+    cache.put(ChatState("+1", last_cmd="help"), dirty=True)
+    cache.put(ChatState("+2", last_cmd="help"), dirty=True)
+    failed = cache.drain_dirty()
+    cache.put(ChatState("+2", last_cmd="cancel"))
+    for state in failed:
+        cache.mark_dirty(state)
+    assert cache.drain_dirty() == [ChatState("+1", last_cmd="help")]
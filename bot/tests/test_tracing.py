@@ -0,0 +1,79 @@
+"""Tests for per-message trace spans and the slow-message log."""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+
+from bot.core.ratelimit import RateLimiter
+from bot.core.router import MessageRouter
+from bot.core.state import ChatState
+from bot.core.tracing import Tracer, span
+from bot.integrations.whatsapp import InboundMessage
+from bot.tests.test_router import DummySettings, FakeRevalidator, FakeSupabase, FakeWhatsApp
+
+SENDER = "+15551234567"
+
+
+class NamedSupabase(FakeSupabase):
+    metrics_name = "supabase"
+
+
+class NamedRevalidator(FakeRevalidator):
+    metrics_name = "revalidate"
+
+
+def build_traced_router(tracer: Tracer) -> MessageRouter:
+    settings = DummySettings(bot_allowed_senders=[SENDER])
+    return MessageRouter(
+        settings, NamedSupabase(), FakeWhatsApp(), NamedRevalidator(), RateLimiter(10, 60), tracer=tracer
+    )
+
+
+def test_publish_is_exported_as_one_otlp_trace(tmp_path) -> None:
+    export = tmp_path / "traces.jsonl"
+    router = build_traced_router(Tracer(slow_ms=0, export_path=str(export)))
+    router.supabase.lessons["lesson-1"] = {"id": "lesson-1", "title": "Gravity", "status": "draft"}
+    router.supabase.states[SENDER] = ChatState(sender_phone=SENDER, active_lesson="lesson-1")
+
+    asyncio.run(router.handle_message(InboundMessage(SENDER, "m1", "text", text="publish")))
+
+    [line] = export.read_text().splitlines()
+    spans = json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    names = [entry["name"] for entry in spans]
+    assert names == [
+        "message",
+        "supabase.get_chat_state",
+        "parse",
+        "command.publish",
+        "supabase.publish_lesson_atomic",
+        "revalidate.trigger",
+        "supabase.record_revalidation",
+    ]
+    root, *children = spans
+    assert "parentSpanId" not in root
+    assert {entry["traceId"] for entry in spans} == {root["traceId"]}
+    by_id = {entry["spanId"]: entry["name"] for entry in spans}
+    assert by_id[children[3]["parentSpanId"]] == "command.publish"
+    assert {"key": "message_id", "value": {"stringValue": "m1"}} in root["attributes"]
+
+
+def test_slow_message_logs_one_breakdown(caplog) -> None:
+    router = build_traced_router(Tracer(slow_ms=0.001))
+    with caplog.at_level(logging.WARNING, logger="bot.core.tracing"):
+        asyncio.run(router.handle_message(InboundMessage(SENDER, "m2", "text", text="help")))
+
+    [record] = [record for record in caplog.records if record.getMessage() == "Slow message"]
+    assert record.message_id == "m2"
+    assert [entry["name"] for entry in record.spans] == [
+        "supabase.get_chat_state",
+        "parse",
+        "command.help",
+        "supabase.apply_message_writes",
+    ]
+    assert record.duration_ms >= max(entry["duration_ms"] for entry in record.spans)
+
+
+def test_span_is_a_no_op_outside_a_trace() -> None:
+    with span("orphan") as current:
+        assert current is None
@@ -0,0 +1,63 @@
+"""Tests for batching a message's Supabase writes into one request."""
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+from bot.core.state import ChatState
+from bot.core.uow import UnitOfWork
+from bot.integrations.supabase_client import SupabaseService
+from bot.tests.conftest import FakePostgrest
+
+
+def _client(rpc_installed: bool = True) -> FakePostgrest:
+    return FakePostgrest(rpcs={"apply_message_writes": lambda params: [{"applied": 3}]} if rpc_installed else {})
+
+
+def _stage(service: SupabaseService) -> UnitOfWork:
+    uow = UnitOfWork(service)
+    uow.add_quiz("lesson-1", "Up?", ["Yes", "No", "Maybe"], 0)
+    uow.add_media_entry("lesson-1", "image", "https://cdn/x.png", None)
+    state = ChatState("+1555", active_lesson="lesson-1", last_cmd="media_attached")
+    uow.upsert_chat_state(state)
+    state.last_cmd = "changed after staging"
+    return uow
+
+
+def test_commit_sends_one_rpc_with_every_staged_write() -> None:
+    client = _client()
+    uow = _stage(SupabaseService(SimpleNamespace(), client=client))
+    uow.append_body("lesson-1", "   ")  # sanitises to nothing and is dropped
+    assert uow.pending == 4
+
+    assert asyncio.run(uow.commit())
+    assert uow.pending == 0
+    assert len(client.requests) == 1
+    _, name, params = client.requests[0]
+    assert name == "apply_message_writes"
+    assert params["p_body_appends"] == []
+    assert params["p_quizzes"][0]["options"] == ["Yes", "No", "Maybe"]
+    assert params["p_media"][0]["kind"] == "image"
+    assert params["p_chat_state"]["last_cmd"] == "media_attached"
+
+
+def test_missing_rpc_falls_back_to_one_call_per_write() -> None:
+    client = _client(rpc_installed=False)
+    service = SupabaseService(SimpleNamespace(), client=client)
+    assert asyncio.run(_stage(service).commit())
+    assert client.actions() == [
+        ("rpc", "apply_message_writes"),
+        ("quizzes", "insert"),
+        ("lesson_media", "insert"),
+        ("chat_state", "upsert"),
+    ]
+
+    client.requests.clear()
+    assert asyncio.run(_stage(service).commit())
+    assert all(request[0] != "rpc" for request in client.requests)
+
+
+def test_empty_unit_of_work_makes_no_request() -> None:
+    client = _client()
+    assert asyncio.run(UnitOfWork(SupabaseService(SimpleNamespace(), client=client)).commit())
+    assert client.requests == []
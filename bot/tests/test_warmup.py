@@ -0,0 +1,92 @@
+"""Tests for lazy client construction and the warm-up report."""
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+
+from bot.core.warmup import Warmup
+from bot.integrations.revalidate import NextRevalidator
+from bot.integrations.supabase_client import SupabaseService
+from bot.integrations.whatsapp import WhatsAppAPI
+
+
+class FakeDependency:
+    def __init__(self, result: object) -> None:
+        self.result = result
+        self.opened = False
+
+    def warm(self) -> bool:
+        self.opened = True
+        if isinstance(self.result, Exception):
+            raise self.result
+        return bool(self.result)
+
+
+def test_clients_are_built_on_first_use() -> None:
+    settings = SimpleNamespace(
+        whatsapp_token="token", bot_revalidate_concurrency=2, bot_revalidate_timeout_sec=1.0
+    )
+    whatsapp = WhatsAppAPI(settings)
+    revalidator = NextRevalidator(settings)
+    supabase = SupabaseService(settings)
+    assert not (whatsapp.opened or revalidator.opened or supabase.opened)
+    whatsapp.close()  # closing an unused client is a no-op
+    revalidator.close()
+
+    requests = []
+    transport = httpx.MockTransport(lambda request: requests.append(request) or httpx.Response(405))
+    warmed = WhatsAppAPI(settings, client=httpx.Client(transport=transport))
+    assert warmed.warm() and requests[0].method == "HEAD"
+
+
+def test_warmup_reports_each_dependency() -> None:
+    warmup = Warmup(
+        {"ok": FakeDependency(True), "down": FakeDependency(False), "broken": FakeDependency(RuntimeError("boom"))},
+        enabled=True,
+        max_attempts=1,
+    )
+    assert not warmup.ready and warmup.report()["dependencies"]["ok"] == {
+        "client": "lazy",
+        "warmup": "pending",
+        "warmup_ms": None,
+    }
+    asyncio.run(warmup.run())
+    report = warmup.report()
+    assert not report["ready"]
+    assert {name: entry["warmup"] for name, entry in report["dependencies"].items()} == {
+        "ok": "ok",
+        "down": "failed",
+        "broken": "failed",
+    }
+    assert report["dependencies"]["ok"]["client"] == "open"
+
+
+class FlakyDependency(FakeDependency):
+    def __init__(self) -> None:
+        super().__init__(True)
+        self.calls = 0
+
+    def warm(self) -> bool:
+        self.calls += 1
+        if self.calls == 1:
+            raise httpx.ConnectError("temporary DNS failure")
+        return super().warm()
+
+
+def test_warmup_retries_a_failed_dependency_until_it_succeeds() -> None:
+    flaky = FlakyDependency()
+    warmup = Warmup({"supabase": flaky, "whatsapp": FakeDependency(True)}, enabled=True, retry_delay=0.01)
+
+    asyncio.run(warmup.run())
+
+    assert flaky.calls == 2
+    assert warmup.ready
+    assert warmup.report()["dependencies"]["supabase"]["warmup"] == "ok"
+
+
+def test_disabled_warmup_is_ready_with_lazy_clients() -> None:
+    warmup = Warmup({"supabase": FakeDependency(True)})
+    assert warmup.ready
+    assert warmup.report()["dependencies"]["supabase"]["warmup"] == "skipped"
@@ -0,0 +1,102 @@
+"""Tests for webhook decoding and streaming media downloads from the Graph API."""
+from __future__ import annotations
+
+import asyncio
+import json
+from dataclasses import dataclass
+
+import httpx
+import pytest
+
+from bot.benchmarks.bench_webhook import build_mix, message_payload, status_payload
+from bot.integrations.whatsapp import AsyncWhatsAppAPI, MediaTooLarge, WhatsAppAPI
+
+
+@dataclass
+class MediaSettings:
+    whatsapp_token: str = "token"
+    bot_media_max_bytes: int = 1024
+    bot_media_spool_bytes: int = 256
+
+
+def _graph_handler(body: bytes, declare_size: bool = True):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/media-1"):
+            metadata = {"url": "https://lookaside.example/download/media-1.mp4", "mime_type": "video/mp4"}
+            if declare_size:
+                metadata["file_size"] = len(body)
+            return httpx.Response(200, json=metadata)
+        # Raw stream without a Content-Length header, usable by both clients.
+        return httpx.Response(200, stream=httpx.ByteStream(body))
+
+    return handler
+
+
+def test_stream_media_spools_small_files_in_memory() -> None:
+    client = httpx.Client(transport=httpx.MockTransport(_graph_handler(b"x" * 200)))
+    media = WhatsAppAPI(MediaSettings(), client=client).stream_media("media-1")
+    assert media is not None
+    assert media.size == 200
+    assert media.filename == "media-1.mp4"
+    assert not media.file._rolled
+    assert media.file.read() == b"x" * 200
+    media.close()
+
+
+def test_stream_media_rolls_large_files_to_disk() -> None:
+    client = httpx.Client(transport=httpx.MockTransport(_graph_handler(b"y" * 1000)))
+    media = WhatsAppAPI(MediaSettings(), client=client).stream_media("media-1")
+    assert media is not None
+    assert media.file._rolled
+    assert media.file.read() == b"y" * 1000
+    media.close()
+
+
+def test_stream_media_rejects_declared_and_undeclared_oversize() -> None:
+    for declare_size in (True, False):
+        client = httpx.Client(transport=httpx.MockTransport(_graph_handler(b"z" * 2000, declare_size)))
+        with pytest.raises(MediaTooLarge):
+            WhatsAppAPI(MediaSettings(), client=client).stream_media("media-1")
+
+
+def test_async_stream_media_matches_sync() -> None:
+    async def scenario() -> bytes:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(_graph_handler(b"a" * 700)))
+        api = AsyncWhatsAppAPI(MediaSettings(), client=client)
+        media = await api.stream_media("media-1")
+        assert media is not None and media.size == 700
+        data = media.file.read()
+        media.close()
+        with pytest.raises(MediaTooLarge):
+            await AsyncWhatsAppAPI(
+                MediaSettings(bot_media_max_bytes=500),
+                client=client,
+            ).stream_media("media-1")
+        await api.close()
+        return data
+
+    assert asyncio.run(scenario()) == b"a" * 700
+
+
+def test_status_only_webhooks_are_filtered_before_parsing() -> None:
+    api = WhatsAppAPI(MediaSettings(), client=httpx.Client())
+    assert not api.has_messages(status_payload(1))
+    assert api.has_messages(message_payload(1))
+    assert api.has_messages(b'{"entry": [{"changes": [{"value": {"messages" : []}}]}]}')
+
+
+def test_typed_decoder_matches_extract_messages() -> None:
+    api = WhatsAppAPI(MediaSettings(), client=httpx.Client())
+    for body in build_mix(40, 0.3):
+        assert api.decode_messages(body) == api.extract_messages(json.loads(body))
+    document = message_payload(3).replace(b'"type": "text"', b'"type": "document"').replace(b'"text":', b'"document":')
+    assert api.decode_messages(document)[0].type == "document"
+
+
+def test_typed_decoder_falls_back_on_odd_shapes_and_rejects_bad_json() -> None:
+    api = WhatsAppAPI(MediaSettings(), client=httpx.Client())
+    odd = {"entry": [{"changes": [{"value": {"messages": [{"from": "1", "id": 7, "type": "text", "text": {"body": "hi"}}]}}]}]}
+    assert api.decode_messages(json.dumps(odd).encode())[0].text == "hi"
+    assert api.decode_messages(b"[]") == []
+    with pytest.raises(ValueError):
+        api.decode_messages(b"{not json")